@@ -1,8 +1,41 @@
 from django.contrib import admin
+from django.conf import settings
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from utils.base.pagination import EstimatedCountPaginator
 
 from .forms import UserRegisterForm
-from .models import Phone, User, Profile
+from .models import (EmailOutbox, Partner, PendingRelationship,
+                     PendingRelationshipPhone, Phone, Profile, Relationship,
+                     SearchEntry, User)
+from .search import search_ids
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables too large to count on every page
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class SearchAdminMixin:
+    """
+    Search the changelist with `authentication.search` instead of
+    `icontains` scans, keeping the best `SEARCH_ADMIN_LIMIT` matches.
+    `search_fields` only needs to be set for the search box to show.
+    """
+    search_kind: str = None
+    # Lookup of the profile or pending relationship id
+    search_lookup: str = 'pk'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = search_ids(
+            search_term, self.search_kind, settings.SEARCH_ADMIN_LIMIT)
+        return queryset.filter(**{f'{self.search_lookup}__in': ids}), False
 
 
 @admin.register(User)
@@ -10,6 +43,8 @@ class UserAdmin(BaseUserAdmin):
     # The forms to add and change user instances
     # form = UserUpdateForm
     add_form = UserRegisterForm
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # The fields to be used in displaying the User model.
     # These override the definitions on the base UserAdmin
@@ -30,14 +65,16 @@ class UserAdmin(BaseUserAdmin):
         }
         ),
     )
+    # Backed by user_start_date_idx
     ordering = ('-start_date',)
     filter_horizontal = ()
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(SearchAdminMixin, LargeTableAdmin):
     list_display = ('fullname', 'country', 'sex')
-    search_fields = ('fullname',)
+    search_fields = ('fullname', 'country', 'phone__phoneno')
+    search_kind = SearchEntry.PROFILE
     list_filter = ('sex',)
     fieldsets = (
         (None, {
@@ -47,10 +84,101 @@ class ProfileAdmin(admin.ModelAdmin):
             )
         }),
     )
+    raw_id_fields = ('user',)
 
 
 @admin.register(Phone)
-class PhoneAdmin(admin.ModelAdmin):
-    list_display = ('phoneno', 'profile',)
+class PhoneAdmin(SearchAdminMixin, LargeTableAdmin):
+    list_display = ('phoneno', 'profile', 'verified', 'sms_status',)
+    list_select_related = ('profile',)
     search_fields = ('phoneno', 'profile__fullname')
+    search_kind = SearchEntry.PROFILE
+    search_lookup = 'profile'
     list_filter = ('profile__sex',)
+    raw_id_fields = ('profile',)
+
+
+class PendingRelationshipPhoneInline(admin.TabularInline):
+    model = PendingRelationshipPhone
+    fields = ('phoneno', 'verified', 'sms_status')
+    readonly_fields = ('sms_status',)
+    extra = 0
+
+
+@admin.register(PendingRelationship)
+class PendingRelationshipAdmin(SearchAdminMixin, LargeTableAdmin):
+    list_display = ('name', 'country', 'creator')
+    list_select_related = ('creator',)
+    search_fields = ('name', 'country', 'pendingrelationshipphone__phoneno')
+    search_kind = SearchEntry.PENDING
+    raw_id_fields = ('creator',)
+    inlines = (PendingRelationshipPhoneInline,)
+
+
+@admin.register(PendingRelationshipPhone)
+class PendingRelationshipPhoneAdmin(SearchAdminMixin, LargeTableAdmin):
+    list_display = (
+        'phoneno', 'pending_relationship', 'verified', 'sms_status',)
+    list_select_related = ('pending_relationship',)
+    search_fields = ('phoneno', 'pending_relationship__name')
+    search_kind = SearchEntry.PENDING
+    search_lookup = 'pending_relationship'
+    raw_id_fields = ('pending_relationship',)
+
+
+def partner_name(prefix=''):
+    return Coalesce(
+        F(f'{prefix}profile__fullname'),
+        F(f'{prefix}pending_relationship__name'),
+    )
+
+
+@admin.register(Partner)
+class PartnerAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'other_partner_name',)
+    raw_id_fields = ('profile', 'pending_relationship', 'partner',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            name=partner_name(),
+            other_partner_name=partner_name('partner__'),
+        )
+
+    @admin.display(ordering='name')
+    def name(self, obj):
+        return obj.name
+
+    @admin.display(description='Partner')
+    def other_partner_name(self, obj):
+        return obj.other_partner_name
+
+
+@admin.register(Relationship)
+class RelationshipAdmin(LargeTableAdmin):
+    list_display = ('id', 'partner_names', 'status', 'verified',)
+    list_filter = ('status', 'verified',)
+    raw_id_fields = ('partners',)
+
+    def get_queryset(self, request):
+        partners = Partner.objects.filter(
+            relationship=OuterRef('pk')
+        ).annotate(name=partner_name()).order_by('pk').values('name')
+
+        return super().get_queryset(request).annotate(
+            first_partner=Subquery(partners[:1]),
+            second_partner=Subquery(partners[1:2]),
+        )
+
+    @admin.display(description='Partners')
+    def partner_names(self, obj):
+        second = obj.second_partner or 'Not Verified'
+        return f'{obj.first_partner} & {second}'
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(LargeTableAdmin):
+    list_display = (
+        'recipient', 'subject', 'status', 'attempts', 'next_attempt_at')
+    search_fields = ('recipient',)
+    list_filter = ('status',)
+    readonly_fields = ('created', 'sent_at', 'last_error')
@@ -0,0 +1,409 @@
+"""
+Async versions of the authentication endpoints, served best under ASGI
+(config.asgi). Blocking work runs in thread pools so the event loop
+keeps serving other requests.
+
+Django 4.0 has no async ORM yet (`aget`, `aexists` come in 4.1),
+queries run through `sync_to_async` in the thread of the request.
+Password hashing runs in the bounded hashing pool and emails are only
+queued, the outbox worker talks to SMTP.
+"""
+import asyncio
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from authentication.authentication import (
+    RevocableJWTAuthentication, RevocableJWTTokenUserAuthentication,
+    RevocableTokenRefreshSerializer)
+from authentication.hashing import acheck_password, amake_password
+from authentication.models import User
+from authentication.otp import PASSWORD_RESET
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from utils.base.executors import ExecutorBusy
+from utils.base.general import get_tokens_for_user
+from utils.base.throttling import AUTH_THROTTLES
+
+from . import serializers
+from .views import EmaiOtpMixin, UserPayloadMixin
+
+
+def get_user_details(user_id) -> dict:
+    user = User.objects.with_details().get(pk=user_id, active=True)
+    return serializers.UserDetailSerializer(user).data
+
+
+class AsyncAPIView(View):
+    """
+    Base for async json endpoints.
+
+    Django 4.0 only runs function views natively as coroutines, so
+    `as_view` returns a coroutine function awaiting the handler.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        functools.update_wrapper(async_view, view)
+        # csrf_exempt would wrap the coroutine in a sync function
+        async_view.csrf_exempt = True
+        return async_view
+
+    throttle_classes = ()
+    throttle_scope: str = None
+
+    def check_throttles(self, request, data: dict):
+        """Run the DRF throttle classes of the view.
+
+        :return: a 429 response when throttled, else None
+        """
+        # Throttles read the parsed body from `request.data` like in DRF
+        request.data = data
+
+        waits = [
+            throttle.wait()
+            for throttle in (cls() for cls in self.throttle_classes)
+            if not throttle.allow_request(request, self)
+        ]
+        if not waits:
+            return None
+
+        wait = max((w for w in waits if w is not None), default=None)
+        response = JsonResponse(
+            {'detail': 'Request was throttled.'}, status=429)
+        if wait is not None:
+            response['Retry-After'] = str(wait)
+        return response
+
+    async def get_data(self, request):
+        """Parse the json body and run the throttles
+
+        :return: the data and None, or None and an error response
+        :rtype: tuple
+        """
+        data = self.parse_body(request)
+        if data is None:
+            return None, self.error_response({'detail': 'JSON parse error'})
+
+        if self.throttle_classes:
+            # Throttle counters live in the cache, which may be remote
+            throttled = await sync_to_async(self.check_throttles)(
+                request, data)
+            if throttled is not None:
+                return None, throttled
+        return data, None
+
+    async def is_valid(self, serializer) -> bool:
+        """
+        Validate a serializer whose validators may query the database
+        """
+        return await sync_to_async(serializer.is_valid)()
+
+    def parse_body(self, request) -> dict:
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return None
+        return data
+
+    def error_response(self, errors, status=400):
+        return JsonResponse(errors, status=status)
+
+    def exception_response(self, exc: APIException):
+        data = exc.detail
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        response = JsonResponse(data, status=exc.status_code)
+        if exc.status_code == 401:
+            response['WWW-Authenticate'] = 'Bearer realm="api"'
+        return response
+
+    def busy_response(self, retry_after: int):
+        response = JsonResponse(
+            {'detail': 'Server is busy, please retry shortly.'}, status=503)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class LoginView(EmaiOtpMixin, AsyncAPIView):
+    """
+    Login with the password checked in the bounded hashing pool,
+    answers 503 with Retry-After when the pool is full.
+    """
+
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'login'
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.LoginCredentialsSerializer(data=data)
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+
+        user = await sync_to_async(User.objects.find_by_email)(email)
+        if user is None or not user.active:
+            return self.error_response(
+                {'email': [serializer.inactive_message]})
+
+        try:
+            valid = await acheck_password(user, password)
+        except ExecutorBusy:
+            return self.busy_response(settings.PASSWORD_HASH_RETRY_AFTER)
+
+        if not valid:
+            return self.error_response(
+                {'email': [serializer.mismatch_message]})
+
+        if user.verified_email:
+            return JsonResponse({
+                'tokens': get_tokens_for_user(user),
+                'user': serializers.UserSerializer(user).data,
+            })
+
+        otp = await sync_to_async(self.verify_user)(user)
+        return JsonResponse(
+            self.get_otp_response_data(user, otp), status=423)
+
+
+class RegisterView(EmaiOtpMixin, AsyncAPIView):
+    """
+    Register with the password hashed in the bounded hashing pool
+    """
+
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'register'
+
+    def create_user(self, serializer, password_hash):
+        user = serializer.save(password_hash=password_hash)
+        return user, self.verify_user(user)
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.RegisterSerializer(data=data)
+        if not await self.is_valid(serializer):
+            return self.error_response(serializer.errors)
+
+        try:
+            password_hash = await amake_password(
+                serializer.validated_data['password'])
+        except ExecutorBusy:
+            return self.busy_response(settings.PASSWORD_HASH_RETRY_AFTER)
+
+        try:
+            user, otp = await sync_to_async(self.create_user)(
+                serializer, password_hash)
+        except ValidationError as e:
+            return self.exception_response(e)
+        return JsonResponse(self.get_otp_response_data(user, otp))
+
+
+class VerifyEmailView(EmaiOtpMixin, AsyncAPIView):
+    """
+    Send an otp to the email, or verify the email
+    when an otp is provided
+    """
+
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
+
+    def confirm_email(self, user: User, otp):
+        if not user.verify_email(otp):
+            return None
+        return serializers.UserSerializer(user).data
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.VerifiyEmail(data=data)
+        if not await self.is_valid(serializer):
+            return self.error_response(serializer.errors)
+
+        user = serializer.user
+        otp = serializer.validated_data.get('otp')
+        if otp is None:
+            otp = await sync_to_async(self.verify_user)(user)
+            return JsonResponse(self.get_otp_response_data(user, otp))
+
+        data = await sync_to_async(self.confirm_email)(user, otp)
+        if data is None:
+            return self.error_response({'otp': ['Invalid or expired OTP']})
+        return JsonResponse(data)
+
+
+class ForgetPasswordView(EmaiOtpMixin, AsyncAPIView):
+    email_template_name = 'authentication/email/forget_password.html'
+    otp_purpose = PASSWORD_RESET
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.VerifiyEmail(data=data)
+        if not await self.is_valid(serializer):
+            return self.error_response(serializer.errors)
+
+        user = serializer.user
+        otp = await sync_to_async(self.verify_user)(user)
+        return JsonResponse(self.get_otp_response_data(user, otp))
+
+
+class UpdatePasswordView(AsyncAPIView):
+    """
+    Reset a password with the otp sent by email. The otp is only
+    consumed once the password is hashed, a full hashing pool answers
+    503 and the otp can be used again.
+    """
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'password_reset'
+
+    def set_password(self, user: User, password_hash: str):
+        user.password = password_hash
+        user.save(update_fields=['password'])
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.ForgetChangePasswordSerializer(
+            data=data, context={'verify_otp': False})
+        if not await self.is_valid(serializer):
+            return self.error_response(serializer.errors)
+
+        try:
+            password_hash = await amake_password(
+                serializer.validated_data['password'])
+        except ExecutorBusy:
+            return self.busy_response(settings.PASSWORD_HASH_RETRY_AFTER)
+
+        verified = await sync_to_async(serializer.user.verify_otp)(
+            serializer.validated_data['otp'], PASSWORD_RESET)
+        if not verified:
+            return self.error_response(
+                {'otp': [serializer.otp_message]})
+
+        await sync_to_async(self.set_password)(
+            serializer.user, password_hash)
+        return JsonResponse({'message': 'Password updated successfully'})
+
+
+class TokenRefreshView(AsyncAPIView):
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        # Signing tokens is cheap, no need to leave the event loop
+        serializer = RevocableTokenRefreshSerializer(data=data)
+        try:
+            valid = serializer.is_valid()
+        except TokenError as e:
+            return self.exception_response(InvalidToken(e.args[0]))
+
+        if not valid:
+            return self.error_response(serializer.errors)
+        return JsonResponse(serializer.validated_data)
+
+
+class TokenVerifyView(UserPayloadMixin, AsyncAPIView):
+    """
+    Check that a jwt access token is still valid
+    and return the user info
+    """
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        try:
+            # Revocations are looked up in the cache, off the event loop
+            validated_token = await sync_to_async(
+                RevocableJWTAuthentication().get_validated_token)(
+                    data.get('token'))
+            user_id = self.get_user_id(validated_token)
+        except InvalidToken as e:
+            return self.exception_response(e)
+
+        payloads = await sync_to_async(self.get_user_payloads)([user_id])
+        if user_id not in payloads:
+            return self.error_response(
+                {'detail': 'User not found or inactive',
+                 'code': 'user_not_found'}, status=401)
+        return JsonResponse(payloads[user_id])
+
+
+class TokenBatchVerifyView(UserPayloadMixin, AsyncAPIView):
+    """
+    Validate many jwt access tokens, results are returned
+    in the same order as the tokens
+    """
+
+    async def post(self, request):
+        data, response = await self.get_data(request)
+        if response is not None:
+            return response
+
+        serializer = serializers.JWTTokenBatchValidateSerializer(data=data)
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+
+        # Revocations are looked up in the cache, off the event loop
+        results = await sync_to_async(self.validate_tokens)(
+            serializer.validated_data['tokens'])
+        return JsonResponse(results, safe=False)
+
+
+class UserView(AsyncAPIView):
+    """
+    The authenticated user with profile, phones, partner
+    and relationship status
+    """
+
+    async def get(self, request):
+        try:
+            auth = await sync_to_async(
+                RevocableJWTTokenUserAuthentication().authenticate)(request)
+        except APIException as e:
+            return self.exception_response(e)
+
+        if auth is None:
+            return self.error_response(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401)
+
+        try:
+            details = await sync_to_async(get_user_details)(auth[0].id)
+        except User.DoesNotExist:
+            return self.error_response(
+                {'detail': 'User not found or inactive',
+                 'code': 'user_not_found'}, status=401)
+        return JsonResponse(details)
@@ -1,7 +1,15 @@
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
 
-from authentication.models import User, Phone, Relationship, Profile
+from authentication.export import parse_since
+from authentication.models import (Partner, Phone, Profile, Relationship,
+                                   SearchEntry, User)
+from authentication.otp import PASSWORD_RESET
+from authentication.search import get_terms
 
 
 class RelationshipMadeSerializer(serializers.Serializer):
@@ -13,25 +21,46 @@ class JWTTokenValidateSerializer(serializers.Serializer):
     token = serializers.CharField()
 
 
+class JWTTokenBatchValidateSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.TOKEN_VALIDATE_BATCH_SIZE)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+
 class UserSeriy(serializers.Serializer):
     user = serializers.CharField()
 
 
 class VerifiyEmail(serializers.Serializer):
     email = serializers.EmailField()
-    otp = serializers.CharField(read_only=True)
+    otp = serializers.CharField(required=False)
     user: User = None
 
     def validate_email(self, value):
-        qs = User.objects.filter(email=value)
-        if not qs.exists():
+        user = User.objects.find_by_email(value)
+        if user is None:
             raise serializers.ValidationError(
                 "Email does not exist in our database")
-        user = qs.first()
         self.user = user
         return value
 
 
+class PhoneVerifySerializer(serializers.Serializer):
+    phone = serializers.PrimaryKeyRelatedField(queryset=Phone.objects.none())
+    otp = serializers.CharField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the phones of the authenticated user
+        self.fields['phone'].queryset = Phone.objects.filter(
+            profile__user_id=self.context['request'].user.pk)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, required=True, validators=[validate_password])
@@ -41,21 +70,51 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('password', 'email', 'fullname', 'country')
+        # Duplicates are caught by the unique constraint on insert,
+        # which also covers concurrent signups, see `create`
+        extra_kwargs = {'email': {'validators': []}}
 
-    def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)
-
-        profile: Profile = user.profile
-        profile.fullname = validated_data['fullname']
-        profile.country = validated_data['country']
-        profile.save()
+    duplicate_message = 'user with this email already exists.'
 
-        return user
+    def create(self, validated_data):
+        """
+        Pass `password_hash` to `save` to store a password already
+        hashed, e.g. in the hashing pool
+        """
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    email=validated_data['email'],
+                    password=validated_data['password'],
+                    password_hash=validated_data.get('password_hash'),
+                    profile={
+                        'fullname': validated_data['fullname'],
+                        'country': validated_data['country'],
+                    },
+                )
+        except IntegrityError:
+            # Only a taken email is the client's fault, other violations
+            # are errors
+            taken = User.objects.alias(email_lower=Lower('email')).filter(
+                email_lower=validated_data['email'].lower()).exists()
+            if not taken:
+                raise
+            raise serializers.ValidationError(
+                {'email': [self.duplicate_message]})
 
 
-class LoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
+    """
+    Login fields only, validating them does not touch the database
+    """
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True)
+
+    inactive_message = 'Your account is not active. Please contact support.'
+    mismatch_message = 'Email and Password do not match'
+
+
+class LoginSerializer(LoginCredentialsSerializer):
     user: User = None
 
     def validate(self, attrs):
@@ -66,16 +125,14 @@ class LoginSerializer(serializers.Serializer):
         """
         Check that the email is available in the User table
         """
-        try:
-            user: User = User.objects.get(email=email, active=True)
-        except User.DoesNotExist:
+        user: User = User.objects.find_by_email(email)
+        if user is None or not user.active:
             raise serializers.ValidationError(
-                {"email": 'Your account is not active. \
-Please contact support.'})
+                {"email": self.inactive_message})
 
         if not user.check_password(password):
             raise serializers.ValidationError(
-                {"email": 'Email and Password do not match'})
+                {"email": self.mismatch_message})
 
         self.user = user
         return attrs
@@ -87,6 +144,73 @@ class PhoneSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RegistryLookupSerializer(serializers.Serializer):
+    id = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=settings.REGISTRY_LOOKUP_BATCH_SIZE,
+        help_text='Emails or phone numbers, repeat the parameter')
+
+
+class RegistryLookupResultSerializer(serializers.Serializer):
+    identifier = serializers.CharField()
+    normalized = serializers.CharField(allow_null=True)
+    valid = serializers.BooleanField()
+    registered = serializers.BooleanField()
+    status = serializers.CharField(allow_null=True)
+    relationship_verified = serializers.BooleanField()
+    verified = serializers.BooleanField()
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    kind = serializers.ChoiceField(
+        choices=SearchEntry.KINDS, required=False, allow_null=True,
+        default=None)
+    cursor = serializers.CharField(required=False, allow_null=True,
+                                   default=None)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.SEARCH_MAX_PAGE_SIZE,
+        default=settings.SEARCH_PAGE_SIZE)
+
+    def validate_q(self, value):
+        if not get_terms(value):
+            raise serializers.ValidationError(
+                'Search terms need at least '
+                f'{settings.SEARCH_MIN_TERM_LENGTH} characters')
+        return value
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    phones = serializers.SerializerMethodField()
+    score = serializers.FloatField()
+
+    class Meta:
+        model = SearchEntry
+        fields = ('kind', 'object_id', 'name', 'country', 'phones', 'score')
+
+    def get_phones(self, obj: SearchEntry) -> list:
+        return obj.phones.split()
+
+
+class SearchResponseSerializer(serializers.Serializer):
+    results = SearchResultSerializer(many=True)
+    next = serializers.CharField(allow_null=True)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    since = serializers.CharField(
+        required=False, allow_null=True, default=None,
+        help_text='Only export rows after this id, or after this ISO '
+                  'date or time: users changed, profiles and '
+                  'relationships created since then')
+
+    def validate_since(self, value):
+        if value is None:
+            return None
+        return parse_since(value)
+
+
 class RelationshipSerializer(serializers.ModelSerializer):
     class Meta:
         model = Relationship
@@ -117,6 +241,72 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
+class PartnerSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='get_name', read_only=True)
+
+    class Meta:
+        model = Partner
+        fields = ('id', 'name',)
+
+
+class CurrentRelationshipSerializer(serializers.ModelSerializer):
+    partners = PartnerSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Relationship
+        fields = ('id', 'status', 'verified', 'partners',)
+
+
+class UserDetailSerializer(UserSerializer):
+    """
+    User with profile, phones, partner and relationship status,
+    expects a user from `User.objects.with_details()`
+    """
+    phones = serializers.SerializerMethodField()
+    partner = serializers.SerializerMethodField()
+    relationship = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + (
+            'phones',
+            'partner',
+            'relationship',
+        )
+
+    def get_own_partner(self, user: User):
+        return getattr(user.profile, 'partner', None)
+
+    def get_relationship_obj(self, user: User):
+        partner = self.get_own_partner(user)
+        if partner is None:
+            return None
+        return partner.get_current_relationship()
+
+    @swagger_serializer_method(serializer_or_field=PhoneSerializer(many=True))
+    def get_phones(self, user: User):
+        return PhoneSerializer(user.profile.phone_set.all(), many=True).data
+
+    @swagger_serializer_method(serializer_or_field=PartnerSerializer)
+    def get_partner(self, user: User):
+        relationship = self.get_relationship_obj(user)
+        if relationship is None:
+            return None
+
+        own = self.get_own_partner(user)
+        for partner in relationship.partners.all():
+            if partner.pk != own.pk:
+                return PartnerSerializer(partner).data
+        return None
+
+    @swagger_serializer_method(
+        serializer_or_field=CurrentRelationshipSerializer)
+    def get_relationship(self, user: User):
+        relationship = self.get_relationship_obj(user)
+        if relationship is None:
+            return None
+        return CurrentRelationshipSerializer(relationship).data
+
+
 class TokenSerializer(serializers.Serializer):
     refresh = serializers.CharField()
     access = serializers.CharField()
@@ -127,22 +317,38 @@ class LoginResponseSerializer(serializers.Serializer):
     tokens = TokenSerializer()
 
 
+class TokenValidationResultSerializer(serializers.Serializer):
+    valid = serializers.BooleanField()
+    user = UserSerializer(required=False)
+    detail = serializers.CharField(required=False)
+
+
 class ForgetChangePasswordSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
+    otp = serializers.CharField(write_only=True, required=True)
     password = serializers.CharField(
         write_only=True, required=True, validators=[validate_password])
 
     user: User = None
+    otp_message = 'Invalid or expired OTP'
 
     def validate_email(self, value):
-        qs = User.objects.filter(email=value)
-        if not qs.exists():
+        user = User.objects.find_by_email(value)
+        if user is None:
             raise serializers.ValidationError(
                 "Email does not exist in our database")
-        user = qs.first()
         self.user = user
         return value
 
+    def validate(self, attrs):
+        # Checking the otp consumes it, callers that can still fail after
+        # validation pass `verify_otp` False in the context and check it
+        if not self.context.get('verify_otp', True):
+            return attrs
+        if not self.user.verify_otp(attrs['otp'], PASSWORD_RESET):
+            raise serializers.ValidationError({"otp": self.otp_message})
+        return attrs
+
     def update(self):
         new_password = self.validated_data.get('password')
         self.user.set_password(new_password)
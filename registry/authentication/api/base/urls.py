@@ -1,17 +1,23 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'auth'
 urlpatterns = [
     path('register/', views.RegisterAPIView.as_view(), name='register'),
     path('login/', views.LoginAPIView.as_view(), name='login'),
     path('verify-email/', views.VerifyEmail.as_view(), name='verify-email'),
+    path('verify-phone/', views.PhoneVerifyView.as_view(),
+         name='verify-phone'),
+    path('logout/', views.LogoutView.as_view(), name='logout'),
+    path('logout-all/', views.LogoutAllView.as_view(), name='logout-all'),
 
     path(
         'token/refresh/', views.TokenRefreshAPIView.as_view(),
         name='token_refresh'),
     path('token/validate/', views.TokenVerifyAPIView.as_view(),
          name='token_validate'),
+    path('token/validate/batch/', views.TokenBatchVerifyAPIView.as_view(),
+         name='token_validate_batch'),
 
     path('change-password/', views.ChangePasswordView.as_view(),
          name='change_password'),
@@ -33,4 +39,41 @@ urlpatterns = [
         'user/', views.UserRetrieveView.as_view(),
         name='user-detail'
     ),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path(
+        'registry/lookup/', views.RegistryLookupView.as_view(),
+        name='registry_lookup'
+    ),
+    path('export/<str:dataset>.<str:fmt>', views.ExportView.as_view(),
+         name='export'),
+
+    # Async versions, run them under ASGI (config.asgi)
+    path(
+        'async/register/', async_views.RegisterView.as_view(),
+        name='register_async'),
+    path(
+        'async/login/', async_views.LoginView.as_view(),
+        name='login_async'),
+    path(
+        'async/verify-email/', async_views.VerifyEmailView.as_view(),
+        name='verify-email_async'),
+    path(
+        'async/token/refresh/', async_views.TokenRefreshView.as_view(),
+        name='token_refresh_async'),
+    path(
+        'async/token/validate/', async_views.TokenVerifyView.as_view(),
+        name='token_validate_async'),
+    path(
+        'async/token/validate/batch/',
+        async_views.TokenBatchVerifyView.as_view(),
+        name='token_validate_batch_async'),
+    path(
+        'async/forget-password/', async_views.ForgetPasswordView.as_view(),
+        name='forget_password_async'),
+    path(
+        'async/update-password/', async_views.UpdatePasswordView.as_view(),
+        name='update_password_async'),
+    path(
+        'async/user/', async_views.UserView.as_view(),
+        name='user-detail_async'),
 ]
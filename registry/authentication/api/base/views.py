@@ -1,22 +1,108 @@
-
-from authentication.models import User
+from authentication import export
+from authentication.authentication import (RevocableJWTAuthentication,
+                                           RevocableTokenRefreshSerializer)
+from authentication.cache import get_cached_payloads, set_cached_payloads
+from authentication.models import Phone, User
+from authentication.otp import EMAIL_VERIFY, PASSWORD_RESET, otp_store
+from authentication.phones import send_phone_otps, verify_phone_otp
+from authentication.registry import lookup
+from authentication.revocation import revocations
+from authentication.search import search
+from authentication.signing import RefreshToken
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
+from rest_framework.exceptions import (AuthenticationFailed, NotFound,
+                                       ValidationError)
 from rest_framework.generics import (CreateAPIView, RetrieveAPIView,
                                      UpdateAPIView)
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from rest_framework_simplejwt.serializers import TokenRefreshSerializer
-from utils.base.general import (generate_email_message, generate_otp,
-                                get_tokens_for_user)
+from rest_framework_simplejwt.settings import api_settings
+from utils.base.general import generate_email_message, get_tokens_for_user
+from utils.base.http import json_etag_response
+from utils.base.permissions import IsStaff
+from utils.base.queries import QueryBudgetMixin
+from utils.base.throttling import AUTH_THROTTLES
 
 from . import serializers
 
 
-class TokenVerifyAPIView(APIView):
+class UserPayloadMixin:
+    """
+    Serialized users for token validation, read from the user cache
+    and loaded in a single query on a miss.
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                'Token contained no recognizable user identification')
+
+    def get_user_payloads(self, user_ids) -> dict:
+        payloads = get_cached_payloads(user_ids)
+        missing = set(user_ids) - payloads.keys()
+
+        if missing:
+            users = User.objects.select_related('profile').filter(
+                id__in=missing, active=True)
+            loaded = {
+                user.pk: dict(serializers.UserSerializer(user).data)
+                for user in users
+            }
+            # Unknown and inactive users are cached as False
+            loaded.update({
+                user_id: False for user_id in missing - loaded.keys()
+            })
+            set_cached_payloads(loaded)
+            payloads.update(loaded)
+
+        return {
+            user_id: payload
+            for user_id, payload in payloads.items() if payload
+        }
+
+    def validate_tokens(self, raw_tokens) -> list:
+        """Validation result of every token, in the same order
+
+        :param raw_tokens: jwt access tokens
+        :type raw_tokens: list
+        :return: `TokenValidationResultSerializer` data
+        :rtype: list
+        """
+        jwt_auth = RevocableJWTAuthentication()
+        user_ids = []
+        for raw_token in raw_tokens:
+            try:
+                validated_token = jwt_auth.get_validated_token(raw_token)
+                user_ids.append(self.get_user_id(validated_token))
+            except InvalidToken:
+                user_ids.append(None)
+
+        payloads = self.get_user_payloads(
+            {user_id for user_id in user_ids if user_id is not None})
+
+        results = []
+        for user_id in user_ids:
+            if user_id is None:
+                results.append(
+                    {'valid': False, 'detail': InvalidToken.default_detail})
+            elif user_id not in payloads:
+                results.append(
+                    {'valid': False, 'detail': 'User not found or inactive'})
+            else:
+                results.append({'valid': True, 'user': payloads[user_id]})
+        return results
+
+
+class TokenVerifyAPIView(UserPayloadMixin, APIView):
     """
     An authentication plugin that checks if a jwt
     access token is still valid and returns the user info.
@@ -28,29 +114,53 @@ class TokenVerifyAPIView(APIView):
         responses={200: serializers.UserSerializer}
     )
     def post(self, request, format=None):
-        jwt_auth = JWTAuthentication()
+        jwt_auth = RevocableJWTAuthentication()
 
         raw_token = request.data.get('token')
 
         validated_token = jwt_auth.get_validated_token(raw_token)
+        user_id = self.get_user_id(validated_token)
 
-        user = jwt_auth.get_user(validated_token)
-
-        serialized_user = serializers.UserSerializer(user)
-        user_details = serialized_user.data
+        user_details = self.get_user_payloads([user_id]).get(user_id)
+        if user_details is None:
+            raise AuthenticationFailed(
+                'User not found or inactive', code='user_not_found')
 
         return Response(data=user_details)
 
 
+class TokenBatchVerifyAPIView(UserPayloadMixin, APIView):
+    """
+    Validate many jwt access tokens in one call, results are
+    returned in the same order as the tokens.
+    """
+    permission_classes = (AllowAny,)
+
+    @swagger_auto_schema(
+        request_body=serializers.JWTTokenBatchValidateSerializer,
+        responses={
+            200: serializers.TokenValidationResultSerializer(many=True)
+        }
+    )
+    def post(self, request, format=None):
+        serializer = serializers.JWTTokenBatchValidateSerializer(
+            data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(data=self.validate_tokens(
+            serializer.validated_data['tokens']))
+
+
 class EmaiOtpMixin:
 
-    email_template_name: str = 'authentication/email/verify_email.html'
+    email_template_name: str = 'authentication/email/verify_email_otp.html'
+    otp_purpose: str = EMAIL_VERIFY
 
     def get_email_template(self):
         return self.email_template_name
 
     def verify_user(self, user: User, context: dict = None):
-        otp = generate_otp()
+        otp = otp_store.issue(self.otp_purpose, user.pk)
 
         if context is None:
             context = {}
@@ -62,7 +172,7 @@ class EmaiOtpMixin:
 
         message = generate_email_message(
             self.get_email_template(),
-            context,
+            context=context,
         )
 
         user.mail(
@@ -72,18 +182,23 @@ class EmaiOtpMixin:
 
         return otp
 
+    def get_otp_response_data(self, user: User, otp: int):
+        data = {'email': user.email}
+
+        # The otp is only exposed while debugging, it is sent by email
+        if settings.DEBUG is True:
+            data['otp'] = otp
+        return data
+
     def verify_response(self, user: User):
         otp = self.verify_user(user)
-        return Response(
-            data={
-                'email': user.email,
-                'otp': otp,
-            },
-        )
+        return Response(data=self.get_otp_response_data(user, otp))
 
 
 class VerifyEmail(EmaiOtpMixin, APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
 
     @swagger_auto_schema(
         request_body=serializers.VerifiyEmail,
@@ -92,20 +207,69 @@ class VerifyEmail(EmaiOtpMixin, APIView):
         }
     )
     def post(self, request, format=None):
+        """
+        Send an otp to the email, or verify the email
+        when an otp is provided
+        """
         serializer = serializers.VerifiyEmail(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         user = serializer.user
-        return self.verify_response(user)
+        otp = serializer.validated_data.get('otp')
+        if otp is None:
+            return self.verify_response(user)
+
+        if not user.verify_email(otp):
+            raise ValidationError({'otp': ['Invalid or expired OTP']})
+
+        return Response(data=serializers.UserSerializer(user).data)
+
+
+class PhoneVerifyView(APIView):
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
+
+    @swagger_auto_schema(
+        request_body=serializers.PhoneVerifySerializer,
+        responses={
+            200: serializers.PhoneSerializer,
+            202: serializers.PhoneSerializer,
+        }
+    )
+    def post(self, request, format=None):
+        """
+        Text an otp to one of the user's phones, or verify the phone
+        when an otp is provided
+        """
+        serializer = serializers.PhoneVerifySerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        phone = serializer.validated_data['phone']
+        otp = serializer.validated_data.get('otp')
+        if otp is not None:
+            if not verify_phone_otp(phone, otp):
+                raise ValidationError({'otp': ['Invalid or expired OTP']})
+            return Response(data=serializers.PhoneSerializer(phone).data)
+
+        if phone.verified:
+            raise ValidationError({'phone': ['Phone is already verified']})
+        # Sent by the sms threads, which record the delivery on the row
+        send_phone_otps([phone])
+        phone.sms_status = Phone.SMS_QUEUED
+        phone.sms_error = ''
+        return Response(
+            data=serializers.PhoneSerializer(phone).data,
+            status=status.HTTP_202_ACCEPTED)
 
 
 class TokenRefreshAPIView(APIView):
     permission_classes = (AllowAny,)
-    serializer_class = TokenRefreshSerializer
+    serializer_class = RevocableTokenRefreshSerializer
 
     @swagger_auto_schema(
-        request_body=TokenRefreshSerializer,
-        responses={200: TokenRefreshSerializer}
+        request_body=RevocableTokenRefreshSerializer,
+        responses={200: RevocableTokenRefreshSerializer}
     )
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -118,8 +282,49 @@ class TokenRefreshAPIView(APIView):
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
+class LogoutView(APIView):
+    """
+    Revoke the access token of the request, and the refresh token
+    when provided
+    """
+
+    @swagger_auto_schema(request_body=serializers.LogoutSerializer)
+    def post(self, request, format=None):
+        serializer = serializers.LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        raw_refresh = serializer.validated_data.get('refresh')
+        if raw_refresh:
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError as e:
+                raise ValidationError({'refresh': [e.args[0]]})
+            if refresh[api_settings.USER_ID_CLAIM] != request.user.pk:
+                raise ValidationError(
+                    {'refresh': ['Token belongs to another user']})
+            revocations.revoke(refresh)
+
+        revocations.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LogoutAllView(APIView):
+    """
+    Revoke every token of the user, logging out all devices
+    """
+
+    def post(self, request, format=None):
+        revocations.revoke_user(request.user.pk)
+        # revoke_user leaves the tokens of the current second valid,
+        # the token of this request may be one of them
+        revocations.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class LoginAPIView(EmaiOtpMixin, APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'login'
     serializer_class = serializers.LoginSerializer
 
     @swagger_auto_schema(
@@ -144,17 +349,20 @@ class LoginAPIView(EmaiOtpMixin, APIView):
         else:
             otp = self.verify_user(user)
             return Response(
-                data={
-                    'email': user.email,
-                    'otp': otp,
-                },
+                data=self.get_otp_response_data(user, otp),
                 status=status.HTTP_423_LOCKED
             )
 
 
-class RegisterAPIView(EmaiOtpMixin, CreateAPIView):
+class RegisterAPIView(EmaiOtpMixin, QueryBudgetMixin, CreateAPIView):
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'register'
     serializer_class = serializers.RegisterSerializer
+    # User and profile inserts, the search entry rebuilt from the rows
+    # on commit (profile, phones, existing entry, insert), the queued
+    # verification email, and on SQLite the BEGIN of both transactions
+    query_budget = 9
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -164,7 +372,7 @@ class RegisterAPIView(EmaiOtpMixin, CreateAPIView):
 
     @swagger_auto_schema(
         request_body=serializers.RegisterSerializer,
-        responses={201: serializers.VerifiyEmail}
+        responses={200: serializers.VerifiyEmail}
     )
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
@@ -173,6 +381,9 @@ class RegisterAPIView(EmaiOtpMixin, CreateAPIView):
 class ForgetPasswordView(EmaiOtpMixin, APIView):
     permission_classes = (AllowAny,)
     email_template_name = 'authentication/email/forget_password.html'
+    otp_purpose = PASSWORD_RESET
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
 
     @swagger_auto_schema(
         request_body=serializers.VerifiyEmail,
@@ -189,6 +400,8 @@ class ForgetPasswordView(EmaiOtpMixin, APIView):
 
 class UpdatePasswordView(APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'password_reset'
     serializer_class = serializers.ForgetChangePasswordSerializer
 
     @swagger_auto_schema(
@@ -212,11 +425,95 @@ class ChangePasswordView(UpdateAPIView):
         return User.objects.filter(active=True)
 
 
-class UserRetrieveView(RetrieveAPIView):
-    serializer_class = serializers.UserSerializer
+class UserRetrieveView(QueryBudgetMixin, RetrieveAPIView):
+    """
+    The authenticated user with profile, phones, partner
+    and relationship status
+    """
+    serializer_class = serializers.UserDetailSerializer
+    # 4 queries for the details and 1 on a user cache miss
+    query_budget = 5
 
     def get_queryset(self):
-        return User.objects.filter
+        return User.objects.with_details()
 
     def get_object(self):
-        return self.request.user
+        return self.get_queryset().get(pk=self.request.user.pk)
+
+
+class RegistryLookupView(APIView):
+    """
+    Relationship status of a batch of emails and phone numbers, read
+    from the precomputed registry. Responses carry an ETag, send it back
+    in If-None-Match to get a 304 when nothing changed.
+    """
+
+    @swagger_auto_schema(
+        query_serializer=serializers.RegistryLookupSerializer,
+        responses={200: serializers.RegistryLookupResultSerializer(many=True)}
+    )
+    def get(self, request, format=None):
+        serializer = serializers.RegistryLookupSerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return json_etag_response(
+            request, lookup(serializer.validated_data['id']),
+            f'private, max-age={settings.REGISTRY_LOOKUP_MAX_AGE}')
+
+
+class SearchView(APIView):
+    """
+    Staff search of profiles and pending relationships by partial name,
+    phone or country, best matches first. Pass `next` as `cursor` to
+    get the following page.
+    """
+    permission_classes = (IsStaff,)
+
+    @swagger_auto_schema(
+        query_serializer=serializers.SearchQuerySerializer,
+        responses={200: serializers.SearchResponseSerializer}
+    )
+    def get(self, request, format=None):
+        serializer = serializers.SearchQuerySerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        entries, next_cursor = search(
+            data['q'], data['kind'], data['cursor'], data['limit'])
+        return Response({
+            'results': serializers.SearchResultSerializer(
+                entries, many=True).data,
+            'next': next_cursor,
+        })
+
+
+class ExportView(APIView):
+    """
+    Staff export of a whole table as NDJSON or CSV, streamed with a
+    flat memory use, e.g. `export/profiles.csv?since=2026-01-01`.
+    Gzipped on the fly when the client accepts it.
+    """
+    permission_classes = (IsStaff,)
+
+    @swagger_auto_schema(query_serializer=serializers.ExportQuerySerializer)
+    def get(self, request, dataset, fmt, format=None):
+        if dataset not in export.DATASETS or fmt not in export.FORMATS:
+            raise NotFound('Unknown export')
+
+        serializer = serializers.ExportQuerySerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        gzip = bool(re_accepts_gzip.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        response = StreamingHttpResponse(
+            export.export(dataset, fmt, serializer.validated_data['since'],
+                          gzip=gzip),
+            content_type=export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = (
+            f'attachment; filename="{dataset}.{fmt}"')
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+
+        # Signals keeping the search index and the registry up to date
+        from . import registry, search  # noqa: F401
@@ -0,0 +1,57 @@
+"""
+jwt authentication rejecting tokens of `authentication.revocation`
+"""
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication, JWTTokenUserAuthentication)
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .revocation import revocations
+from .signing import RefreshToken
+
+
+class RevocationMixin:
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(validated_token):
+            raise InvalidToken({
+                'detail': 'Token has been revoked',
+                'code': 'token_revoked',
+            })
+        return validated_token
+
+
+class RevocableJWTAuthentication(RevocationMixin, JWTAuthentication):
+    pass
+
+
+class RevocableJWTTokenUserAuthentication(
+    RevocationMixin, JWTTokenUserAuthentication
+):
+    pass
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    `TokenRefreshSerializer` for the tokens of `authentication.signing`,
+    rejecting revoked refresh tokens
+    """
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if revocations.is_revoked(refresh):
+            raise TokenError('Token has been revoked')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                revocations.revoke(refresh)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
@@ -0,0 +1,40 @@
+from utils.base.backfill import Backfill, register
+
+from . import registry, search
+from .models import PendingRelationshipPhone, Phone
+
+
+class PhoneE164Backfill(Backfill):
+    fields = ['phoneno_e164']
+    # Search entry of the phone owners, which lists the E.164 digits
+    search_kind: str = None
+    owner_field: str = None
+
+    def get_queryset(self):
+        return super().get_queryset().filter(phoneno_e164__isnull=True)
+
+    def process(self, obj) -> bool:
+        obj.normalize()
+        return obj.phoneno_e164 is not None
+
+    def after_update(self, changed: list):
+        registry.refresh({obj.phoneno_e164 for obj in changed})
+        search.index(
+            self.search_kind,
+            {getattr(obj, self.owner_field) for obj in changed})
+
+
+@register
+class UserPhoneE164Backfill(PhoneE164Backfill):
+    name = 'phone_e164'
+    model = Phone
+    search_kind = search.PROFILE
+    owner_field = 'profile_id'
+
+
+@register
+class PendingPhoneE164Backfill(PhoneE164Backfill):
+    name = 'pending_phone_e164'
+    model = PendingRelationshipPhone
+    search_kind = search.PENDING
+    owner_field = 'pending_relationship_id'
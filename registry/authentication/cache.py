@@ -0,0 +1,118 @@
+"""
+Shared cache of active users and their serialized payloads, used to
+authenticate requests and validate tokens without a database query.
+Users are cached as plain dicts of field values, never pickled models,
+so entries written by an older deploy still load.
+
+Emails that match no user are also cached for a short while, so
+repeated lookups of unknown emails are answered without a query.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from utils.base.metrics import record_cache
+
+
+def get_cache():
+    return caches[settings.USER_CACHE]
+
+
+def get_user_key(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """
+    Field values of a cached user, see `UserManager.to_cache`
+    """
+    data = get_cache().get(
+        get_user_key(user_id), version=settings.USER_CACHE_VERSION)
+    record_cache(hits=int(data is not None), misses=int(data is None))
+    return data
+
+
+def set_cached_user(user_id, data: dict):
+    get_cache().set(
+        get_user_key(user_id), data,
+        settings.USER_CACHE_TIMEOUT, version=settings.USER_CACHE_VERSION)
+
+
+def get_payload_key(user_id) -> str:
+    return f'user_payload:{user_id}'
+
+
+def get_cached_payloads(user_ids) -> dict:
+    """Serialized users found in the cache, by user id
+
+    :param user_ids: ids of the users to look up
+    :return: mapping of user id to serialized user
+    :rtype: dict
+    """
+    keys = {get_payload_key(user_id): user_id for user_id in user_ids}
+    found = get_cache().get_many(
+        keys.keys(), version=settings.USER_CACHE_VERSION)
+    record_cache(hits=len(found), misses=len(keys) - len(found))
+    return {keys[key]: payload for key, payload in found.items()}
+
+
+def set_cached_payloads(payloads: dict):
+    get_cache().set_many(
+        {
+            get_payload_key(user_id): payload
+            for user_id, payload in payloads.items()
+        },
+        settings.USER_CACHE_TIMEOUT, version=settings.USER_CACHE_VERSION)
+
+
+def invalidate_user(user_id):
+    get_cache().delete_many(
+        [get_user_key(user_id), get_payload_key(user_id)],
+        version=settings.USER_CACHE_VERSION)
+
+
+def invalidate_user_on_commit(user_id):
+    """
+    Drop the user now, and again once the transaction commits so a
+    concurrent request cannot cache the row as it was before the change.
+    """
+    invalidate_user(user_id)
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+def get_missing_email_key(email: str) -> str:
+    # Hashed, emails may contain characters cache keys can't
+    digest = hashlib.blake2b(email.lower().encode(), digest_size=16)
+    return f'missing_email:{digest.hexdigest()}'
+
+
+def is_missing_email(email: str) -> bool:
+    missing = get_cache().get(
+        get_missing_email_key(email), version=settings.USER_CACHE_VERSION)
+    record_cache(hits=int(missing is not None), misses=int(missing is None))
+    return missing is not None
+
+
+def set_missing_email(email: str):
+    get_cache().set(
+        get_missing_email_key(email), True,
+        settings.MISSING_EMAIL_CACHE_TIMEOUT,
+        version=settings.USER_CACHE_VERSION)
+
+
+def invalidate_missing_email_on_commit(email: str):
+    """
+    Forget that the email matched no user, now and on commit
+    """
+    invalidate_missing_emails_on_commit([email])
+
+
+def invalidate_missing_emails_on_commit(emails):
+    keys = [get_missing_email_key(email) for email in emails]
+
+    def invalidate():
+        get_cache().delete_many(keys, version=settings.USER_CACHE_VERSION)
+
+    invalidate()
+    transaction.on_commit(invalidate)
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+# FTS5 trigram tokenizer of the search index
+SQLITE_TRIGRAM_VERSION = (3, 34, 0)
+
+
+@register(deploy=True)
+def check_sms_provider(app_configs, **kwargs):
+    # Otps could not be texted, the first one sent would fail
+    if settings.SMS_PROVIDER:
+        return []
+    return [Error(
+        'SMS_PROVIDER is not set',
+        hint='Set it to utils.base.sms.TwilioSMSProvider, the local '
+             'provider is only the default with DEBUG',
+        id='authentication.E001',
+    )]
+
+
+@register
+def check_sqlite_version(app_configs, **kwargs):
+    # Migration 0008 could not create the search index
+    engines = {db['ENGINE'] for db in settings.DATABASES.values()}
+    if ('django.db.backends.sqlite3' not in engines
+            or sqlite3.sqlite_version_info >= SQLITE_TRIGRAM_VERSION):
+        return []
+    return [Error(
+        f'SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer',
+        hint='Search needs SQLite %s or newer, upgrade it or use '
+             'PostgreSQL' % '.'.join(map(str, SQLITE_TRIGRAM_VERSION)),
+        id='authentication.E002',
+    )]
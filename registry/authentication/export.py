@@ -0,0 +1,199 @@
+"""
+Streaming exports of the registry tables as NDJSON or CSV, for the
+analytics jobs.
+
+Rows are read as tuples through a server side cursor, in primary key
+order, and encoded in chunks of about `EXPORT_BUFFER_SIZE` bytes, so
+memory stays flat whatever the size of the table. `since` exports only
+the rows after an id, or after a time on the datasets with a
+timestamp, which lets nightly jobs fetch the deltas.
+
+Users are exported since their last change. Profiles and relationships
+are timestamped on creation, so their deltas only hold new rows, and
+jobs tracking edits, e.g. a relationship becoming married, re-export
+the whole table.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.serializers import ValidationError
+
+from .models import Partner, Phone, Profile, Relationship, User
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv; charset=utf-8',
+}
+
+
+@dataclass
+class Dataset:
+    model: type
+    fields: tuple
+    # Field compared with a `since` time, None for exports since an id
+    timestamp: Optional[str] = None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+
+DATASETS = {
+    'users': Dataset(
+        User,
+        ('id', 'email', 'verified_email', 'active', 'start_date'),
+        # Set on every save, so the changed users are exported
+        timestamp='start_date',
+    ),
+    'profiles': Dataset(
+        Profile,
+        ('id', 'user_id', 'fullname', 'sex', 'country', 'created'),
+        # Set on creation, edited profiles are not exported again
+        timestamp='created',
+    ),
+    'phones': Dataset(
+        Phone,
+        ('id', 'profile_id', 'phoneno', 'phoneno_e164', 'verified'),
+    ),
+    'partners': Dataset(
+        Partner,
+        ('id', 'profile_id', 'pending_relationship_id', 'partner_id'),
+    ),
+    'relationships': Dataset(
+        Relationship,
+        ('id', 'status', 'verified', 'created'),
+        # Set on creation, status changes are not exported again
+        timestamp='created',
+    ),
+    'relationship_partners': Dataset(
+        Relationship.partners.through,
+        ('id', 'relationship_id', 'partner_id'),
+    ),
+}
+
+
+def parse_since(value: str):
+    """An id, or an aware datetime for ISO dates and times
+
+    :raises ValidationError: when it is neither
+    """
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is not None:
+                moment = datetime.datetime.combine(day, datetime.time())
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError('Expected an id or an ISO date')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def get_rows(dataset: Dataset, since=None):
+    """Tuples of the dataset fields, in id order
+
+    :param since: id or datetime, only rows after it are returned
+    """
+    queryset = dataset.get_queryset()
+    if isinstance(since, int):
+        queryset = queryset.filter(pk__gt=since)
+    elif since is not None:
+        if dataset.timestamp is None:
+            raise ValidationError(
+                {'since': ['This dataset can only be exported since an id']})
+        queryset = queryset.filter(**{f'{dataset.timestamp}__gt': since})
+
+    return queryset.order_by('pk').values_list(*dataset.fields).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def encode_value(value):
+    # Full precision times, `since` exports start from them
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(fields, rows):
+    encoder = json.JSONEncoder(separators=(',', ':'), default=encode_value)
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def encode_csv(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(
+            encode_value(value) if isinstance(value, datetime.date)
+            else value for value in row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+ENCODERS = {NDJSON: encode_ndjson, CSV: encode_csv}
+
+
+def buffered(lines, size: int):
+    """
+    Join encoded lines into utf-8 chunks of about `size` bytes
+    """
+    parts, length = [], 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(parts).encode()
+            parts, length = [], 0
+    if parts:
+        yield ''.join(parts).encode()
+
+
+def gzipped(chunks):
+    """
+    Gzip a stream of chunks as they are produced
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(name: str, fmt: str = NDJSON, since=None, gzip: bool = False):
+    """Encoded rows of a dataset, as a stream of byte chunks
+
+    :param name: key of `DATASETS`
+    :type name: str
+    :param fmt: `NDJSON` or `CSV`
+    :type fmt: str
+    :param since: id or datetime from `parse_since`
+    :param gzip: compress the chunks
+    :type gzip: bool
+    """
+    dataset = DATASETS[name]
+    rows = get_rows(dataset, since)
+    chunks = buffered(
+        ENCODERS[fmt](dataset.fields, rows), settings.EXPORT_BUFFER_SIZE)
+    return gzipped(chunks) if gzip else chunks
@@ -0,0 +1,45 @@
+"""
+Password hashing off the request thread, in a bounded pool.
+
+Argon2 costs tens of milliseconds of CPU per check, running it in a
+dedicated pool keeps a burst of logins from starving other requests.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from utils.base.executors import BoundedExecutor
+from utils.base.metrics import timed
+
+hash_executor: BoundedExecutor = None
+
+
+def get_hash_executor() -> BoundedExecutor:
+    global hash_executor
+
+    if hash_executor is None:
+        hash_executor = BoundedExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+            name='password-hash',
+        )
+    return hash_executor
+
+
+async def acheck_password(user, raw_password) -> bool:
+    """Check a password in the hashing pool.
+
+    Raises `utils.base.executors.ExecutorBusy` when the pool is full.
+    Unlike `User.check_password` the stored hash is never upgraded,
+    so no database write happens in the pool.
+    """
+    with timed('hash'):
+        return await get_hash_executor().run(
+            check_password, raw_password, user.password)
+
+
+async def amake_password(raw_password) -> str:
+    """Hash a new password in the hashing pool.
+
+    Raises `utils.base.executors.ExecutorBusy` when the pool is full.
+    """
+    with timed('hash'):
+        return await get_hash_executor().run(make_password, raw_password)
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from utils.base.backfill import registry
+
+from authentication import backfills  # noqa: F401, registers the backfills
+from authentication.models import BackfillCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a registered backfill in primary key batches. Progress is '
+        'checkpointed after every batch so an interrupted run resumes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='Backfill to run')
+        parser.add_argument(
+            '--list', action='store_true', help='List the backfills')
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Rows per batch, defaults to the backfill batch size')
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Seconds to pause between batches to limit the load')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Start again from the first row')
+
+    def handle(self, *args, **options):
+        if options['list'] or not options['name']:
+            for name, backfill in sorted(registry.items()):
+                self.stdout.write(
+                    f'{name}: {backfill.model._meta.db_table} '
+                    f'({backfill().describe()})')
+            return
+
+        name = options['name']
+        if name not in registry:
+            raise CommandError(
+                f'Unknown backfill {name}, use --list to see them')
+        backfill = registry[name]()
+
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=name)
+        if options['restart']:
+            checkpoint.last_pk = checkpoint.scanned = 0
+            checkpoint.updated_rows = 0
+            checkpoint.completed = False
+        elif checkpoint.completed:
+            self.stdout.write(f'{name} already completed, use --restart')
+            return
+        elif checkpoint.last_pk:
+            self.stdout.write(f'Resuming {name} after pk {checkpoint.last_pk}')
+
+        max_pk = backfill.model._default_manager.aggregate(
+            max_pk=Max('pk'))['max_pk'] or 0
+        start = time.perf_counter()
+        scanned = 0
+
+        while True:
+            last_pk, batch_scanned, batch_updated = backfill.run_batch(
+                checkpoint.last_pk, options['batch_size'])
+            if last_pk is None:
+                break
+
+            scanned += batch_scanned
+            checkpoint.last_pk = last_pk
+            checkpoint.scanned += batch_scanned
+            checkpoint.updated_rows += batch_updated
+            checkpoint.save()
+
+            elapsed = time.perf_counter() - start
+            progress = min(last_pk / max_pk * 100, 100) if max_pk else 100
+            self.stdout.write(
+                f'{name}: pk {last_pk}/{max_pk} ({progress:.1f}%), '
+                f'{checkpoint.updated_rows} updated, '
+                f'{scanned / elapsed:.0f} rows/sec')
+            time.sleep(options['sleep'])
+
+        checkpoint.completed = True
+        checkpoint.save()
+        self.stdout.write(self.style.SUCCESS(
+            f'{name} completed, {checkpoint.scanned} rows scanned, '
+            f'{checkpoint.updated_rows} updated'))
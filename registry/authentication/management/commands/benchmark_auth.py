@@ -0,0 +1,490 @@
+import asyncio
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import (Argon2PasswordHasher,
+                                         MD5PasswordHasher,
+                                         PBKDF2PasswordHasher, make_password)
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+from utils.base.general import get_tokens_for_user
+from utils.base.queries import QueryCounter
+
+from authentication.models import Profile, User
+
+PASSWORD = 'Benchmark-passw0rd!'
+
+ENDPOINTS = ('register', 'login', 'token_validate', 'token_refresh', 'user')
+
+TRANSPORTS = ('client', 'async-client', 'wsgi', 'asgi')
+
+
+class BenchmarkArgon2PasswordHasher(Argon2PasswordHasher):
+    pass
+
+
+class BenchmarkPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    pass
+
+
+HASHERS = {
+    'argon2': BenchmarkArgon2PasswordHasher,
+    'pbkdf2': BenchmarkPBKDF2PasswordHasher,
+    'md5': MD5PasswordHasher,
+}
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class HTTPDriver:
+    """
+    Sends requests to a server over a keep-alive connection per thread
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.local = threading.local()
+
+    def get_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(
+                self.host, self.port, timeout=60)
+            conn.connect()
+            # Small requests should not wait on Nagle's algorithm
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def request(self, method, path, body=None, token=None) -> int:
+        headers = {'Content-Type': 'application/json'}
+        if token is not None:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = None if body is None else json.dumps(body).encode()
+
+        for retry in (True, False):
+            conn = self.get_connection()
+            try:
+                conn.request(method, path, payload, headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self.local.conn = None
+                if not retry:
+                    raise
+
+
+class ClientDriver:
+    """
+    Calls the views in process with a test client per thread
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None) -> int:
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+
+        extra = {}
+        if token is not None:
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        data = '' if body is None else json.dumps(body)
+        return client.generic(
+            method, path, data, content_type='application/json', **extra
+        ).status_code
+
+
+class AsyncDriver:
+    """
+    Calls the ASGI handler in process, concurrency comes from tasks
+    """
+
+    async def request(self, client, method, path, body=None, token=None):
+        extra = {}
+        if token is not None:
+            extra['AUTHORIZATION'] = f'Bearer {token}'
+        data = '' if body is None else json.dumps(body)
+        response = await client.generic(
+            method, path, data, content_type='application/json', **extra)
+        return response.status_code
+
+    def run_all(self, requests, concurrency):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(request):
+                async with semaphore:
+                    sent = time.perf_counter()
+                    try:
+                        status = await self.request(client, *request)
+                    except Exception:
+                        status = None
+                    return status, time.perf_counter() - sent
+
+            return await asyncio.gather(*map(send, requests))
+
+        return asyncio.run(run())
+
+
+class DriverContext:
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self.driver
+
+    def __exit__(self, *exc):
+        return False
+
+
+class WSGIServerContext:
+    """
+    The WSGI application served by a threaded server on a free port
+    """
+
+    def __enter__(self):
+        from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                                  WSGIRequestHandler)
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately
+                self.connection.setsockopt(
+                    socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        self.server.daemon_threads = True
+        self.server.set_app(get_wsgi_application())
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return HTTPDriver(*self.server.server_address[:2])
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        return False
+
+
+class ASGIServerContext:
+    """
+    The ASGI application served by uvicorn on a free port
+    """
+
+    def __enter__(self):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('The asgi transport needs uvicorn installed')
+        from django.core.asgi import get_asgi_application
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', 0))
+        self.sock = sock
+
+        config = uvicorn.Config(
+            get_asgi_application(), lifespan='off',
+            log_level='warning', access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(
+            target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.thread.start()
+
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise CommandError('uvicorn failed to start')
+            time.sleep(0.01)
+        return HTTPDriver(*sock.getsockname()[:2])
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+        self.sock.close()
+        return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the auth endpoints against a freshly seeded test '
+        'database and report latency percentiles, requests/sec and '
+        'queries per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--transport', choices=TRANSPORTS, default='client',
+            help='client and async-client call the WSGI or ASGI handler in '
+                 'process, wsgi and asgi (uvicorn) serve it over HTTP')
+        parser.add_argument(
+            '--async-views', action='store_true',
+            help='Use the async/ versions of the endpoints')
+        parser.add_argument(
+            '--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS,
+            help='Endpoints to benchmark, one after the other')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Requests sent to each endpoint')
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Requests in flight at the same time')
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Users seeded before the run')
+        parser.add_argument(
+            '--hasher', choices=('default',) + tuple(HASHERS),
+            default='default',
+            help='Password hasher, md5 makes hashing negligible so I/O bound '
+                 'costs can be measured apart from CPU bound ones')
+        parser.add_argument(
+            '--hash-cost', type=int,
+            help='Argon2 time cost or PBKDF2 iterations')
+        parser.add_argument(
+            '--throttle', action='store_true',
+            help='Keep the throttles of the auth endpoints enabled')
+        parser.add_argument(
+            '--output', help='Write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be >= 1')
+
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        hasher = options['hasher']
+        if hasher != 'default':
+            self.set_hash_cost(HASHERS[hasher], options['hash_cost'])
+            path = HASHERS[hasher]
+            overrides['PASSWORD_HASHERS'] = [
+                f'{path.__module__}.{path.__name__}']
+        if not options['throttle']:
+            overrides['REST_FRAMEWORK'] = {
+                **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+
+        setup_test_environment()
+        old_name = self.create_database()
+        try:
+            with override_settings(**overrides):
+                report = self.run_benchmark()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def set_hash_cost(self, hasher, cost):
+        if cost is None:
+            return
+        if hasher is BenchmarkArgon2PasswordHasher:
+            hasher.time_cost = cost
+        elif hasher is BenchmarkPBKDF2PasswordHasher:
+            hasher.iterations = cost
+        else:
+            raise CommandError(f'{hasher.algorithm} has no cost to set')
+
+    def create_database(self):
+        """
+        Create the test database, on disk for SQLite
+        so server threads share it
+        """
+        if connection.vendor == 'sqlite':
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict['TEST']['NAME'] = path
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        return old_name
+
+    def seed(self):
+        count = self.options['users']
+        # Users share one password, so it is hashed once
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                email=f'benchmark-{i}@registry.local',
+                password=password,
+                active=True,
+                verified_email=True,
+            )
+            for i in range(count)
+        ])
+        ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        Profile.objects.bulk_create([
+            Profile(user_id=user_id, fullname='Benchmark User', country='NG')
+            for user_id in ids
+        ])
+        return [
+            (user, get_tokens_for_user(user))
+            for user in User.objects.filter(id__in=ids)
+        ]
+
+    def get_requests(self, endpoint, users):
+        """
+        Build (method, url name, body, access token) for each request
+        """
+        n = self.options['requests']
+        requests = []
+        for i in range(n):
+            user, tokens = users[i % len(users)]
+            if endpoint == 'register':
+                requests.append(('POST', 'register', {
+                    'email': f'register-{uuid.uuid4().hex}@registry.local',
+                    'password': PASSWORD,
+                    'fullname': 'Benchmark User',
+                    'country': 'NG',
+                }, None))
+            elif endpoint == 'login':
+                requests.append((
+                    'POST', 'login',
+                    {'email': user.email, 'password': PASSWORD}, None))
+            elif endpoint == 'token_validate':
+                requests.append((
+                    'POST', 'token_validate',
+                    {'token': tokens['access']}, None))
+            elif endpoint == 'token_refresh':
+                requests.append((
+                    'POST', 'token_refresh',
+                    {'refresh': tokens['refresh']}, None))
+            else:
+                requests.append(('GET', 'user-detail', None, tokens['access']))
+        return requests
+
+    def get_url(self, name):
+        if self.options['async_views']:
+            name = f'{name}_async'
+        return reverse(f'auth:{name}')
+
+    def install_counter(self, sender, connection, **kwargs):
+        if self.counter not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.counter)
+
+    def run_benchmark(self):
+        users = self.seed()
+        if not users:
+            raise CommandError('--users must be >= 1')
+
+        counter = self.counter = QueryCounter()
+        # Server threads open their own connections
+        connection_created.connect(self.install_counter)
+        for conn in connections.all():
+            self.install_counter(None, conn)
+
+        try:
+            with self.get_driver() as driver:
+                results = {}
+                for endpoint in self.options['endpoints']:
+                    requests = [
+                        (method, self.get_url(name), body, token)
+                        for method, name, body, token
+                        in self.get_requests(endpoint, users)
+                    ]
+                    queries = counter.count
+                    results[endpoint] = self.run_endpoint(driver, requests)
+                    results[endpoint]['queries_per_request'] = round(
+                        (counter.count - queries) / len(requests), 2)
+        finally:
+            connection_created.disconnect(self.install_counter)
+            for conn in connections.all():
+                if counter in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(counter)
+
+        return {
+            'meta': {
+                'transport': self.options['transport'],
+                'async_views': self.options['async_views'],
+                'requests': self.options['requests'],
+                'concurrency': self.options['concurrency'],
+                'users': self.options['users'],
+                'hasher': settings.PASSWORD_HASHERS[0],
+                'hash_cost': self.options['hash_cost'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+
+    def run_endpoint(self, driver, requests) -> dict:
+        timings, errors = [], 0
+        concurrency = self.options['concurrency']
+
+        if isinstance(driver, AsyncDriver):
+            start = time.perf_counter()
+            outcomes = driver.run_all(requests, concurrency)
+        else:
+            def send(request):
+                sent = time.perf_counter()
+                try:
+                    status = driver.request(*request)
+                except Exception:
+                    status = None
+                return status, time.perf_counter() - sent
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(send, requests))
+        elapsed = time.perf_counter() - start
+
+        for status, duration in outcomes:
+            if status is None or status >= 400:
+                errors += 1
+            timings.append(duration * 1000)
+
+        timings.sort()
+        return {
+            'requests': len(requests),
+            'errors': errors,
+            'requests_per_second': round(len(requests) / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(timings, 50), 3),
+                'p95': round(percentile(timings, 95), 3),
+                'p99': round(percentile(timings, 99), 3),
+                'mean': round(sum(timings) / len(timings), 3),
+            },
+        }
+
+    def get_driver(self):
+        transport = self.options['transport']
+        if transport == 'client':
+            return DriverContext(ClientDriver())
+        if transport == 'async-client':
+            return DriverContext(AsyncDriver())
+        if transport == 'wsgi':
+            return WSGIServerContext()
+        return ASGIServerContext()
@@ -0,0 +1,140 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, like a worker that was just spawned
+FIRST_RESPONSE_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+from wsgiref.util import setup_testing_defaults
+application = get_wsgi_application()
+ready = time.perf_counter()
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2]}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(
+    environ, lambda status, headers, *args: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    'setup': ready - start,
+    'first_response': done - start,
+    'status': statuses[0],
+}))
+'''
+
+IMPORT_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.conf import settings; '
+    'from importlib import import_module; '
+    'import_module(settings.ROOT_URLCONF)'
+)
+
+
+def parse_importtime(output: str) -> dict:
+    """Cumulative import time in seconds of every top level package,
+    from the `-X importtime` report
+
+    :return: seconds by package, the slowest first
+    :rtype: dict
+    """
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented, their time is in their parent's
+        if name.startswith('  '):
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def get_host() -> str:
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the cold start of a worker: the imports done by '
+        'django.setup() and the URLconf, from python -X importtime, and '
+        'the time from loading the settings to the first response. '
+        'With --check it fails when STARTUP_IMPORT_BUDGET or '
+        'STARTUP_FIRST_RESPONSE_BUDGET is exceeded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Fresh interpreters started, the median '
+                                 'is reported')
+        parser.add_argument('--path', default='/.well-known/jwks.json',
+                            help='Path of the first request')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Number of packages listed')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail when a budget is exceeded')
+
+    def run_python(self, *args) -> subprocess.CompletedProcess:
+        result = subprocess.run(
+            [sys.executable, *args], capture_output=True, text=True,
+            env=os.environ.copy())
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return result
+
+    def handle(self, *args, **options):
+        runs = max(options['runs'], 1)
+
+        imports = []
+        for _ in range(runs):
+            output = self.run_python(
+                '-X', 'importtime', '-c', IMPORT_SCRIPT).stderr
+            imports.append(parse_importtime(output))
+        total = statistics.median(sum(run.values()) for run in imports)
+
+        timings = [
+            json.loads(self.run_python(
+                '-c', FIRST_RESPONSE_SCRIPT, options['path'], get_host(),
+            ).stdout)
+            for _ in range(runs)
+        ]
+        setup = statistics.median(timing['setup'] for timing in timings)
+        first_response = statistics.median(
+            timing['first_response'] for timing in timings)
+
+        self.stdout.write(f'Imports, median of {runs} runs')
+        packages = imports[len(imports) // 2]
+        for package, seconds in list(packages.items())[:options['top']]:
+            self.stdout.write(f'  {package:<30} {seconds * 1000:8.1f}ms')
+        self.stdout.write(f'  {"total":<30} {total * 1000:8.1f}ms')
+        self.stdout.write(
+            f'Setup {setup * 1000:.1f}ms, first response '
+            f'{first_response * 1000:.1f}ms '
+            f'({options["path"]} {timings[0]["status"]})')
+
+        if not options['check']:
+            return
+        failures = []
+        if total > settings.STARTUP_IMPORT_BUDGET:
+            failures.append(
+                f'imports took {total * 1000:.0f}ms, the budget is '
+                f'{settings.STARTUP_IMPORT_BUDGET * 1000:.0f}ms')
+        if first_response > settings.STARTUP_FIRST_RESPONSE_BUDGET:
+            failures.append(
+                f'the first response took {first_response * 1000:.0f}ms, '
+                'the budget is '
+                f'{settings.STARTUP_FIRST_RESPONSE_BUDGET * 1000:.0f}ms')
+        if failures:
+            raise CommandError('Over budget: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Within budget'))
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.serializers import ValidationError
+
+from authentication import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a table as NDJSON or CSV, to a file or stdout. With '
+        '--since only the rows after an id, or after an ISO date or '
+        'time, are exported: users changed since then, profiles and '
+        'relationships created since then.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default=export.NDJSON)
+        parser.add_argument('--since', help='Id or ISO date or time')
+        parser.add_argument('--output', '-o',
+                            help='File to write, stdout by default')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Compress the output')
+
+    def handle(self, *args, **options):
+        try:
+            since = options['since'] and export.parse_since(options['since'])
+            chunks = export.export(
+                options['dataset'], options['format'], since,
+                gzip=options['gzip'])
+        except ValidationError as e:
+            detail = e.detail
+            if isinstance(detail, dict):
+                detail = detail['since']
+            raise CommandError(detail[0])
+
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,54 @@
+import os
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.signing import SigningKey
+
+
+class Command(BaseCommand):
+    help = (
+        'Create a private key for signing jwts. To rotate keys put the '
+        'new file first in JWT_KEYS and keep the old one after it until '
+        'its tokens have expired.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File the PEM key is written to')
+        parser.add_argument(
+            '--algorithm', choices=('RS256', 'EdDSA'), default='EdDSA',
+            help='EdDSA keys are smaller and sign faster, RS256 '
+                 'verifies faster')
+        parser.add_argument('--bits', type=int, default=2048,
+                            help='Size of RSA keys')
+        parser.add_argument('--public', action='store_true',
+                            help='Also write the public key to <path>.pub')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.exists(path):
+            raise CommandError(f'{path} already exists')
+
+        if options['algorithm'] == 'RS256':
+            key = rsa.generate_private_key(
+                public_exponent=65537, key_size=options['bits'])
+        else:
+            key = ed25519.Ed25519PrivateKey.generate()
+
+        pem = key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption())
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(pem)
+
+        if options['public']:
+            with open(f'{path}.pub', 'wb') as file:
+                file.write(key.public_key().public_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PublicFormat.SubjectPublicKeyInfo))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {path}, kid {SigningKey(key).kid}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from utils.base import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema served outside of DEBUG, as JSON '
+        'and YAML with compressed variants. Run it on every deploy.'
+    )
+
+    def handle(self, *args, **options):
+        for path in schema.write(schema.generate()):
+            self.stdout.write(f'Wrote {path}')
+        if schema.brotli is None:
+            self.stdout.write(self.style.WARNING(
+                'brotli is not installed, only gzip variants were written'))
@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from rest_framework.serializers import ValidationError
+from utils.base.validators import normalize_phone
+
+from authentication import search
+from authentication.cache import invalidate_missing_emails_on_commit
+from authentication.models import Phone, Profile, User
+
+# Sex codes by code and label, e.g. `F` and `FEMALE`
+SEXES = {
+    key.upper(): code for code, label in Profile.SEX for key in (code, label)
+}
+
+
+def init_worker():
+    # Needed with the spawn start method, forked workers are set up
+    if not apps.ready:
+        django.setup()
+
+
+def hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def read_rows(path, fmt):
+    """
+    Stream rows from a csv or jsonl file as dicts
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if fmt == 'csv':
+            for row in csv.DictReader(file):
+                phones = row.get('phones') or ''
+                row['phones'] = [p for p in phones.split(';') if p.strip()]
+                yield row
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_sex(value) -> str:
+    value = str(value or '').strip()
+    if not value:
+        return ''
+    if value.upper() not in SEXES:
+        raise DjangoValidationError(f'Unknown sex {value}')
+    return SEXES[value.upper()]
+
+
+def to_bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+class Command(BaseCommand):
+    help = (
+        'Import users, profiles and phones from a csv or jsonl file. '
+        'Rows are inserted in chunks with bulk_create, passwords are '
+        'hashed in a process pool and the progress is checkpointed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='csv or jsonl file to import')
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'),
+            help='Input format, guessed from the file extension by default')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Rows inserted per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes hashing passwords')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording imported rows, used to resume an import. '
+                 'Defaults to <path>.checkpoint')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.verbosity = options['verbosity']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.endswith('.csv') else 'jsonl'
+
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        done = 0 if options['restart'] else self.read_checkpoint()
+        if done:
+            self.stdout.write(f'Resuming after {done} rows')
+
+        self.stats = {'created': 0, 'skipped': 0, 'invalid': 0}
+        chunk_size = options['chunk_size']
+        rows = islice(read_rows(path, fmt), done, None)
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=init_worker
+        ) as pool:
+            pending = None
+            for chunk in chunked(rows, chunk_size):
+                # Hash the next chunk while the previous one is written
+                prepared = self.prepare(chunk)
+                hashing = self.submit_hashing(
+                    pool, prepared, options['workers'])
+                if pending is not None:
+                    done = self.write(*pending, done)
+                    self.report(done, start)
+                pending = (chunk, prepared, hashing)
+
+            if pending is not None:
+                done = self.write(*pending, done)
+
+        elapsed = time.perf_counter() - start
+        created = self.stats['created']
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} users in {elapsed:.1f}s '
+            f'({created / elapsed if elapsed else 0:.0f} rows/sec), '
+            f'skipped {self.stats["skipped"]} existing, '
+            f'{self.stats["invalid"]} invalid'))
+
+    def read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path) as file:
+                return json.load(file)['rows']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, rows: int):
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'rows': rows}, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def submit_hashing(self, pool, prepared, workers):
+        passwords = [row['password'] for row in prepared]
+        size = max(1, -(-len(passwords) // max(workers, 1)))
+        return [
+            pool.submit(hash_passwords, batch)
+            for batch in chunked(passwords, size)
+        ]
+
+    def prepare(self, chunk):
+        """
+        Validate and normalize rows, invalid and duplicate rows are dropped
+        """
+        prepared = {}
+        for row in chunk:
+            try:
+                email = User.objects.normalize_email(
+                    (row.get('email') or '').strip())
+                validate_email(email)
+
+                fullname = (row.get('fullname') or '').strip()
+                # Lengths too, a long value would fail the whole chunk
+                Profile._meta.get_field('fullname').run_validators(fullname)
+                sex = to_sex(row.get('sex'))
+                country = str(row.get('country') or '').strip()
+                Profile._meta.get_field('country').run_validators(country)
+                # Imported numbers are stored in their E.164 form
+                phones = [
+                    normalize_phone(str(phone))
+                    for phone in row.get('phones') or []
+                ]
+            except (ValidationError, DjangoValidationError) as e:
+                self.stats['invalid'] += 1
+                if self.verbosity > 1:
+                    self.stderr.write(f'Invalid row {row}: {e}')
+                continue
+
+            prepared.setdefault(email.lower(), {
+                'email': email,
+                'password': row.get('password') or None,
+                'fullname': fullname,
+                'country': country,
+                'sex': sex,
+                'phones': phones,
+                'active': to_bool(row.get('active'), True),
+                'verified_email': to_bool(row.get('verified_email'), False),
+            })
+        return list(prepared.values())
+
+    def write(self, chunk, prepared, hashing, done) -> int:
+        hashes = [h for future in hashing for h in future.result()]
+
+        with transaction.atomic():
+            # Emails are unique whatever their case
+            existing = set(User.objects.annotate(
+                email_lower=Lower('email'),
+            ).filter(
+                email_lower__in=[row['email'].lower() for row in prepared]
+            ).values_list('email_lower', flat=True))
+
+            rows, users = [], []
+            for row, password in zip(prepared, hashes):
+                if row['email'].lower() in existing:
+                    self.stats['skipped'] += 1
+                    continue
+                rows.append(row)
+                users.append(User(
+                    email=row['email'],
+                    password=password,
+                    active=row['active'],
+                    verified_email=row['verified_email'],
+                ))
+
+            # bulk_create sends no post_save, the profiles are created and
+            # the cached misses of the emails dropped here
+            users = User.objects.bulk_create(users)
+            invalidate_missing_emails_on_commit([u.email for u in users])
+            if users and users[0].pk is None:
+                ids = dict(User.objects.filter(
+                    email__in=[u.email for u in users]
+                ).values_list('email', 'id'))
+                for user in users:
+                    user.pk = ids[user.email]
+
+            profiles = Profile.objects.bulk_create([
+                Profile(
+                    user_id=user.pk,
+                    fullname=row['fullname'],
+                    country=row['country'],
+                    sex=row['sex'],
+                )
+                for user, row in zip(users, rows)
+            ])
+            if profiles and profiles[0].pk is None:
+                ids = dict(Profile.objects.filter(
+                    user_id__in=[u.pk for u in users]
+                ).values_list('user_id', 'id'))
+                for profile in profiles:
+                    profile.pk = ids[profile.user_id]
+
+            Phone.objects.bulk_create([
+                Phone(
+                    phoneno=phone,
+                    phoneno_e164=phone,
+                    profile_id=profile.pk,
+                )
+                for profile, row in zip(profiles, rows)
+                for phone in row['phones']
+            ])
+            # Search entries too, as for the profiles above
+            search.index(search.PROFILE, [profile.pk for profile in profiles])
+
+        self.stats['created'] += len(users)
+        done += len(chunk)
+        self.write_checkpoint(done)
+        return done
+
+    def report(self, done, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{done} rows processed, {self.stats["created"]} created, '
+            f'{self.stats["created"] / elapsed if elapsed else 0:.0f} '
+            f'rows/sec')
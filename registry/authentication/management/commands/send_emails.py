@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from authentication.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            help='Maximum number of emails sent per connection')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the outbox instead of exiting when empty')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when the outbox is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = {'sent': 0, 'retried': 0, 'failed': 0}
+
+        while True:
+            stats = deliver_batch(batch_size)
+            for key, value in stats.items():
+                total[key] += value
+
+            if not any(stats.values()):
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Sent {sent}, retrying {retried}, failed {failed}'.format(
+                **total)))
@@ -0,0 +1,51 @@
+# Generated by Django 4.0 on 2026-10-18 17:27
+
+from django.db import migrations, models
+from rest_framework.serializers import ValidationError
+from utils.base.validators import normalize_phone
+
+
+def normalize_phones(apps, schema_editor):
+    for name in ('Phone', 'PendingRelationshipPhone'):
+        model = apps.get_model('authentication', name)
+        batch = []
+        for phone in model.objects.filter(
+                phoneno_e164__isnull=True).iterator(chunk_size=1000):
+            try:
+                phone.phoneno_e164 = normalize_phone(phone.phoneno)
+            except ValidationError:
+                continue
+            batch.append(phone)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['phoneno_e164'])
+                batch = []
+        model.objects.bulk_update(batch, ['phoneno_e164'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingrelationshipphone',
+            name='phoneno_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='phoneno_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pendingrelationshipphone',
+            index=models.Index(fields=['phoneno_e164'], name='pending_phone_e164_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['phoneno_e164'], name='phone_e164_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.0 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from utils.base.migrations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('authentication', '0004_backfillcheckpoint'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['start_date'], name='user_start_date_idx'),
+        ),
+    ]
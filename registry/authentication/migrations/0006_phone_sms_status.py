@@ -0,0 +1,43 @@
+# Generated by Django 4.0 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0005_user_start_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingrelationshipphone',
+            name='sms_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pendingrelationshipphone',
+            name='sms_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pendingrelationshipphone',
+            name='sms_status',
+            field=models.CharField(blank=True, choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='sms_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='sms_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='sms_status',
+            field=models.CharField(blank=True, choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0 on 2026-10-18 17:47
+
+from django.db import migrations, models
+import django.db.models.functions.text
+from utils.base.migrations import AddConstraintConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('authentication', '0006_phone_sms_status'),
+    ]
+
+    operations = [
+        AddConstraintConcurrently(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_lower_uniq'),
+        ),
+    ]
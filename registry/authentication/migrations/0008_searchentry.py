@@ -0,0 +1,99 @@
+# Generated by Django 4.0 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE authentication_search_fts USING fts5(
+        name, country, phones,
+        content='authentication_searchentry', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER authentication_search_insert
+    AFTER INSERT ON authentication_searchentry BEGIN
+        INSERT INTO authentication_search_fts(rowid, name, country, phones)
+        VALUES (new.id, new.name, new.country, new.phones);
+    END
+    """,
+    """
+    CREATE TRIGGER authentication_search_delete
+    AFTER DELETE ON authentication_searchentry BEGIN
+        INSERT INTO authentication_search_fts(
+            authentication_search_fts, rowid, name, country, phones)
+        VALUES ('delete', old.id, old.name, old.country, old.phones);
+    END
+    """,
+    """
+    CREATE TRIGGER authentication_search_update
+    AFTER UPDATE ON authentication_searchentry BEGIN
+        INSERT INTO authentication_search_fts(
+            authentication_search_fts, rowid, name, country, phones)
+        VALUES ('delete', old.id, old.name, old.country, old.phones);
+        INSERT INTO authentication_search_fts(rowid, name, country, phones)
+        VALUES (new.id, new.name, new.country, new.phones);
+    END
+    """,
+]
+
+POSTGRES_INDEX = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX search_document_trgm_idx
+    ON authentication_searchentry USING gin (document gin_trgm_ops)
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_INDEX
+    elif vendor == 'postgresql':
+        statements = POSTGRES_INDEX
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for action in ('insert', 'delete', 'update'):
+            schema_editor.execute(
+                f'DROP TRIGGER authentication_search_{action}')
+        schema_editor.execute('DROP TABLE authentication_search_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX search_document_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_user_email_lower_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('profile', 'Profile'), ('pending', 'Pending relationship')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=50)),
+                ('country', models.CharField(blank=True, max_length=60)),
+                ('phones', models.TextField(blank=True)),
+                ('document', models.TextField()),
+            ],
+            options={
+                'verbose_name_plural': 'Search entries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_uniq'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0008_searchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identifier', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('dating', 'Dating'), ('married', 'Married')], max_length=10)),
+                ('relationship_verified', models.BooleanField(default=False)),
+                ('verified', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Registry entries',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0 on 2026-10-18 21:02
+
+from django.db import migrations, models
+import django.utils.timezone
+from utils.base.migrations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('authentication', '0009_registryentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='relationship',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        AddIndexConcurrently(
+            model_name='profile',
+            index=models.Index(fields=['created', 'id'], name='profile_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='relationship',
+            index=models.Index(fields=['created', 'id'], name='relationship_created_idx'),
+        ),
+    ]
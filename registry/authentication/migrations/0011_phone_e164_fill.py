@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import migrations
+from rest_framework.serializers import ValidationError
+from utils.base.validators import normalize_phone
+
+
+def normalize_phones(apps, schema_editor):
+    # Large tables are filled online with `manage.py backfill phone_e164`
+    # and `manage.py backfill pending_phone_e164`, which also refresh
+    # the registry and search entries. Rows filled here need
+    # `backfill registry_phones` and `backfill search_profiles` after
+    if settings.DEFER_BACKFILLS:
+        return
+
+    for name in ('Phone', 'PendingRelationshipPhone'):
+        model = apps.get_model('authentication', name)
+        queryset = model.objects.filter(phoneno_e164__isnull=True)
+        last_pk = 0
+        while True:
+            # Committed in batches, the migration is not atomic
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:1000])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for phone in batch:
+                try:
+                    phone.phoneno_e164 = normalize_phone(phone.phoneno)
+                except ValidationError:
+                    continue
+                changed.append(phone)
+            model.objects.bulk_update(changed, ['phoneno_e164'])
+
+
+class Migration(migrations.Migration):
+    """
+    Numbers saved without their E.164 form since 0003, e.g. by queryset
+    updates, which skip `PhoneNumber.save`
+    """
+    atomic = False
+
+    dependencies = [
+        ('authentication', '0010_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,68 @@
-from typing import TypeVar
+from typing import Optional, TypeVar
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from utils.base.general import send_email
-from utils.base.validators import validate_phone, validate_special_char
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from utils.base.logger import logger
+from utils.base.metrics import timed
+from utils.base.validators import (normalize_phone, validate_phone,
+                                   validate_special_char)
+
+from .cache import (get_cached_user, invalidate_missing_email_on_commit,
+                    invalidate_user_on_commit, is_missing_email,
+                    set_cached_user, set_missing_email)
+from .otp import EMAIL_VERIFY, otp_store
 
 T = TypeVar('T', bound=AbstractBaseUser)
 
 
+def get_field_values(instance) -> dict:
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    }
+
+
+def from_field_values(model, db: str, values: dict):
+    # Values of removed fields are ignored
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(db, fields, [values[name] for name in fields])
+
+
 class UserManager(BaseUserManager):
-    def create_base_user(
+    def with_details(self):
+        """
+        Users with their profile, phones, partner and relationships
+        loaded in a fixed number of queries
+        """
+        partners = Partner.objects.select_related(
+            'profile', 'pending_relationship')
+        relationships = Relationship.objects.prefetch_related(
+            models.Prefetch('partners', queryset=partners))
+        return self.select_related(
+            'profile__partner',
+        ).prefetch_related(
+            'profile__phone_set',
+            models.Prefetch(
+                'profile__partner__relationship_set',
+                queryset=relationships),
+        )
+
+    def build_user(
         self, email, is_active=True,
         is_staff=False, is_admin=False
     ) -> T:
+        """
+        Unsaved user, the password is left for the caller to set
+        """
         if not email:
             raise ValueError("User must provide an email")
 
@@ -24,19 +72,93 @@ class UserManager(BaseUserManager):
         user.active = is_active
         user.admin = is_admin
         user.staff = is_staff
+        return user
+
+    def create_base_user(
+        self, email, is_active=True,
+        is_staff=False, is_admin=False
+    ) -> T:
+        user = self.build_user(email, is_active, is_staff, is_admin)
         user.set_unusable_password()
         user.save(using=self._db)
         return user
 
     def create_user(
         self, email, password=None, is_active=True,
-        is_staff=False, is_admin=False
+        is_staff=False, is_admin=False, password_hash=None, profile=None
     ) -> T:
-        user = self.create_base_user(email, is_active, is_staff, is_admin)
-        if not password:
+        """Create a user and its profile with one insert each
+
+        :param password_hash: password already hashed,
+            e.g. in the hashing pool, used instead of `password`
+        :type password_hash: str, optional
+        :param profile: fields of the profile created with the user
+        :type profile: dict, optional
+        """
+        if not password and not password_hash:
             raise ValueError("User must provide a password")
-        user.set_password(password)
-        user.save()
+
+        user = self.build_user(email, is_active, is_staff, is_admin)
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(password)
+        # Read by the `create_profile` signal
+        user.profile_fields = profile or {}
+        user.save(using=self._db)
+        return user
+
+    def get_active(self, user_id) -> T:
+        """
+        Get an active user with its profile, from the user cache
+        when possible. Raises DoesNotExist like `get`.
+        """
+        data = get_cached_user(user_id)
+        if data is not None:
+            return self.from_cache(data)
+
+        user = self.select_related('profile').get(id=user_id, active=True)
+        set_cached_user(user.pk, self.to_cache(user))
+        return user
+
+    def to_cache(self, user) -> dict:
+        """
+        Field values of a user and its profile, for the user cache
+        """
+        try:
+            profile = user.profile
+        except Profile.DoesNotExist:
+            profile = None
+        return {
+            'user': get_field_values(user),
+            'profile': None if profile is None else get_field_values(profile),
+        }
+
+    def from_cache(self, data: dict) -> T:
+        """
+        User and profile from `to_cache` values. Fields missing from
+        older entries are deferred and loaded on access
+        """
+        user = from_field_values(self.model, self.db, data['user'])
+        if data['profile'] is not None:
+            user.profile = from_field_values(
+                Profile, self.db, data['profile'])
+        return user
+
+    def find_by_email(self, email) -> Optional[T]:
+        """User with its profile by email, ignoring case, or None.
+
+        A single query on the `user_email_lower_uniq` index, and none
+        for emails recently found to match no user.
+        """
+        if is_missing_email(email):
+            return None
+
+        user = self.select_related('profile').alias(
+            email_lower=Lower('email')
+        ).filter(email_lower=email.lower()).first()
+        if user is None:
+            set_missing_email(email)
         return user
 
     def create_staff(self, email, password=None) -> T:
@@ -63,6 +185,14 @@ class User(AbstractBaseUser):
 
     objects = UserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Read by the registry signals to skip saves that keep them
+        user.registry_state = (
+            user.__dict__.get('email'), user.__dict__.get('verified_email'))
+        return user
+
     def has_perm(self, perm, obj=None):
         return True
 
@@ -70,16 +200,40 @@ class User(AbstractBaseUser):
         return True
 
     def mail(self, subject, message, fail=True):
-        val = send_email(
-            email=self.email, subject=subject, message=message, fail=fail
+        """
+        Queue an email for this user, it is delivered by the
+        `send_emails` worker and never on the request path.
+        """
+        EmailOutbox.objects.enqueue(
+            email=self.email, subject=subject, message=message
         )
-        return True if val else False
+        return True
+
+    def check_password(self, raw_password):
+        with timed('hash'):
+            return super().check_password(raw_password)
+
+    def set_password(self, raw_password):
+        with timed('hash'):
+            super().set_password(raw_password)
 
-    def verify_otp(self, otp: int):
+    def verify_otp(self, otp, purpose: str = EMAIL_VERIFY):
         """
-        Validate the otp
+        Validate and consume an otp issued to this user
         """
-        return self.otp == otp
+        return otp_store.verify(purpose, self.pk, otp)
+
+    def verify_email(self, otp) -> bool:
+        """
+        Mark the email verified if the otp is valid
+        """
+        if not self.verify_otp(otp, EMAIL_VERIFY):
+            return False
+
+        if not self.verified_email:
+            self.verified_email = True
+            self.save(update_fields=['verified_email'])
+        return True
 
     @property
     def is_active(self):
@@ -94,10 +248,17 @@ class User(AbstractBaseUser):
         return self.admin
 
     def __str__(self):
-        return self.fullname
+        return self.email
 
     class Meta:
         verbose_name = 'User'
+        indexes = [
+            models.Index(fields=['start_date'], name='user_start_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'), name='user_email_lower_uniq'),
+        ]
 
 
 class Profile(models.Model):
@@ -113,23 +274,75 @@ class Profile(models.Model):
     sex = models.CharField(
         choices=SEX, max_length=1, blank=True)
     country = models.CharField(max_length=60, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created', 'id'], name='profile_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.fullname
 
 
-class Phone(models.Model):
+class PhoneNumber(models.Model):
+    """
+    Phone number kept with its E.164 form, which is used for lookups,
+    and the delivery status of the last verification sms
+    """
+    SMS_QUEUED = 'queued'
+    SMS_SENT = 'sent'
+    SMS_FAILED = 'failed'
+    SMS_STATUS = [
+        (SMS_QUEUED, 'Queued',),
+        (SMS_SENT, 'Sent',),
+        (SMS_FAILED, 'Failed',),
+    ]
+
     phoneno = models.CharField(
         max_length=16,
         validators=[validate_phone],
         help_text='Enter a correct phone number',
     )
+    phoneno_e164 = models.CharField(
+        max_length=16, null=True, blank=True, editable=False)
     verified = models.BooleanField(default=False)
-    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    sms_status = models.CharField(
+        choices=SMS_STATUS, max_length=10, blank=True)
+    sms_attempts = models.PositiveSmallIntegerField(default=0)
+    sms_error = models.CharField(max_length=255, blank=True)
+
+    def normalize(self):
+        try:
+            self.phoneno_e164 = normalize_phone(self.phoneno)
+        except ValidationError:
+            self.phoneno_e164 = None
+
+    def save(self, *args, **kwargs):
+        # Read by the registry signals when the number changes
+        self.previous_e164 = self.phoneno_e164
+        self.normalize()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phoneno' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phoneno_e164'}
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.phoneno
 
+    class Meta:
+        abstract = True
+
+
+class Phone(PhoneNumber):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phoneno_e164'], name='phone_e164_idx'),
+        ]
+
 
 class PendingRelationship(models.Model):
     creator = models.ForeignKey(
@@ -152,18 +365,15 @@ class PendingRelationship(models.Model):
         return self.name
 
 
-class PendingRelationshipPhone(models.Model):
-    phoneno = models.CharField(
-        max_length=16,
-        validators=[validate_phone],
-        help_text='Enter a correct phone number',
-    )
-    verified = models.BooleanField(default=False)
+class PendingRelationshipPhone(PhoneNumber):
     pending_relationship = models.ForeignKey(
         PendingRelationship, on_delete=models.CASCADE)
 
-    def __str__(self) -> str:
-        return self.phoneno
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['phoneno_e164'], name='pending_phone_e164_idx'),
+        ]
 
 
 class Partner(models.Model):
@@ -175,6 +385,14 @@ class Partner(models.Model):
         "self", on_delete=models.CASCADE,
         null=True, related_name='other_partner')
 
+    def get_current_relationship(self):
+        """
+        Latest relationship of this partner, uses prefetched
+        relationships when available
+        """
+        return max(
+            self.relationship_set.all(), key=lambda r: r.pk, default=None)
+
     def get_name(self):
         if self.profile:
             return self.profile.fullname
@@ -196,16 +414,174 @@ class Relationship(models.Model):
     status = models.CharField(
         choices=RELATIONSHIP_STATUS, max_length=10, default='dating')
     verified = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created', 'id'], name='relationship_created_idx'),
+        ]
+
+    def get_partners(self):
+        """
+        Partners in one query, using prefetched partners when available
+        """
+        if 'partners' in getattr(self, '_prefetched_objects_cache', {}):
+            return list(self.partners.all())
+        return list(self.partners.select_related(
+            'profile', 'pending_relationship').order_by('pk'))
+
+    def __str__(self) -> str:
+        partners = self.get_partners()
+        if not partners:
+            return 'No partners'
+        if len(partners) == 1:
+            return f'{partners[0].get_name()} & Not Verified'
+        return f'{partners[0].get_name()} & {partners[-1].get_name()}'
+
+
+class EmailOutboxManager(models.Manager):
+    def enqueue(self, email, subject, message):
+        """
+        Store an email to be sent later by the outbox worker,
+        nothing is stored with `OFF_EMAIL`
+        """
+        if settings.OFF_EMAIL:
+            logger.debug(f'Email to {email} dropped: {subject}')
+            return None
+
+        return self.create(
+            recipient=email, subject=subject, message=message)
+
+    def due(self):
+        """
+        Pending emails that are ready to be (re)tried
+        """
+        return self.filter(
+            status=EmailOutbox.PENDING,
+            next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at', 'id')
+
+
+class EmailOutbox(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS = [
+        (PENDING, 'Pending',),
+        (SENT, 'Sent',),
+        (FAILED, 'Failed',),
+    ]
+
+    recipient = models.EmailField(max_length=255)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.CharField(
+        choices=STATUS, max_length=10, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = EmailOutboxManager()
+
+    def __str__(self) -> str:
+        return f'{self.recipient}: {self.subject}'
+
+    class Meta:
+        verbose_name = 'Email Outbox'
+        verbose_name_plural = 'Email Outbox'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='outbox_status_due_idx'),
+        ]
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Progress of a `manage.py backfill` run, used to resume it
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+    scanned = models.BigIntegerField(default=0)
+    updated_rows = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class SearchEntry(models.Model):
+    """
+    Searchable text of a profile or pending relationship, indexed by
+    `authentication.search`
+    """
+    PROFILE = 'profile'
+    PENDING = 'pending'
+    KINDS = [
+        (PROFILE, 'Profile',),
+        (PENDING, 'Pending relationship',),
+    ]
+
+    kind = models.CharField(choices=KINDS, max_length=10)
+    object_id = models.BigIntegerField()
+    name = models.CharField(max_length=50)
+    country = models.CharField(max_length=60, blank=True)
+    # Digits of the phone numbers, as entered and in E.164 form
+    phones = models.TextField(blank=True)
+    # Lowercased name, country and phones, for the PostgreSQL index
+    document = models.TextField()
+
+    def __str__(self) -> str:
+        return self.name
+
+    class Meta:
+        verbose_name_plural = 'Search entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'object_id'], name='search_entry_uniq'),
+        ]
+
+
+class RegistryEntry(models.Model):
+    """
+    Relationship status of a phone number (E.164) or lowercased email,
+    precomputed by `authentication.registry` for lookups. Only numbers
+    and emails of people in a relationship have an entry.
+    """
+    identifier = models.CharField(max_length=255, unique=True)
+    status = models.CharField(
+        choices=Relationship.RELATIONSHIP_STATUS, max_length=10)
+    relationship_verified = models.BooleanField(default=False)
+    # The phone or email itself was verified by its owner
+    verified = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
-        first: Partner = self.partners.first()
-        if first == self.partners.last():
-            return f'{first.get_name()} & Not Verified'
-        return f'{first.get_name()} & \
-{self.partners.last().get_name()}'
+        return self.identifier
+
+    class Meta:
+        verbose_name_plural = 'Registry entries'
 
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
+        Profile.objects.create(
+            user=instance, **getattr(instance, 'profile_fields', {}))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user_on_commit(instance.pk)
+    invalidate_missing_email_on_commit(instance.email)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile_user(sender, instance, **kwargs):
+    invalidate_user_on_commit(instance.user_id)
@@ -0,0 +1,110 @@
+"""
+One time passwords kept in the configured cache.
+
+Only a keyed hash of each code is stored, together with a counter of
+failed attempts. Checking a code never touches the database.
+"""
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.cache import caches
+from utils.base.general import generate_otp
+
+EMAIL_VERIFY = 'email_verify'
+PASSWORD_RESET = 'password_reset'
+PHONE_VERIFY = 'phone_verify'
+
+PURPOSES = (EMAIL_VERIFY, PASSWORD_RESET, PHONE_VERIFY)
+
+
+class OTPStore:
+    """Issue and verify one time passwords per identifier and purpose.
+
+    The identifier is a user id for email and password otps,
+    and a phone number for phone verification.
+    """
+    prefix = 'otp'
+
+    def __init__(self, alias: str = None):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias or settings.OTP_CACHE]
+
+    def get_key(self, purpose: str, identifier) -> str:
+        if purpose not in PURPOSES:
+            raise ValueError(f'Unknown otp purpose: {purpose}')
+        return f'{self.prefix}:{purpose}:{identifier}'
+
+    def make_hash(self, purpose: str, identifier, code) -> str:
+        msg = f'{purpose}:{identifier}:{code}'.encode()
+        return hmac.new(
+            settings.SECRET_KEY.encode(), msg, hashlib.sha256).hexdigest()
+
+    def issue(self, purpose: str, identifier, timeout: int = None) -> int:
+        """Create a new otp, replacing any previous one
+
+        :param purpose: what the otp is used for
+        :type purpose: str
+        :param identifier: user id or phone number
+        :param timeout: seconds before the otp expires
+        :type timeout: int, optional
+        :return: the plain otp, to be sent to the user
+        :rtype: int
+        """
+        if timeout is None:
+            timeout = settings.OTP_TIMEOUT
+
+        key = self.get_key(purpose, identifier)
+        code = generate_otp()
+        self.cache.set_many({
+            key: self.make_hash(purpose, identifier, code),
+            f'{key}:attempts': 0,
+        }, timeout)
+        return code
+
+    def verify(self, purpose: str, identifier, code) -> bool:
+        """Check an otp and consume it if it matches.
+
+        Every call counts as an attempt, the otp is discarded once
+        `OTP_MAX_ATTEMPTS` is exceeded. Only one concurrent caller
+        can consume a valid otp.
+
+        :return: True if the otp was valid
+        :rtype: bool
+        """
+        key = self.get_key(purpose, identifier)
+        attempts_key = f'{key}:attempts'
+
+        stored = self.cache.get(key)
+        if stored is None:
+            return False
+
+        try:
+            attempts = self.cache.incr(attempts_key)
+        except ValueError:
+            # The otp expired between the two calls
+            return False
+
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            self.cache.delete_many([key, attempts_key])
+            return False
+
+        expected = self.make_hash(purpose, identifier, str(code).strip())
+        if not hmac.compare_digest(stored, expected):
+            return False
+
+        # Deleting is the atomic consume, only one caller gets True
+        if not self.cache.delete(key):
+            return False
+        self.cache.delete(attempts_key)
+        return True
+
+    def revoke(self, purpose: str, identifier):
+        key = self.get_key(purpose, identifier)
+        self.cache.delete_many([key, f'{key}:attempts'])
+
+
+otp_store = OTPStore()
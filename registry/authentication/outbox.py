@@ -0,0 +1,126 @@
+"""
+Delivery of queued emails from the `EmailOutbox` table
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from utils.base.logger import err_logger, logger
+
+from .models import EmailOutbox
+
+
+def get_backoff(attempts: int) -> timedelta:
+    """Delay before the next attempt, doubling on every failure
+
+    :param attempts: number of failed attempts so far
+    :type attempts: int
+    :return: time to wait before retrying
+    :rtype: timedelta
+    """
+    seconds = settings.EMAIL_OUTBOX_BACKOFF * (2 ** max(attempts - 1, 0))
+    return timedelta(
+        seconds=min(seconds, settings.EMAIL_OUTBOX_MAX_BACKOFF))
+
+
+def build_message(email: EmailOutbox, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.recipient],
+        connection=connection,
+    )
+    message.attach_alternative(email.message, 'text/html')
+    return message
+
+
+def claim_batch(batch_size: int) -> list:
+    """Lease due emails to this worker for `EMAIL_OUTBOX_LEASE` seconds.
+
+    Rows are locked with `SKIP LOCKED` where the database supports it,
+    only while their next attempt is pushed back, so no transaction is
+    open while sending and several workers can drain the outbox.
+
+    :rtype: list
+    """
+    with transaction.atomic():
+        emails = list(
+            EmailOutbox.objects.due()
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if emails:
+            EmailOutbox.objects.filter(
+                pk__in=[email.pk for email in emails]
+            ).update(next_attempt_at=timezone.now() + timedelta(
+                seconds=settings.EMAIL_OUTBOX_LEASE))
+    return emails
+
+
+def deliver_batch(batch_size: int = None, connection=None) -> dict:
+    """Send one batch of due emails over a single reused connection
+
+    :param batch_size: maximum number of emails to send
+    :type batch_size: int, optional
+    :param connection: email backend connection to use
+    :return: number of emails sent, retried and failed
+    :rtype: dict
+    """
+    if batch_size is None:
+        batch_size = settings.EMAIL_OUTBOX_BATCH_SIZE
+
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    emails = claim_batch(batch_size)
+    if not emails:
+        return stats
+
+    if connection is None:
+        connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        err_logger.exception(e)
+        for email in emails:
+            _mark_failure(email, e, stats)
+        _save(emails)
+        return stats
+
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                err_logger.exception(e)
+                _mark_failure(email, e, stats)
+            else:
+                email.status = EmailOutbox.SENT
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                email.last_error = ''
+                stats['sent'] += 1
+    finally:
+        connection.close()
+        _save(emails)
+
+    logger.debug(f'Outbox batch delivered: {stats}')
+    return stats
+
+
+def _mark_failure(email: EmailOutbox, error: Exception, stats: dict):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = EmailOutbox.FAILED
+        stats['failed'] += 1
+    else:
+        email.next_attempt_at = timezone.now() + get_backoff(email.attempts)
+        stats['retried'] += 1
+
+
+def _save(emails):
+    EmailOutbox.objects.bulk_update(
+        emails,
+        ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+    )
@@ -0,0 +1,198 @@
+"""
+Batch lookup of phone numbers against user and pending relationship
+phones, using the indexed E.164 column, and their verification by sms.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, OuterRef, Subquery, Value
+from django.template.loader import render_to_string
+from rest_framework.serializers import ValidationError
+from utils.base.sms import dispatcher
+from utils.base.validators import normalize_phone
+
+from .models import (PendingRelationshipPhone, Phone, PhoneNumber,
+                     Relationship)
+from .otp import PHONE_VERIFY, otp_store
+
+USER = 'user'
+PENDING = 'pending'
+
+
+def normalize_phones(numbers):
+    """Normalize phone numbers, invalid numbers map to None
+
+    :param numbers: phone numbers as entered
+    :return: mapping of the entered number to its E.164 form
+    :rtype: dict
+    """
+    normalized = {}
+    for number in numbers:
+        try:
+            normalized[number] = normalize_phone(number)
+        except ValidationError:
+            normalized[number] = None
+    return normalized
+
+
+def get_phone_matches(e164_numbers) -> dict:
+    """Find the owners of E.164 numbers and their relationship status.
+
+    User and pending relationship phones are read in one query,
+    a union of two indexed `IN` lookups.
+
+    :return: mapping of E.164 number to a list of matches
+    :rtype: dict
+    """
+    e164_numbers = set(e164_numbers)
+    if not e164_numbers:
+        return {}
+
+    user_relationships = Relationship.objects.filter(
+        partners__profile=OuterRef('profile')).order_by('-id')
+    pending_relationships = Relationship.objects.filter(
+        partners__pending_relationship=OuterRef('pending_relationship')
+    ).order_by('-id')
+
+    phones = Phone.objects.filter(
+        phoneno_e164__in=e164_numbers
+    ).values(
+        'phoneno_e164',
+        'verified',
+        owner_type=Value(USER),
+        name=F('profile__fullname'),
+        relationship_status=Subquery(
+            user_relationships.values('status')[:1]),
+        relationship_verified=Subquery(
+            user_relationships.values('verified')[:1]),
+    )
+    pending_phones = PendingRelationshipPhone.objects.filter(
+        phoneno_e164__in=e164_numbers
+    ).values(
+        'phoneno_e164',
+        'verified',
+        owner_type=Value(PENDING),
+        name=F('pending_relationship__name'),
+        relationship_status=Subquery(
+            pending_relationships.values('status')[:1]),
+        relationship_verified=Subquery(
+            pending_relationships.values('verified')[:1]),
+    )
+
+    matches = {}
+    for row in phones.union(pending_phones, all=True):
+        matches.setdefault(row.pop('phoneno_e164'), []).append(row)
+    return matches
+
+
+def lookup_phones(numbers) -> list:
+    """Owners and relationship status of many phone numbers, for the
+    add relationship check. It returns the owners' names, so it must not
+    be exposed as an endpoint
+
+    :param numbers: phone numbers as entered
+    :return: one result per number, in the same order
+    :rtype: list
+    """
+    normalized = normalize_phones(numbers)
+    matches = get_phone_matches(
+        number for number in normalized.values() if number)
+
+    return [
+        {
+            'phone': number,
+            'e164': normalized[number],
+            'valid': normalized[number] is not None,
+            'matches': matches.get(normalized[number], []),
+        }
+        for number in numbers
+    ]
+
+
+def get_phones_in_relationship(numbers) -> set:
+    """
+    E.164 numbers among `numbers` that already belong to a relationship
+    """
+    normalized = normalize_phones(numbers)
+    matches = get_phone_matches(
+        number for number in normalized.values() if number)
+    return {
+        number
+        for number, rows in matches.items()
+        if any(row['relationship_status'] for row in rows)
+    }
+
+
+def get_otp_message(otp: int) -> str:
+    return render_to_string('authentication/sms/phone_otp.txt', {
+        'otp': otp,
+        'minutes': settings.OTP_TIMEOUT // 60,
+    }).strip()
+
+
+def record_delivery(model, pk, result: dict):
+    """
+    Save the outcome of a verification sms, runs in the sending thread
+    """
+    try:
+        model.objects.filter(pk=pk).update(
+            sms_status=(
+                PhoneNumber.SMS_SENT if result['sent']
+                else PhoneNumber.SMS_FAILED),
+            sms_attempts=F('sms_attempts') + result['attempts'],
+            sms_error=result['error'][:255],
+        )
+    finally:
+        # The thread is reused, don't keep a connection past its max age
+        close_old_connections()
+
+
+def send_phone_otps(phones) -> list:
+    """Text a verification otp to each unverified phone, concurrently.
+
+    Returns once the messages are queued, the delivery status is
+    recorded on the phone rows by the sending threads. Messages are
+    queued in memory, a phone left `SMS_QUEUED` by a worker restart
+    is sent again on the next request.
+
+    :param phones: `Phone` or `PendingRelationshipPhone` instances
+    :return: futures of the delivery results
+    :rtype: list
+    """
+    phones = [
+        phone for phone in phones
+        if not phone.verified and phone.phoneno_e164
+    ]
+
+    by_model = {}
+    for phone in phones:
+        by_model.setdefault(type(phone), []).append(phone.pk)
+    for model, pks in by_model.items():
+        model.objects.filter(pk__in=pks).update(
+            sms_status=PhoneNumber.SMS_QUEUED, sms_error='')
+
+    messages = []
+    for phone in phones:
+        otp = otp_store.issue(PHONE_VERIFY, phone.phoneno_e164)
+        messages.append((
+            phone.phoneno_e164,
+            get_otp_message(otp),
+            partial(record_delivery, type(phone), phone.pk),
+        ))
+    return dispatcher.send_many(messages)
+
+
+def verify_phone_otp(phone, otp) -> bool:
+    """
+    Mark the phone verified if the otp sent to it is valid
+    """
+    if not phone.phoneno_e164 or not otp_store.verify(
+        PHONE_VERIFY, phone.phoneno_e164, otp
+    ):
+        return False
+
+    if not phone.verified:
+        phone.verified = True
+        phone.save(update_fields=['verified'])
+    return True
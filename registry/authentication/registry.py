@@ -0,0 +1,368 @@
+"""
+Registry lookups, "is this phone number or email in a relationship?".
+
+Answers come from `RegistryEntry`, one row per identifier kept up to
+date by signals in the same transaction as the change, so a batch of
+identifiers costs one indexed query. Entries are cached per identifier,
+absent ones included, and dropped from the cache when they change.
+
+Existing relationships are loaded with `manage.py backfill
+registry_phones`, `registry_pending_phones` and `registry_emails`.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Lower
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from utils.base.backfill import Backfill, register
+from utils.base.metrics import record_cache
+from utils.base.validators import normalize_phone
+
+from .models import (Partner, PendingRelationshipPhone, Phone,
+                     RegistryEntry, Relationship, User)
+from .phones import get_phone_matches
+
+FIELDS = ['status', 'relationship_verified', 'verified']
+# Cached for identifiers without an entry
+ABSENT = {}
+
+
+def normalize_identifier(value: str):
+    """Lowercased email or E.164 phone number, None when invalid
+
+    :param value: email or phone number as entered
+    :type value: str
+    """
+    value = value.strip()
+    if '@' in value:
+        try:
+            validate_email(value)
+        except DjangoValidationError:
+            return None
+        return value.lower()
+
+    try:
+        return normalize_phone(value)
+    except ValidationError:
+        return None
+
+
+def pick_match(matches):
+    """
+    Match describing an identifier owned by several people, a verified
+    relationship first
+    """
+    matches = [match for match in matches if match['relationship_status']]
+    if not matches:
+        return None
+    best = max(matches, key=lambda match: bool(
+        match['relationship_verified']))
+    return {
+        'status': best['relationship_status'],
+        'relationship_verified': bool(best['relationship_verified']),
+        'verified': any(match['verified'] for match in matches),
+    }
+
+
+def get_email_matches(emails) -> dict:
+    """
+    Users of lowercased emails with their latest relationship
+    """
+    if not emails:
+        return {}
+
+    relationships = Relationship.objects.filter(
+        partners__profile__user=OuterRef('pk')).order_by('-id')
+    users = User.objects.annotate(
+        email_lower=Lower('email'),
+    ).filter(email_lower__in=emails).values(
+        'email_lower',
+        'verified_email',
+        relationship_status=Subquery(relationships.values('status')[:1]),
+        relationship_verified=Subquery(
+            relationships.values('verified')[:1]),
+    )
+
+    matches = {}
+    for user in users:
+        user['verified'] = user.pop('verified_email')
+        matches[user.pop('email_lower')] = [user]
+    return matches
+
+
+def compute_entries(identifiers) -> dict:
+    """
+    State of identifiers in a relationship, by identifier
+    """
+    emails = [value for value in identifiers if '@' in value]
+    phones = [value for value in identifiers if '@' not in value]
+
+    matches = {**get_phone_matches(phones), **get_email_matches(emails)}
+    entries = {}
+    for identifier, rows in matches.items():
+        entry = pick_match(rows)
+        if entry is not None:
+            entries[identifier] = entry
+    return entries
+
+
+def refresh(identifiers):
+    """Recompute the entries of identifiers, in the current transaction
+
+    :param identifiers: normalized emails and phone numbers
+    """
+    identifiers = {value for value in identifiers if value}
+    if not identifiers:
+        return
+
+    entries = compute_entries(identifiers)
+    with transaction.atomic(savepoint=False):
+        absent = identifiers - entries.keys()
+        if absent:
+            RegistryEntry.objects.filter(identifier__in=absent).delete()
+
+        if entries:
+            existing = RegistryEntry.objects.in_bulk(
+                entries.keys(), field_name='identifier')
+            created, updated = [], []
+            for identifier, fields in entries.items():
+                entry = existing.get(identifier)
+                if entry is None:
+                    created.append(
+                        RegistryEntry(identifier=identifier, **fields))
+                elif any(getattr(entry, k) != v for k, v in fields.items()):
+                    for key, value in fields.items():
+                        setattr(entry, key, value)
+                    # bulk_update doesn't apply auto_now
+                    entry.updated = timezone.now()
+                    updated.append(entry)
+            if updated:
+                RegistryEntry.objects.bulk_update(
+                    updated, [*FIELDS, 'updated'])
+            if created:
+                RegistryEntry.objects.bulk_create(created)
+
+    invalidate_on_commit(identifiers)
+
+
+def get_partner_identifiers(partner_ids) -> set:
+    """
+    Emails and phone numbers of partners, in one query
+    """
+    partner_ids = list(partner_ids)
+    if not partner_ids:
+        return set()
+
+    emails = User.objects.filter(
+        profile__partner__in=partner_ids
+    ).annotate(identifier=Lower('email')).values('identifier')
+    phones = Phone.objects.filter(
+        profile__partner__in=partner_ids, phoneno_e164__isnull=False
+    ).values(identifier=F('phoneno_e164'))
+    pending_phones = PendingRelationshipPhone.objects.filter(
+        pending_relationship__partner__in=partner_ids,
+        phoneno_e164__isnull=False,
+    ).values(identifier=F('phoneno_e164'))
+
+    return {
+        row['identifier']
+        for row in emails.union(phones, pending_phones, all=True)
+    }
+
+
+def get_cache():
+    return caches[settings.REGISTRY_CACHE]
+
+
+def get_key(identifier: str) -> str:
+    return f'registry:{hashlib.blake2b(identifier.encode()).hexdigest()}'
+
+
+def invalidate_on_commit(identifiers):
+    keys = [get_key(identifier) for identifier in identifiers]
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def get_entries(identifiers) -> dict:
+    """State of normalized identifiers, from the cache when possible and
+    in one query otherwise
+
+    :return: entry fields by identifier, empty for identifiers
+        not in a relationship
+    :rtype: dict
+    """
+    identifiers = set(identifiers)
+    keys = {get_key(identifier): identifier for identifier in identifiers}
+    cached = get_cache().get_many(keys.keys())
+    record_cache(hits=len(cached), misses=len(keys) - len(cached))
+    found = {keys[key]: entry for key, entry in cached.items()}
+
+    missing = identifiers - found.keys()
+    if missing:
+        loaded = {
+            row.pop('identifier'): row
+            for row in RegistryEntry.objects.filter(
+                identifier__in=missing).values('identifier', *FIELDS)
+        }
+        loaded.update({
+            identifier: ABSENT for identifier in missing - loaded.keys()})
+        get_cache().set_many(
+            {get_key(identifier): entry
+             for identifier, entry in loaded.items()},
+            settings.REGISTRY_CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def lookup(values) -> list:
+    """Relationship status of many emails and phone numbers
+
+    :param values: emails and phone numbers as entered
+    :return: one result per value, in the same order
+    :rtype: list
+    """
+    normalized = {value: normalize_identifier(value) for value in values}
+    entries = get_entries(
+        identifier for identifier in normalized.values() if identifier)
+
+    results = []
+    for value in values:
+        identifier = normalized[value]
+        entry = entries.get(identifier) or ABSENT
+        results.append({
+            'identifier': value,
+            'normalized': identifier,
+            'valid': identifier is not None,
+            'registered': bool(entry),
+            'status': entry.get('status'),
+            'relationship_verified': entry.get(
+                'relationship_verified', False),
+            'verified': entry.get('verified', False),
+        })
+    return results
+
+
+@receiver(post_save, sender=Phone)
+@receiver(post_delete, sender=Phone)
+@receiver(post_save, sender=PendingRelationshipPhone)
+@receiver(post_delete, sender=PendingRelationshipPhone)
+def refresh_phone(sender, instance, **kwargs):
+    refresh({
+        instance.phoneno_e164, getattr(instance, 'previous_e164', None)})
+
+
+@receiver(post_save, sender=User)
+def refresh_user(sender, instance, created, update_fields=None, **kwargs):
+    state = (instance.email, instance.verified_email)
+    previous = getattr(instance, 'registry_state', None)
+    instance.registry_state = state
+    # New users are in no relationship yet, and last_login or admin
+    # saves keep the email
+    if created or state == previous or (
+        update_fields is not None
+        and not {'email', 'verified_email'} & set(update_fields)
+    ):
+        return
+    identifiers = {instance.email.lower()}
+    if previous and previous[0]:
+        identifiers.add(previous[0].lower())
+    refresh(identifiers)
+
+
+@receiver(post_save, sender=Partner)
+def refresh_partner(sender, instance, **kwargs):
+    refresh(get_partner_identifiers([instance.pk]))
+
+
+@receiver(post_save, sender=Relationship)
+def refresh_relationship(sender, instance, created, **kwargs):
+    if not created:
+        refresh(get_partner_identifiers(
+            instance.partners.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Partner)
+@receiver(pre_delete, sender=Relationship)
+def collect_identifiers(sender, instance, **kwargs):
+    if sender is Partner:
+        partner_ids = [instance.pk]
+    else:
+        partner_ids = instance.partners.values_list('pk', flat=True)
+    instance.registry_identifiers = get_partner_identifiers(partner_ids)
+
+
+@receiver(post_delete, sender=Partner)
+@receiver(post_delete, sender=Relationship)
+def refresh_deleted(sender, instance, **kwargs):
+    refresh(getattr(instance, 'registry_identifiers', ()))
+
+
+@receiver(m2m_changed, sender=Relationship.partners.through)
+def refresh_relationship_partners(sender, instance, action, reverse, pk_set,
+                                  **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            partner_ids = [instance.pk]
+        else:
+            partner_ids = instance.partners.values_list('pk', flat=True)
+        instance.registry_identifiers = get_partner_identifiers(partner_ids)
+    elif action == 'post_clear':
+        refresh(getattr(instance, 'registry_identifiers', ()))
+    elif action in ('post_add', 'post_remove'):
+        refresh(get_partner_identifiers(
+            [instance.pk] if reverse else pk_set))
+
+
+class RegistryBackfill(Backfill):
+    """
+    Compute the entries of existing rows
+    """
+    description = 'registry entries'
+    batch_size = 500
+
+    def get_identifiers(self, rows) -> set:
+        return {row.phoneno_e164 for row in rows}
+
+    def run_batch(self, after_pk, batch_size: int = None):
+        rows = list(
+            self.get_queryset()
+            .filter(pk__gt=after_pk)
+            .order_by('pk')[:batch_size or self.batch_size]
+        )
+        if not rows:
+            return None, 0, 0
+
+        with transaction.atomic():
+            refresh(self.get_identifiers(rows))
+        return rows[-1].pk, len(rows), len(rows)
+
+
+@register
+class PhoneRegistryBackfill(RegistryBackfill):
+    name = 'registry_phones'
+    model = Phone
+
+
+@register
+class PendingPhoneRegistryBackfill(RegistryBackfill):
+    name = 'registry_pending_phones'
+    model = PendingRelationshipPhone
+
+
+@register
+class EmailRegistryBackfill(RegistryBackfill):
+    name = 'registry_emails'
+    model = User
+
+    def get_identifiers(self, rows) -> set:
+        return {row.email.lower() for row in rows}
@@ -0,0 +1,159 @@
+"""
+Revoked jwts, kept in the shared cache and mirrored in a per process
+Bloom filter, so checking a token that was not revoked needs no
+network hop.
+
+Every revocation is also appended to a log in the cache, numbered by
+a counter. Processes poll the counter at most every
+`REVOCATION_REFRESH_INTERVAL` seconds and add the new log entries to
+their filter. Log entries all live as long as the longest token
+lifetime, so they expire in the order they were written.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.settings import api_settings
+from utils.base.bloom import BloomFilter
+
+SCAN_CHUNK_SIZE = 1000
+
+
+def get_max_lifetime() -> int:
+    return int(max(
+        api_settings.ACCESS_TOKEN_LIFETIME,
+        api_settings.REFRESH_TOKEN_LIFETIME,
+    ).total_seconds())
+
+
+class RevocationList:
+    prefix = 'revoked'
+
+    def __init__(self, alias: str = None):
+        self.alias = alias
+        self.filter = None
+        self.seq = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias or settings.REVOCATION_CACHE]
+
+    def get_key(self, item: str) -> str:
+        return f'{self.prefix}:{item}'
+
+    def get_log_key(self, seq: int) -> str:
+        return f'{self.prefix}:log:{seq}'
+
+    def get_seq_key(self) -> str:
+        return f'{self.prefix}:seq'
+
+    def append_log(self, item: str):
+        cache = self.cache
+        cache.add(self.get_seq_key(), 0, timeout=None)
+        seq = cache.incr(self.get_seq_key())
+        cache.set(self.get_log_key(seq), item, timeout=get_max_lifetime())
+        self.add(item)
+
+    def add(self, item: str):
+        with self._lock:
+            if self.filter is None:
+                return
+            self.filter.add(item)
+            if self.filter.count > settings.REVOCATION_BLOOM_CAPACITY:
+                # Rebuilt on the next check, without the expired entries
+                self.seq = None
+                self.checked_at = 0.0
+
+    def revoke(self, token):
+        """Revoke one token until it expires
+
+        :param token: validated access or refresh token
+        """
+        timeout = int(token['exp'] - time.time())
+        if timeout <= 0:
+            return
+        item = f'jti:{token[api_settings.JTI_CLAIM]}'
+        self.cache.set(self.get_key(item), True, timeout=timeout)
+        self.append_log(item)
+
+    def revoke_user(self, user_id):
+        """
+        Revoke every token of the user issued before the current second.
+        `iat` is in whole seconds, a token issued later in this second,
+        e.g. by logging in again right away, stays valid
+        """
+        item = f'user:{user_id}'
+        self.cache.set(
+            self.get_key(item), int(time.time()),
+            timeout=get_max_lifetime())
+        self.append_log(item)
+
+    def is_revoked(self, token) -> bool:
+        bloom = self.refresh()
+
+        item = f'jti:{token[api_settings.JTI_CLAIM]}'
+        if item in bloom and self.cache.get(self.get_key(item)):
+            return True
+
+        item = f'user:{token[api_settings.USER_ID_CLAIM]}'
+        if item in bloom:
+            revoked_at = self.cache.get(self.get_key(item))
+            if revoked_at is not None and token['iat'] < revoked_at:
+                return True
+        return False
+
+    def is_fresh(self, now: float) -> bool:
+        return self.seq is not None and (
+            now - self.checked_at < settings.REVOCATION_REFRESH_INTERVAL)
+
+    def refresh(self, force: bool = False) -> BloomFilter:
+        """Add the revocations logged since the last refresh to the filter
+
+        :return: the up to date filter
+        :rtype: BloomFilter
+        """
+        now = time.monotonic()
+        if not force and self.is_fresh(now):
+            return self.filter
+
+        with self._lock:
+            if not force and self.is_fresh(now):
+                return self.filter
+
+            seq = self.cache.get(self.get_seq_key()) or 0
+            if self.seq is None or seq < self.seq:
+                self.filter = self.rebuild(seq)
+            else:
+                for start in range(self.seq + 1, seq + 1, SCAN_CHUNK_SIZE):
+                    end = min(start + SCAN_CHUNK_SIZE, seq + 1)
+                    self.load(self.filter, range(start, end))
+            self.seq = seq
+            self.checked_at = now
+            return self.filter
+
+    def rebuild(self, seq: int) -> BloomFilter:
+        bloom = BloomFilter(
+            settings.REVOCATION_BLOOM_CAPACITY,
+            settings.REVOCATION_BLOOM_ERROR_RATE)
+
+        # Scan back until a chunk has fully expired
+        end = seq
+        while end > 0:
+            start = max(end - SCAN_CHUNK_SIZE, 0) + 1
+            if not self.load(bloom, range(start, end + 1)):
+                break
+            end = start - 1
+        return bloom
+
+    def load(self, bloom: BloomFilter, seqs) -> int:
+        keys = [self.get_log_key(seq) for seq in seqs]
+        items = self.cache.get_many(keys)
+        for item in items.values():
+            bloom.add(item)
+        return len(items)
+
+
+revocations = RevocationList()
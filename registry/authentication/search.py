@@ -0,0 +1,383 @@
+"""
+Search over people, profiles and pending relationships, by partial
+name, phone fragment or country.
+
+Each of them has a `SearchEntry` row, rebuilt by signals once the
+transaction commits. The entries are indexed by an FTS5 trigram table
+on SQLite and a pg_trgm GIN index on PostgreSQL, so terms of three or
+more characters match anywhere in a name, country or phone number.
+PostgreSQL also matches misspelled names by trigram similarity.
+
+Results are ranked, best first, and paged with signed keyset cursors.
+Existing rows are indexed with `manage.py backfill search_profiles`
+and `manage.py backfill search_pending`.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.exceptions import NotFound
+from utils.base.backfill import Backfill, register
+from utils.base.logger import err_logger
+from utils.base.pagination import decode_cursor, encode_cursor
+
+from .models import (PendingRelationship, PendingRelationshipPhone, Phone,
+                     Profile, SearchEntry)
+
+PROFILE = SearchEntry.PROFILE
+PENDING = SearchEntry.PENDING
+
+CURSOR_SALT = 'authentication.search'
+PHONE_QUERY = re.compile(r'\+?[\d\s().-]+')
+LIKE_ESCAPE = str.maketrans({'\\': '\\\\', '%': '\\%', '_': '\\_'})
+BACKFILLS = {PROFILE: 'search_profiles', PENDING: 'search_pending'}
+
+
+def get_digits(value: str) -> str:
+    return re.sub(r'\D', '', value or '')
+
+
+def get_terms(query: str) -> list:
+    """Lowercased search terms of a query, too short terms are dropped
+
+    A query that looks like a phone number is a single term of its
+    digits, since numbers are indexed without formatting.
+    """
+    query = query.strip()
+    if PHONE_QUERY.fullmatch(query):
+        words = [get_digits(query)]
+    else:
+        words = query.lower().split()
+    return [
+        word for word in words
+        if len(word) >= settings.SEARCH_MIN_TERM_LENGTH
+    ][:settings.SEARCH_MAX_TERMS]
+
+
+def make_entry(kind: str, obj, phones) -> SearchEntry:
+    digits = sorted({
+        number for phone in phones
+        for number in (get_digits(phone.phoneno),
+                       get_digits(phone.phoneno_e164))
+        if number
+    })
+    name = obj.fullname if kind == PROFILE else obj.name
+    entry = SearchEntry(
+        kind=kind, object_id=obj.pk, name=name,
+        country=obj.country, phones=' '.join(digits))
+    entry.document = f'{name} {entry.country} {entry.phones}'.lower()
+    return entry
+
+
+def build_entries(kind: str, ids) -> list:
+    if kind == PROFILE:
+        objects = Profile.objects.filter(
+            pk__in=ids).prefetch_related('phone_set')
+        return [make_entry(kind, obj, obj.phone_set.all()) for obj in objects]
+
+    objects = PendingRelationship.objects.filter(
+        pk__in=ids).prefetch_related('pendingrelationshipphone_set')
+    return [
+        make_entry(kind, obj, obj.pendingrelationshipphone_set.all())
+        for obj in objects
+    ]
+
+
+def index(kind: str, ids):
+    """Rebuild the entries of profiles or pending relationships,
+    dropping the entries of deleted ones
+
+    :param kind: `PROFILE` or `PENDING`
+    :type kind: str
+    :param ids: primary keys of the profiles or pending relationships
+    """
+    ids = list(ids)
+    size = settings.SEARCH_INDEX_BATCH_SIZE
+    for start in range(0, len(ids), size):
+        index_batch(kind, ids[start:start + size])
+
+
+def index_batch(kind: str, ids: list):
+    fields = ['name', 'country', 'phones', 'document']
+    entries = build_entries(kind, ids)
+
+    with transaction.atomic():
+        existing = {
+            entry.object_id: entry
+            for entry in SearchEntry.objects.filter(
+                kind=kind, object_id__in=ids)
+        }
+        created, updated = [], []
+        for entry in entries:
+            current = existing.pop(entry.object_id, None)
+            if current is None:
+                created.append(entry)
+            elif any(
+                getattr(current, field) != getattr(entry, field)
+                for field in fields
+            ):
+                for field in fields:
+                    setattr(current, field, getattr(entry, field))
+                updated.append(current)
+
+        if existing:
+            SearchEntry.objects.filter(
+                pk__in=[entry.pk for entry in existing.values()]).delete()
+        if updated:
+            SearchEntry.objects.bulk_update(updated, fields)
+        if created:
+            SearchEntry.objects.bulk_create(created)
+
+
+class PendingIndex:
+    """
+    Objects indexed when the transaction commits. Each change registers
+    `flush` with on_commit, so the callbacks of a rolled back transaction
+    are discarded, and the first one run indexes every object.
+    """
+
+    def __init__(self):
+        self.ids = {PROFILE: set(), PENDING: set()}
+
+    def add(self, kind: str, object_id):
+        self.ids[kind].add(object_id)
+
+    def flush(self):
+        for kind, ids in self.ids.items():
+            if not ids:
+                continue
+            ids, self.ids[kind] = list(ids), set()
+            try:
+                index(kind, ids)
+            except Exception:
+                # Entries stay stale until the backfill rebuilds them
+                err_logger.error(
+                    'Search indexing of %s %s failed, run manage.py '
+                    'backfill %s', kind, ids, BACKFILLS[kind], exc_info=True)
+
+
+def schedule(kind: str, object_id):
+    """Index an object once the current transaction commits
+
+    Objects changed several times in a transaction are indexed once,
+    from their rows. Ids left by a rolled back transaction are indexed
+    with the next one, from the rows, which leaves their entries as
+    they were.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'search_pending', None)
+    if pending is None:
+        pending = connection.search_pending = PendingIndex()
+    pending.add(kind, object_id)
+    transaction.on_commit(pending.flush)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def index_profile(sender, instance, **kwargs):
+    schedule(PROFILE, instance.pk)
+
+
+@receiver(post_save, sender=PendingRelationship)
+@receiver(post_delete, sender=PendingRelationship)
+def index_pending_relationship(sender, instance, **kwargs):
+    schedule(PENDING, instance.pk)
+
+
+@receiver(post_save, sender=Phone)
+@receiver(post_delete, sender=Phone)
+def index_phone(sender, instance, **kwargs):
+    schedule(PROFILE, instance.profile_id)
+
+
+@receiver(post_save, sender=PendingRelationshipPhone)
+@receiver(post_delete, sender=PendingRelationshipPhone)
+def index_pending_phone(sender, instance, **kwargs):
+    schedule(PENDING, instance.pending_relationship_id)
+
+
+class SearchBackend:
+    """
+    Index backed search, subclasses select the matching entries
+    """
+    columns = 'id, kind, object_id, name, country, phones'
+
+    def get_matches(self, terms) -> tuple:
+        """
+        SQL selecting the matching entries with their `score`, higher
+        is better, and its parameters
+        """
+        raise NotImplementedError('.get_matches() must be overridden')
+
+    def search(self, terms, kind=None, after=None, limit=20) -> list:
+        """Matching entries, best first, with their `score`
+
+        :param terms: lowercased terms, all of them must match
+        :param kind: only return entries of this kind
+        :type kind: str, optional
+        :param after: score and id of the last entry of the previous page
+        :type after: list, optional
+        """
+        sql, params = self.get_matches(terms)
+        conditions = []
+        if kind:
+            conditions.append('kind = %s')
+            params.append(kind)
+        if after:
+            conditions.append('(score < %s OR (score = %s AND id > %s))')
+            params.extend([after[0], after[0], after[1]])
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        params.append(limit)
+        return list(SearchEntry.objects.raw(
+            f'SELECT * FROM ({sql}) AS matches {where} '
+            f'ORDER BY score DESC, id LIMIT %s', params))
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 trigram index, ranked by bm25
+    """
+
+    def get_matches(self, terms) -> tuple:
+        match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+        sql = (
+            'SELECT e.id, e.kind, e.object_id, e.name, e.country, e.phones, '
+            '-bm25(authentication_search_fts) AS score '
+            'FROM authentication_search_fts '
+            'JOIN authentication_searchentry e '
+            'ON e.id = authentication_search_fts.rowid '
+            'WHERE authentication_search_fts MATCH %s'
+        )
+        return sql, [match]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    pg_trgm index, matching substrings and similar words, ranked by
+    word similarity
+    """
+
+    def get_matches(self, terms) -> tuple:
+        query = ' '.join(terms)
+        likes = ' AND '.join(['document LIKE %s'] * len(terms))
+        sql = (
+            f'SELECT {self.columns}, '
+            'word_similarity(%s, document) AS score '
+            'FROM authentication_searchentry '
+            f'WHERE ({likes}) OR %s <%% document'
+        )
+        patterns = [f'%{term.translate(LIKE_ESCAPE)}%' for term in terms]
+        return sql, [query, *patterns, query]
+
+
+class ScanSearchBackend(SearchBackend):
+    """
+    Fallback for other databases, scanning the entries unranked
+    """
+
+    def search(self, terms, kind=None, after=None, limit=20) -> list:
+        queryset = SearchEntry.objects.defer('document')
+        for term in terms:
+            queryset = queryset.filter(document__contains=term)
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        if after:
+            queryset = queryset.filter(pk__gt=after[1])
+
+        entries = list(queryset.order_by('pk')[:limit])
+        for entry in entries:
+            entry.score = 0.0
+        return entries
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend() -> SearchBackend:
+    return BACKENDS.get(connection.vendor, ScanSearchBackend)()
+
+
+def search(query: str, kind: str = None, cursor: str = None,
+           limit: int = None) -> tuple:
+    """Page of entries matching a query, best first
+
+    :param query: words, fragments of names, countries or phones
+    :type query: str
+    :param kind: `PROFILE` or `PENDING`, both by default
+    :type kind: str, optional
+    :param cursor: `next` cursor of the previous page
+    :type cursor: str, optional
+    :return: the entries and the cursor of the next page, or None
+    :rtype: tuple
+    """
+    limit = limit or settings.SEARCH_PAGE_SIZE
+    terms = get_terms(query)
+    if not terms:
+        return [], None
+
+    after = None
+    if cursor:
+        position = decode_cursor(cursor, CURSOR_SALT)
+        if position['terms'] != terms or position['kind'] != kind:
+            raise NotFound('Cursor of another search')
+        after = position['after']
+
+    entries = get_backend().search(terms, kind, after, limit + 1)
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = encode_cursor({
+            'terms': terms, 'kind': kind, 'after': [last.score, last.pk],
+        }, CURSOR_SALT)
+    return entries, next_cursor
+
+
+def search_ids(query: str, kind: str, limit: int = None) -> list:
+    """
+    Ids of the best matching profiles or pending relationships
+    """
+    entries, _ = search(query, kind, limit=limit)
+    return [entry.object_id for entry in entries]
+
+
+class SearchIndexBackfill(Backfill):
+    """
+    Index existing rows, replacing their entries
+    """
+    kind: str = None
+    description = 'search entries'
+    batch_size = 500
+
+    def run_batch(self, after_pk, batch_size: int = None):
+        ids = list(
+            self.get_queryset()
+            .filter(pk__gt=after_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size or self.batch_size]
+        )
+        if not ids:
+            return None, 0, 0
+
+        index(self.kind, ids)
+        return ids[-1], len(ids), len(ids)
+
+
+@register
+class ProfileSearchBackfill(SearchIndexBackfill):
+    name = 'search_profiles'
+    model = Profile
+    kind = PROFILE
+
+
+@register
+class PendingSearchBackfill(SearchIndexBackfill):
+    name = 'search_pending'
+    model = PendingRelationship
+    kind = PENDING
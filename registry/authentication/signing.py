@@ -0,0 +1,248 @@
+"""
+Asymmetric signing of the jwts, so other services can verify them
+locally with the keys published at `/.well-known/jwks.json`.
+
+`JWT_KEYS` lists private key files, RSA (RS256) or Ed25519 (EdDSA).
+The first one signs new tokens, the others only verify, which allows
+rotating keys: add the new key first and drop the old one once the
+longest token lifetime has passed. Public key files can be listed to
+keep verifying tokens of a key whose private part is gone. Every
+token names its key in the `kid` header, the RFC 7638 thumbprint.
+
+Without `JWT_KEYS` tokens are signed with HS256 and `SECRET_KEY`.
+"""
+import base64
+import hashlib
+import json
+import threading
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def load_key(path: str):
+    with open(path, 'rb') as file:
+        data = file.read()
+    if b'PRIVATE KEY' in data:
+        return serialization.load_pem_private_key(data, password=None)
+    return serialization.load_pem_public_key(data)
+
+
+class SigningKey:
+    """
+    RSA or Ed25519 key, the private key is None for verify only keys
+    """
+
+    def __init__(self, key):
+        if isinstance(key, (rsa.RSAPrivateKey, ed25519.Ed25519PrivateKey)):
+            self.private_key = key
+            self.public_key = key.public_key()
+        else:
+            self.private_key = None
+            self.public_key = key
+
+        if isinstance(self.public_key, rsa.RSAPublicKey):
+            self.algorithm = 'RS256'
+            jwk = json.loads(RSAAlgorithm.to_jwk(self.public_key))
+            members = ('e', 'kty', 'n')
+        elif isinstance(self.public_key, ed25519.Ed25519PublicKey):
+            self.algorithm = 'EdDSA'
+            jwk = json.loads(OKPAlgorithm.to_jwk(self.public_key))
+            members = ('crv', 'kty', 'x')
+        else:
+            raise ImproperlyConfigured(
+                'JWT_KEYS only supports RSA and Ed25519 keys')
+
+        thumbprint = json.dumps(
+            {name: jwk[name] for name in members},
+            separators=(',', ':'), sort_keys=True)
+        self.kid = b64url(hashlib.sha256(thumbprint.encode()).digest())
+        self.jwk = {
+            **jwk, 'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'}
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """
+    Signs with the first key of `JWT_KEYS`, verifies with the key
+    named by the `kid` header
+    """
+
+    def __init__(self, keys, accept_hs256=False):
+        self.keys = {key.kid: key for key in keys}
+        self.signing_key = keys[0]
+        if self.signing_key.private_key is None:
+            raise ImproperlyConfigured(
+                'The first key of JWT_KEYS must be a private key')
+
+        self.algorithm = self.signing_key.algorithm
+        self.audience = api_settings.AUDIENCE
+        self.issuer = api_settings.ISSUER
+        self.leeway = api_settings.LEEWAY
+        self.jwks_client = None
+        # Tokens signed before the switch to asymmetric keys
+        self.legacy_backend = TokenBackend(
+            'HS256', settings.SECRET_KEY, None, self.audience,
+            self.issuer, None, self.leeway) if accept_hs256 else None
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        return jwt.encode(
+            jwt_payload, self.signing_key.private_key,
+            algorithm=self.algorithm,
+            headers={'kid': self.signing_key.kid})
+
+    def decode(self, token, verify=True):
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+        key = self.keys.get(header.get('kid'))
+        if key is None:
+            if self.legacy_backend is not None and 'kid' not in header:
+                return self.legacy_backend.decode(token, verify=verify)
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+        try:
+            return jwt.decode(
+                token,
+                key.public_key,
+                # Pinned by the key, the header can't pick the algorithm
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.InvalidTokenError:
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+    def get_jwks(self) -> dict:
+        return {'keys': [key.jwk for key in self.keys.values()]}
+
+
+token_backend: TokenBackend = None
+_backend_lock = threading.Lock()
+
+
+def get_token_backend() -> TokenBackend:
+    global token_backend
+
+    if token_backend is None:
+        with _backend_lock:
+            if token_backend is None:
+                if settings.JWT_KEYS:
+                    token_backend = KeyRingTokenBackend(
+                        [SigningKey(load_key(path))
+                         for path in settings.JWT_KEYS],
+                        accept_hs256=settings.JWT_ACCEPT_HS256)
+                else:
+                    from rest_framework_simplejwt.state import (
+                        token_backend as default_backend)
+                    token_backend = default_backend
+    return token_backend
+
+
+def get_jwks() -> dict:
+    backend = get_token_backend()
+    if not isinstance(backend, KeyRingTokenBackend):
+        return {'keys': []}
+    return backend.get_jwks()
+
+
+_jwks_document = None
+
+
+def get_jwks_document():
+    """
+    Serialized key set and its ETag, the keys only change on restart
+    """
+    global _jwks_document
+
+    if _jwks_document is None:
+        body = json.dumps(get_jwks(), separators=(',', ':')).encode()
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        _jwks_document = (body, etag)
+    return _jwks_document
+
+
+def jwks_view(request):
+    """
+    Public keys of `JWT_KEYS` as a JSON Web Key Set
+    """
+    body, etag = get_jwks_document()
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.JWKS_MAX_AGE}'
+    return response
+
+
+def get_user_claims(user) -> dict:
+    """
+    Compact user claims added to the tokens with `JWT_USER_CLAIMS`,
+    they describe the user when the refresh token was issued
+    """
+    return {
+        'email': user.email,
+        'email_verified': user.verified_email,
+        'active': user.active,
+    }
+
+
+class KeyRingTokenMixin:
+
+    def get_token_backend(self):
+        return get_token_backend()
+
+
+class AccessToken(KeyRingTokenMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeyRingTokenMixin, tokens.RefreshToken):
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        if settings.JWT_USER_CLAIMS:
+            token.payload.update(get_user_claims(user))
+        return token
+
+    @property
+    def access_token(self):
+        """
+        Access token signed with the same backend, copying the claims
+        like `rest_framework_simplejwt.tokens.RefreshToken`
+        """
+        access = AccessToken()
+        access.set_exp(from_time=self.current_time)
+
+        for claim, value in self.payload.items():
+            if claim not in self.no_copy_claims:
+                access[claim] = value
+        return access
@@ -1,5 +1,5 @@
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -10,6 +10,13 @@ ENCRYPTING_KEY = config('ENCRYPTING_KEY')
 
 DEBUG = config('DEBUG', default=False, cast=bool)
 
+# Skip data migrations that have a `manage.py backfill` equivalent,
+# the backfill is then run online after migrating
+DEFER_BACKFILLS = config('DEFER_BACKFILLS', default=False, cast=bool)
+
+# Log when a view runs more queries than its `query_budget`
+QUERY_BUDGETS = config('QUERY_BUDGETS', default=DEBUG, cast=bool)
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -29,12 +36,30 @@ REST_FRAMEWORK = {
         'utils.base.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTTokenUserAuthentication',
+        'authentication.authentication.RevocableJWTTokenUserAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'utils.base.pagination.CustomPagination',
+    'DEFAULT_PAGINATION_CLASS': 'utils.base.pagination.KeysetPagination',
+    # Used by utils.base.throttling, keyed `<view scope>_<throttle scope>`
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'login_global': '1200/min',
+        'register_ip': '10/hour',
+        'register_global': '600/min',
+        'otp_ip': '10/min',
+        'otp_email': '5/min',
+        'otp_global': '600/min',
+        'password_reset_ip': '10/min',
+        'password_reset_email': '5/min',
+        'password_reset_global': '600/min',
+    },
 }
 
+THROTTLE_CACHE = 'default'
+
 MIDDLEWARE = [
+    # First, so its wall time covers the other middleware
+    'utils.base.metrics.MetricsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,6 +76,7 @@ ROOT_URLCONF = 'config.urls'
 AUTH_USER_MODEL = 'authentication.User'
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 CACHES = {
     'default': {
@@ -58,6 +84,16 @@ CACHES = {
     }
 }
 
+# Active users cached for request authentication (authentication.cache),
+# bump the version when the format of the cached entries changes.
+USER_CACHE = 'default'
+USER_CACHE_TIMEOUT = 300
+USER_CACHE_VERSION = 2
+# Seconds an email that matched no user is remembered, bounding how
+# long a new signup can be reported as unknown on another process
+MISSING_EMAIL_CACHE_TIMEOUT = config(
+    'MISSING_EMAIL_CACHE_TIMEOUT', default=30, cast=int)
+
 
 TEMPLATES = [
     {
@@ -96,6 +132,13 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
 ]
 
+# Pool checking passwords for the async login (authentication.hashing),
+# requests beyond workers + queue size get a 503 with Retry-After.
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=4, cast=int)
+PASSWORD_HASH_QUEUE_SIZE = config(
+    'PASSWORD_HASH_QUEUE_SIZE', default=32, cast=int)
+PASSWORD_HASH_RETRY_AFTER = 1
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -152,19 +195,122 @@ LOGGING = {
 
 PASSWORD_RESET_TIMEOUT = 600
 
+# One time passwords (authentication.otp)
+OTP_CACHE = 'default'
+OTP_TIMEOUT = 600
+OTP_MAX_ATTEMPTS = 5
+
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = config(
+    'EMAIL_BACKEND', default="django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=BASE_DIR / 'logs/emails')
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
 EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
 EMAIL_USE_SSL = config('EMAIL_USE_SSL', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='')
+# Drop outgoing emails instead of queueing them
+OFF_EMAIL = config('OFF_EMAIL', default=False, cast=bool)
+
+# Outbox worker (manage.py send_emails)
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = 30  # seconds, doubled on every failed attempt
+EMAIL_OUTBOX_MAX_BACKOFF = 3600
+# Seconds a claimed batch is hidden from other workers, emails of a
+# worker that died while sending are retried after it
+EMAIL_OUTBOX_LEASE = 300
 
 
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=200)
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=200),
+    'AUTH_TOKEN_CLASSES': ('authentication.signing.AccessToken',),
 }
 
-OFF_EMAIL = True
+# Asymmetric jwt signing (authentication.signing), PEM files of RSA or
+# Ed25519 keys. The first signs, the others are only used to verify
+# tokens during a key rotation. Create keys with manage.py
+# generate_jwt_key. Without keys tokens are signed with SECRET_KEY.
+JWT_KEYS = config('JWT_KEYS', default='', cast=Csv())
+# Accept HS256 tokens signed before JWT_KEYS was set
+JWT_ACCEPT_HS256 = config('JWT_ACCEPT_HS256', default=False, cast=bool)
+# Add the email, email_verified and active claims to the tokens
+JWT_USER_CLAIMS = config('JWT_USER_CLAIMS', default=False, cast=bool)
+# Seconds clients may cache /.well-known/jwks.json
+JWKS_MAX_AGE = 3600
+
+# Revoked tokens (authentication.revocation), mirrored in a Bloom filter
+# per process which polls the cache for new revocations every interval.
+REVOCATION_CACHE = 'default'
+REVOCATION_REFRESH_INTERVAL = config(
+    'REVOCATION_REFRESH_INTERVAL', default=1, cast=float)
+REVOCATION_BLOOM_CAPACITY = 100000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+
+# SMS channel (utils.base.sms), the local provider only logs messages
+# and is the default in DEBUG only, sending fails without a provider and
+# `check --deploy` reports it. TwilioSMSProvider needs `twilio`.
+# Each provider sends at most SMS_MAX_CONCURRENCY messages at a time.
+SMS_PROVIDER = config(
+    'SMS_PROVIDER',
+    default='utils.base.sms.LocalSMSProvider' if DEBUG else '')
+SMS_MAX_CONCURRENCY = config('SMS_MAX_CONCURRENCY', default=4, cast=int)
+SMS_MAX_ATTEMPTS = config('SMS_MAX_ATTEMPTS', default=3, cast=int)
+# Seconds before the first retry, doubled on every failure
+SMS_RETRY_BACKOFF = config('SMS_RETRY_BACKOFF', default=1, cast=float)
+SMS_LOCAL_DELAY = config('SMS_LOCAL_DELAY', default=0, cast=float)
+# Messages kept by the local provider of each process
+SMS_LOCAL_OUTBOX_SIZE = 100
+
+# Used by utils.base.sms.TwilioSMSProvider
+TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
+TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
+TWILIO_FROM_NUMBER = config('TWILIO_FROM_NUMBER', default='')
+
+# Bearer token required to scrape /metrics (utils.base.metrics),
+# without one the endpoint is only served in DEBUG
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Maximum number of tokens accepted by the batch token validation endpoint
+TOKEN_VALIDATE_BATCH_SIZE = 100
+
+# People search (authentication.search), the trigram indexes can't
+# match terms shorter than 3 characters
+SEARCH_MIN_TERM_LENGTH = 3
+SEARCH_MAX_TERMS = 8
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+# Profiles or pending relationships listed by an admin search
+SEARCH_ADMIN_LIMIT = 500
+SEARCH_INDEX_BATCH_SIZE = 500
+
+# Registry lookups (authentication.registry), entries are cached per
+# email or phone number and dropped from the cache when they change
+REGISTRY_CACHE = 'default'
+REGISTRY_CACHE_TIMEOUT = 300
+REGISTRY_LOOKUP_BATCH_SIZE = 100
+# Seconds clients may reuse a lookup response
+REGISTRY_LOOKUP_MAX_AGE = 30
+
+# Streaming exports (authentication.export), rows fetched per round trip
+# of the server side cursor and bytes encoded before a chunk is sent
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# OpenAPI schema written by `manage.py generate_openapi` and served by
+# utils.base.schema outside of DEBUG, regenerate it on every deploy
+OPENAPI_SCHEMA_DIR = config(
+    'OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+OPENAPI_SCHEMA_MAX_AGE = 86400
+SWAGGER_SETTINGS = {
+    'DEFAULT_INFO': 'config.urls.API_INFO',
+}
 
+# Cold start budgets in seconds, checked by `manage.py benchmark_startup
+# --check`: imports of django.setup() and the URLconf, and the time from
+# loading the settings to the first response of a new worker
+STARTUP_IMPORT_BUDGET = config(
+    'STARTUP_IMPORT_BUDGET', default=1.5, cast=float)
+STARTUP_FIRST_RESPONSE_BUDGET = config(
+    'STARTUP_FIRST_RESPONSE_BUDGET', default=2.0, cast=float)
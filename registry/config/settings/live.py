@@ -3,5 +3,6 @@ from .staging import *  # noqa
 ALLOWED_HOSTS = ['x.x.x']
 
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5)  # noqa
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),  # noqa
+    'AUTH_TOKEN_CLASSES': ('authentication.signing.AccessToken',),
 }
@@ -23,6 +23,9 @@ CACHES = {
 
 STATIC_ROOT = BASE_DIR / "static"  # noqa
 
+DEFER_BACKFILLS = config('DEFER_BACKFILLS', default=True, cast=bool)  # noqa
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=200)  # noqa
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=200),  # noqa
+    'AUTH_TOKEN_CLASSES': ('authentication.signing.AccessToken',),
 }
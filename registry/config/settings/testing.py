@@ -6,3 +6,10 @@ from .dev import *
 INSTALLED_APPS += [
     'tests',
 ]
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+QUERY_BUDGETS = True
+
+SMS_PROVIDER = 'utils.base.sms.LocalSMSProvider'
+SMS_RETRY_BACKOFF = 0
@@ -1,26 +1,57 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from utils.base.metrics import metrics_view
+from utils.base.schema import docs_view, schema_view
 
 V1 = 'v1'
 
-schema = get_schema_view(
-    openapi.Info(
-        title="Registry API",
-        default_version=V1,
-        description="Api documentation for Registry.",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="support@x.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
+# SWAGGER_SETTINGS['DEFAULT_INFO'], also used by generate_openapi
+API_INFO = openapi.Info(
+    title="Registry API",
+    default_version=V1,
+    description="Api documentation for Registry.",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="support@x.com"),
+    license=openapi.License(name="BSD License"),
 )
 
+
+def jwks_view(request):
+    # signing imports jwt, loaded with the first request for the keys
+    # rather than with the urls
+    from authentication import signing
+    return signing.jwks_view(request)
+
+
+if settings.DEBUG:
+    from drf_yasg.views import get_schema_view
+
+    # Rebuilt on every request, to see changes without regenerating
+    schema = get_schema_view(
+        API_INFO,
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    docs = [
+        path(
+            'docs/',
+            schema.with_ui('swagger', cache_timeout=0),
+            name='schema-swagger-ui'),
+        re_path(
+            r'^docs/schema(?P<format>\.json|\.yaml)$',
+            schema.without_ui(cache_timeout=0),
+            name='schema'),
+    ]
+else:
+    docs = [
+        path('docs/', docs_view, name='schema-swagger-ui'),
+        path('docs/schema.<str:fmt>', schema_view, name='schema'),
+    ]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -36,10 +67,10 @@ urlpatterns = [
         )
     ),
 
-    path(
-        'docs/',
-        schema.with_ui('swagger', cache_timeout=0),
-        name='schema-swagger-ui'),
+    *docs,
+
+    path('metrics', metrics_view, name='metrics'),
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
 ]
 
 
@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Throttles and cached users would leak between tests
+    for cache in caches.all():
+        cache.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    return APIClient()
@@ -0,0 +1,98 @@
+import pytest
+from django.urls import reverse
+from utils.base.executors import BoundedExecutor
+
+from authentication.models import User
+from authentication.otp import PASSWORD_RESET, otp_store
+
+PASSWORD = 'Str0ng-passw0rd!'
+REGISTER = {
+    'email': 'ada@example.com',
+    'password': PASSWORD,
+    'fullname': 'Ada Lovelace',
+    'country': 'NG',
+}
+
+
+@pytest.fixture
+def user(db):
+    user = User.objects.create_user(
+        'bob@example.com', PASSWORD, profile={'fullname': 'Bob'})
+    User.objects.filter(pk=user.pk).update(verified_email=True)
+    return user
+
+
+@pytest.fixture
+def full_pool(mocker):
+    # No room for a single task, submitting raises ExecutorBusy
+    mocker.patch('authentication.hashing.hash_executor',
+                 BoundedExecutor(max_workers=0, queue_size=0))
+
+
+def post(client, name, data):
+    return client.post(reverse(f'auth:{name}'), data, format='json')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', ['register', 'register_async'])
+def test_register(client, name):
+    response = post(client, name, REGISTER)
+    assert response.status_code == 200
+    assert response.json()['email'] == REGISTER['email']
+    assert User.objects.filter(email=REGISTER['email']).exists()
+
+
+@pytest.mark.parametrize('name', ['login', 'login_async'])
+@pytest.mark.parametrize('password, verified, status', [
+    (PASSWORD, True, 200),
+    (PASSWORD, False, 423),
+    ('wrong', True, 400),
+])
+def test_login(client, user, name, password, verified, status):
+    User.objects.filter(pk=user.pk).update(verified_email=verified)
+    response = post(client, name, {'email': user.email, 'password': password})
+    assert response.status_code == status
+    if status == 200:
+        assert response.json()['user']['email'] == user.email
+
+
+@pytest.mark.django_db
+def test_register_busy(client, full_pool):
+    response = post(client, 'register_async', REGISTER)
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+    assert not User.objects.filter(email=REGISTER['email']).exists()
+
+
+def test_login_busy(client, user, full_pool):
+    response = post(
+        client, 'login_async', {'email': user.email, 'password': PASSWORD})
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+
+
+@pytest.mark.parametrize('name', ['update_password', 'update_password_async'])
+def test_update_password(client, user, name):
+    otp = otp_store.issue(PASSWORD_RESET, user.pk)
+    data = {'email': user.email, 'otp': otp, 'password': 'N3w-passw0rd!'}
+
+    assert post(client, name, data).status_code == 200
+    user.refresh_from_db()
+    assert user.check_password('N3w-passw0rd!')
+    # The otp is consumed
+    assert post(client, name, data).status_code == 400
+
+
+def test_update_password_busy_keeps_otp(client, user, mocker, full_pool):
+    otp = otp_store.issue(PASSWORD_RESET, user.pk)
+    data = {'email': user.email, 'otp': otp, 'password': 'N3w-passw0rd!'}
+
+    response = post(client, 'update_password_async', data)
+    assert response.status_code == 503
+    user.refresh_from_db()
+    assert user.check_password(PASSWORD)
+
+    mocker.stopall()
+    assert post(client, 'update_password_async', data).status_code == 200
+    user.refresh_from_db()
+    assert user.check_password('N3w-passw0rd!')
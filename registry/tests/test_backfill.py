@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from django.core.management import call_command
+
+from authentication import search
+from authentication.models import (BackfillCheckpoint, Partner, Phone,
+                                   Relationship, RegistryEntry, User)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def phones():
+    """
+    Phones of a user in a relationship, saved without their E.164 form
+    """
+    user = User.objects.create_user(
+        'ada@example.com', 'pw', profile={'fullname': 'Ada'})
+    other = User.objects.create_user(
+        'bob@example.com', 'pw', profile={'fullname': 'Bob'})
+    relationship = Relationship.objects.create()
+    relationship.partners.add(
+        Partner.objects.create(profile=user.profile),
+        Partner.objects.create(profile=other.profile))
+    phones = [
+        Phone.objects.create(profile=user.profile, phoneno=number)
+        for number in ('+234 803 123 4567', '+234 803 123 4568')
+    ]
+    Phone.objects.update(phoneno_e164=None)
+    RegistryEntry.objects.all().delete()
+    return phones
+
+
+def backfill(*args) -> str:
+    stdout = io.StringIO()
+    call_command('backfill', 'phone_e164', '--sleep', '0', *args,
+                 stdout=stdout)
+    return stdout.getvalue()
+
+
+def test_backfill_phone_e164(phones, mocker):
+    index = mocker.spy(search, 'index')
+    backfill()
+
+    assert sorted(Phone.objects.values_list('phoneno_e164', flat=True)) == [
+        '+2348031234567', '+2348031234568']
+    # Bulk updates send no signals, the backfill refreshes the entries
+    assert set(RegistryEntry.objects.values_list(
+        'identifier', flat=True)) == {'+2348031234567', '+2348031234568'}
+    index.assert_called_with(search.PROFILE, {phones[0].profile_id})
+
+
+def test_backfill_resumes(phones):
+    checkpoint = BackfillCheckpoint.objects.create(
+        name='phone_e164', last_pk=phones[0].pk)
+    assert f'Resuming phone_e164 after pk {phones[0].pk}' in backfill()
+
+    assert list(Phone.objects.order_by('pk').values_list(
+        'phoneno_e164', flat=True)) == [None, '+2348031234568']
+    checkpoint.refresh_from_db()
+    assert checkpoint.completed
+    assert 'already completed' in backfill()
+
+    backfill('--restart', '--batch-size', '1')
+    assert not Phone.objects.filter(phoneno_e164=None).exists()
+
+
+def test_backfill_list():
+    stdout = io.StringIO()
+    call_command('backfill', '--list', stdout=stdout)
+    lines = stdout.getvalue().splitlines()
+    assert 'phone_e164: authentication_phone (phoneno_e164)' in lines
+    assert 'registry_emails: authentication_user (registry entries)' in lines
+    assert (
+        'search_profiles: authentication_profile (search entries)' in lines)
@@ -0,0 +1,136 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from authentication.models import Phone, Profile, User
+from utils.base.general import get_tokens_for_user
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def users():
+    return [
+        User.objects.create_user(
+            f'user{i}@example.com', 'pw', profile={'fullname': f'User {i}'})
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def staff_client(client):
+    staff = User.objects.create_staff('staff@example.com', 'pw')
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(staff)["access"]}')
+    return client
+
+
+def get_export(client, dataset: str, fmt: str = 'ndjson', **kwargs):
+    return client.get(
+        reverse('auth:export', args=[dataset, fmt]), **kwargs)
+
+
+def read_ndjson(data: bytes) -> list:
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+def test_export_staff_only(client, users):
+    assert get_export(client, 'users').status_code == 401
+
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(users[0])["access"]}')
+    assert get_export(client, 'users').status_code == 403
+
+
+def test_export_ndjson(users, staff_client):
+    response = get_export(staff_client, 'profiles')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    assert response['Content-Disposition'] == (
+        'attachment; filename="profiles.ndjson"')
+
+    rows = read_ndjson(b''.join(response.streaming_content))
+    assert [row['fullname'] for row in rows] == [
+        'User 0', 'User 1', 'User 2', '']
+    assert set(rows[0]) == {
+        'id', 'user_id', 'fullname', 'sex', 'country', 'created'}
+
+
+def test_export_csv_gzipped(users, staff_client):
+    response = get_export(
+        staff_client, 'users', 'csv', HTTP_ACCEPT_ENCODING='gzip, br')
+    assert response.status_code == 200
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response['Vary']
+
+    data = gzip.decompress(b''.join(response.streaming_content)).decode()
+    rows = list(csv.DictReader(io.StringIO(data)))
+    assert [row['email'] for row in rows] == [
+        'user0@example.com', 'user1@example.com', 'user2@example.com',
+        'staff@example.com']
+
+
+def test_export_since(users, staff_client):
+    response = get_export(
+        staff_client, 'users', data={'since': users[0].pk})
+    rows = read_ndjson(b''.join(response.streaming_content))
+    assert [row['email'] for row in rows] == [
+        'user1@example.com', 'user2@example.com', 'staff@example.com']
+
+    since = timezone.now()
+    users[1].active = True
+    users[1].save()
+    Profile.objects.filter(pk=users[2].profile.pk).update(fullname='Edited')
+    User.objects.create_user(
+        'new@example.com', 'pw', profile={'fullname': 'New'})
+
+    response = get_export(
+        staff_client, 'users', data={'since': since.isoformat()})
+    rows = read_ndjson(b''.join(response.streaming_content))
+    assert [row['email'] for row in rows] == [
+        'user1@example.com', 'new@example.com']
+
+    # Profiles are timestamped on creation only
+    response = get_export(
+        staff_client, 'profiles', data={'since': since.isoformat()})
+    rows = read_ndjson(b''.join(response.streaming_content))
+    assert [row['fullname'] for row in rows] == ['New']
+
+
+def test_export_errors(users, staff_client):
+    assert get_export(staff_client, 'secrets').status_code == 404
+    assert get_export(staff_client, 'users', 'xml').status_code == 404
+    assert get_export(
+        staff_client, 'users', data={'since': 'yesterday'}
+    ).status_code == 400
+    assert get_export(
+        staff_client, 'phones', data={'since': '2026-01-01'}
+    ).status_code == 400
+
+
+def test_export_command(users, tmp_path):
+    Phone.objects.create(profile=users[0].profile, phoneno='+2348031234567')
+    output = tmp_path / 'phones.csv.gz'
+    call_command(
+        'export', 'phones', '--format', 'csv', '--gzip', '-o', str(output))
+
+    rows = list(csv.DictReader(
+        io.StringIO(gzip.decompress(output.read_bytes()).decode())))
+    assert [row['phoneno_e164'] for row in rows] == ['+2348031234567']
+
+    output = tmp_path / 'users.ndjson'
+    call_command('export', 'users', '--since', str(users[1].pk),
+                 '-o', str(output))
+    rows = read_ndjson(output.read_bytes())
+    assert [row['id'] for row in rows] == [users[2].pk]
+
+    with pytest.raises(CommandError, match='only be exported since an id'):
+        call_command('export', 'phones', '--since', '2026-01-01')
+    with pytest.raises(CommandError, match='Expected an id'):
+        call_command('export', 'users', '--since', 'yesterday')
@@ -0,0 +1,79 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+
+from authentication.models import Phone, Profile, User
+
+pytestmark = pytest.mark.django_db
+
+HEADER = 'email,password,fullname,sex,country,phones\n'
+ROWS = [
+    'ada@example.com,pw,Ada Obi,female,Nigeria,+234 803 123 4567\n',
+    'bob@example.com,pw,Bob Eze,M,Ghana,\n',
+    'eve@example.com,pw,Eve,unknown,,\n',
+    'ADA@example.com,pw,Ada Again,F,,\n',
+    'joe@example.com,pw,Joe,,,+234 803 123 4568;+234 803 123 4569\n',
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text(HEADER + ''.join(ROWS))
+    return path
+
+
+def import_users(path, *args) -> str:
+    stdout = io.StringIO()
+    call_command('import_users', str(path), '--workers', '1',
+                 '--chunk-size', '2', *args, stdout=stdout)
+    return stdout.getvalue()
+
+
+def test_import_users(path):
+    output = import_users(path)
+
+    assert 'Imported 3 users' in output
+    assert 'skipped 1 existing, 1 invalid' in output
+    assert sorted(User.objects.values_list('email', flat=True)) == [
+        'ada@example.com', 'bob@example.com', 'joe@example.com']
+    assert dict(Profile.objects.values_list('fullname', 'sex')) == {
+        'Ada Obi': 'F', 'Bob Eze': 'M', 'Joe': ''}
+    assert sorted(Phone.objects.values_list('phoneno_e164', flat=True)) == [
+        '+2348031234567', '+2348031234568', '+2348031234569']
+
+    user = User.objects.get(email='ada@example.com')
+    assert user.check_password('pw')
+    assert json.loads(path.with_suffix('.csv.checkpoint').read_text()) == {
+        'rows': len(ROWS)}
+
+
+def test_import_users_invalid_values(tmp_path):
+    path = tmp_path / 'users.jsonl'
+    rows = [
+        {'email': 'ada@example.com', 'fullname': 'Ada', 'sex': 1},
+        {'email': 'bob@example.com', 'fullname': 'B' * 51},
+        {'email': 'eve@example.com', 'fullname': 'Eve', 'country': 'C' * 61},
+        {'email': 'joe@example.com', 'fullname': 'Joe', 'sex': 'm'},
+    ]
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+
+    assert 'skipped 0 existing, 3 invalid' in import_users(path)
+    assert list(User.objects.values_list('email', flat=True)) == [
+        'joe@example.com']
+
+
+def test_import_users_resumes(path):
+    path.with_suffix('.csv.checkpoint').write_text(json.dumps({'rows': 2}))
+
+    assert 'Resuming after 2 rows' in import_users(path)
+    assert sorted(User.objects.values_list('email', flat=True)) == [
+        'ADA@example.com', 'joe@example.com']
+
+    # Already imported rows are skipped when starting again
+    output = import_users(path, '--restart')
+    assert 'Imported 1 users' in output
+    assert 'skipped 3 existing, 1 invalid' in output
+    assert User.objects.count() == 3
@@ -0,0 +1,21 @@
+import pytest
+from django.urls import reverse
+
+
+@pytest.mark.parametrize('debug, status', [(False, 404), (True, 200)])
+def test_metrics_without_token(client, settings, debug, status):
+    settings.METRICS_TOKEN = ''
+    settings.DEBUG = debug
+    assert client.get(reverse('metrics')).status_code == status
+
+
+@pytest.mark.parametrize('authorization, status', [
+    ('', 401),
+    ('Bearer wrong', 401),
+    ('Bearer secret', 200),
+])
+def test_metrics_with_token(client, settings, authorization, status):
+    settings.METRICS_TOKEN = 'secret'
+    response = client.get(
+        reverse('metrics'), HTTP_AUTHORIZATION=authorization)
+    assert response.status_code == status
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.utils import timezone
+
+from authentication.models import EmailOutbox
+from authentication.outbox import claim_batch, deliver_batch
+
+pytestmark = pytest.mark.django_db
+
+
+class FailingBackend(EmailBackend):
+    """
+    Locmem backend failing to send to the given recipients
+    """
+
+    def __init__(self, *failing, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = failing
+        self.in_transaction = []
+
+    def send_messages(self, messages):
+        self.in_transaction.append(connection.in_atomic_block)
+        if messages[0].to[0] in self.failing:
+            raise ConnectionError('connection reset')
+        return super().send_messages(messages)
+
+
+def enqueue(recipient='ada@example.com') -> EmailOutbox:
+    return EmailOutbox.objects.enqueue(recipient, 'Hello', '<p>Hi</p>')
+
+
+def test_enqueue(settings):
+    email = enqueue()
+    assert email.status == EmailOutbox.PENDING
+    assert not mail.outbox
+
+    settings.OFF_EMAIL = True
+    assert enqueue() is None
+    assert EmailOutbox.objects.count() == 1
+
+
+def test_deliver():
+    email = enqueue()
+    assert deliver_batch() == {'sent': 1, 'retried': 0, 'failed': 0}
+
+    [message] = mail.outbox
+    assert message.to == ['ada@example.com']
+    assert message.alternatives == [('<p>Hi</p>', 'text/html')]
+    email.refresh_from_db()
+    assert email.status == EmailOutbox.SENT
+    assert email.attempts == 1
+    assert deliver_batch() == {'sent': 0, 'retried': 0, 'failed': 0}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deliver_outside_transaction():
+    enqueue()
+    backend = FailingBackend()
+    deliver_batch(connection=backend)
+    assert backend.in_transaction == [False]
+
+
+def test_retry(settings):
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    failed = enqueue('bob@example.com')
+    enqueue()
+
+    stats = deliver_batch(connection=FailingBackend('bob@example.com'))
+    assert stats == {'sent': 1, 'retried': 1, 'failed': 0}
+    failed.refresh_from_db()
+    assert failed.status == EmailOutbox.PENDING
+    assert failed.attempts == 1
+    assert failed.last_error == 'connection reset'
+    assert failed.next_attempt_at > timezone.now()
+
+    # Not due before its backoff
+    assert deliver_batch() == {'sent': 0, 'retried': 0, 'failed': 0}
+    EmailOutbox.objects.filter(pk=failed.pk).update(
+        next_attempt_at=timezone.now())
+    stats = deliver_batch(connection=FailingBackend('bob@example.com'))
+    assert stats == {'sent': 0, 'retried': 0, 'failed': 1}
+    failed.refresh_from_db()
+    assert failed.status == EmailOutbox.FAILED
+
+
+def test_claimed_emails_are_leased(settings):
+    settings.EMAIL_OUTBOX_LEASE = 60
+    email = enqueue()
+    assert claim_batch(10) == [email]
+    # Another worker doesn't see them until the lease ends
+    assert claim_batch(10) == []
+
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        next_attempt_at=timezone.now() - timedelta(seconds=1))
+    assert claim_batch(10) == [email]
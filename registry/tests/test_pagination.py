@@ -0,0 +1,81 @@
+import pytest
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from authentication.models import Relationship
+from utils.base.pagination import KeysetPagination, encode_cursor
+
+pytestmark = pytest.mark.django_db
+
+factory = APIRequestFactory()
+
+
+@pytest.fixture
+def relationships():
+    """
+    Five relationships created in the same instant, like the rows
+    given a default `created` by migration 0010
+    """
+    relationships = [Relationship.objects.create() for _ in range(5)]
+    Relationship.objects.update(created=timezone.now())
+    return [relationship.pk for relationship in relationships]
+
+
+def paginate(url: str) -> KeysetPagination:
+    paginator = KeysetPagination()
+    paginator.paginate_queryset(
+        Relationship.objects.all(), Request(factory.get(url)))
+    return paginator
+
+
+def get_ids(paginator: KeysetPagination) -> list:
+    return [row.pk for row in paginator.page]
+
+
+def test_pages_of_ties(relationships):
+    pages = []
+    paginator = paginate('/relationships/?page_size=2')
+    while True:
+        pages.append(get_ids(paginator))
+        link = paginator.get_next_link()
+        if link is None:
+            break
+        paginator = paginate(link)
+
+    newest = relationships[::-1]
+    assert pages == [newest[:2], newest[2:4], newest[4:]]
+
+
+def test_pages_backwards(relationships):
+    newest = relationships[::-1]
+    first = paginate('/relationships/?page_size=2')
+    assert first.get_previous_link() is None
+    last = paginate(paginate(first.get_next_link()).get_next_link())
+    assert get_ids(last) == newest[4:]
+
+    middle = paginate(last.get_previous_link())
+    assert get_ids(middle) == newest[2:4]
+    assert get_ids(paginate(middle.get_next_link())) == newest[4:]
+
+    first = paginate(middle.get_previous_link())
+    assert get_ids(first) == newest[:2]
+    assert first.get_previous_link() is None
+    assert get_ids(paginate(first.get_next_link())) == newest[2:4]
+
+
+def test_bad_cursors(relationships):
+    with pytest.raises(NotFound):
+        paginate('/relationships/?cursor=forged')
+
+    # Cursors are only valid on the path that made them
+    link = paginate('/relationships/?page_size=2').get_next_link()
+    with pytest.raises(NotFound):
+        paginate(link.replace('/relationships/', '/partners/'))
+
+    salt = KeysetPagination().get_salt(
+        Request(factory.get('/relationships/')))
+    cursor = encode_cursor({'v': ['yesterday', 'one']}, salt)
+    with pytest.raises(NotFound):
+        paginate(f'/relationships/?cursor={cursor}')
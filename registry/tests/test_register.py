@@ -0,0 +1,66 @@
+import pytest
+from django.db import IntegrityError, connection
+from django.urls import reverse
+
+from authentication.models import Profile, SearchEntry, User
+
+DATA = {
+    'email': 'ada@example.com',
+    'password': 'Str0ng-passw0rd!',
+    'password2': 'Str0ng-passw0rd!',
+    'fullname': 'Ada Lovelace',
+    'country': 'NG',
+}
+
+
+def get_inserts(queries) -> list:
+    return [
+        query['sql'].split('"')[1] for query in queries
+        if query['sql'].startswith('INSERT')
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_register_queries(client, django_assert_num_queries):
+    # SQLite logs the BEGIN of the request and of the search index
+    # transactions, the other databases don't
+    begins = 2 if connection.vendor == 'sqlite' else 0
+
+    # One insert per table and the search entry rebuilt on commit from
+    # the profile, its phones and its current entry
+    with django_assert_num_queries(7 + begins) as captured:
+        response = client.post(reverse('auth:register'), DATA, format='json')
+
+    assert response.status_code == 200
+    assert get_inserts(captured.captured_queries) == [
+        'authentication_user',
+        'authentication_profile',
+        # On commit of the signup, before the verification email
+        'authentication_searchentry',
+        'authentication_emailoutbox',
+    ]
+    user = User.objects.get(email=DATA['email'])
+    assert user.profile.fullname == DATA['fullname']
+    assert SearchEntry.objects.filter(object_id=user.profile.pk).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_register_taken_email(client):
+    User.objects.create_user(
+        'Ada@Example.com', 'pw', profile={'fullname': 'Ada'})
+
+    response = client.post(reverse('auth:register'), DATA, format='json')
+
+    assert response.status_code == 400
+    assert 'email' in response.data
+    assert User.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_register_other_integrity_error(client, mocker):
+    mocker.patch.object(
+        Profile.objects, 'create', side_effect=IntegrityError('profile'))
+
+    with pytest.raises(IntegrityError):
+        client.post(reverse('auth:register'), DATA, format='json')
+    assert not User.objects.exists()
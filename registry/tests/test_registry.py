@@ -0,0 +1,138 @@
+import pytest
+from django.contrib.auth.models import update_last_login
+from django.urls import reverse
+
+from authentication import registry
+from authentication.models import Partner, Phone, Relationship, User
+from utils.base.general import get_tokens_for_user
+
+pytestmark = pytest.mark.django_db
+
+PHONE = '+2348031234567'
+
+
+@pytest.fixture
+def relationship():
+    """
+    Relationship of a user with a phone and another user
+    """
+    user = User.objects.create_user(
+        'ada@example.com', 'pw', profile={'fullname': 'Ada'})
+    other = User.objects.create_user(
+        'bob@example.com', 'pw', profile={'fullname': 'Bob'})
+    Phone.objects.create(profile=user.profile, phoneno='+234 803 123 4567')
+    relationship = Relationship.objects.create()
+    relationship.partners.add(
+        Partner.objects.create(profile=user.profile),
+        Partner.objects.create(profile=other.profile))
+    return relationship
+
+
+def status(value: str):
+    result, = registry.lookup([value])
+    return result['status'] if result['registered'] else None
+
+
+def test_lookup(relationship):
+    results = registry.lookup([
+        'ADA@example.com', '0803 123 4567', '+234 803 123 4567',
+        'nobody@example.com', 'not an id',
+    ])
+
+    assert [result['normalized'] for result in results] == [
+        'ada@example.com', None, PHONE, 'nobody@example.com', None]
+    assert [result['valid'] for result in results] == [
+        True, False, True, True, False]
+    assert [result['registered'] for result in results] == [
+        True, False, True, False, False]
+    assert results[0] == {
+        'identifier': 'ADA@example.com',
+        'normalized': 'ada@example.com',
+        'valid': True,
+        'registered': True,
+        'status': 'dating',
+        'relationship_verified': False,
+        'verified': False,
+    }
+
+
+def test_lookup_cached(relationship, django_assert_num_queries):
+    identifiers = ['ada@example.com', PHONE, 'nobody@example.com']
+    with django_assert_num_queries(1):
+        registry.lookup(identifiers)
+    with django_assert_num_queries(0):
+        registry.lookup(identifiers)
+
+
+def test_relationship_changes(relationship):
+    relationship.status = 'married'
+    relationship.verified = True
+    relationship.save()
+    result, = registry.lookup([PHONE])
+    assert result['status'] == 'married'
+    assert result['relationship_verified'] is True
+
+    partner = relationship.partners.get(profile__user__email='bob@example.com')
+    relationship.partners.remove(partner)
+    assert status('bob@example.com') is None
+    assert status('ada@example.com') == 'married'
+
+    relationship.delete()
+    assert status('ada@example.com') is None
+    assert status(PHONE) is None
+
+
+def test_phone_changes(relationship):
+    phone = Phone.objects.get()
+    phone.phoneno = '+234 803 123 4568'
+    phone.save()
+    assert status(PHONE) is None
+    assert status('+2348031234568') == 'dating'
+
+    phone.delete()
+    assert status('+2348031234568') is None
+
+
+def test_user_changes(relationship, mocker):
+    user = User.objects.get(email='ada@example.com')
+    refresh = mocker.spy(registry, 'refresh')
+
+    update_last_login(None, user)
+    user.save()
+    refresh.assert_not_called()
+
+    user.verified_email = True
+    user.save()
+    refresh.assert_called_once_with({'ada@example.com'})
+    assert registry.lookup(['ada@example.com'])[0]['verified'] is True
+
+    user.email = 'ada@example.org'
+    user.save()
+    assert status('ada@example.com') is None
+    assert status('ada@example.org') == 'dating'
+
+
+def test_lookup_view(client, relationship):
+    user = User.objects.get(email='bob@example.com')
+    url = reverse('auth:registry_lookup')
+    params = {'id': ['ada@example.com', PHONE]}
+    assert client.get(url, params).status_code == 401
+
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    response = client.get(url, params)
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json()] == [
+        'dating', 'dating']
+    etag = response['ETag']
+
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    relationship.status = 'married'
+    relationship.save()
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+    assert client.get(url).status_code == 400
@@ -0,0 +1,142 @@
+import time
+import uuid
+
+import pytest
+from django.urls import reverse
+from utils.base.general import get_tokens_for_user
+
+from authentication import revocation
+from authentication.models import User
+from authentication.revocation import RevocationList
+
+
+@pytest.fixture
+def user(db):
+    user = User.objects.create_user(
+        'ada@example.com', 'pw', profile={'fullname': 'Ada'})
+    User.objects.filter(pk=user.pk).update(verified_email=True)
+    return user
+
+
+def get_status(client, access) -> int:
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    return client.get(reverse('auth:user-detail')).status_code
+
+
+def refresh(client, raw_refresh) -> int:
+    client.credentials()
+    return client.post(
+        reverse('auth:token_refresh'), {'refresh': raw_refresh},
+        format='json').status_code
+
+
+def make_token(user_id=1, iat=None) -> dict:
+    now = int(time.time())
+    return {
+        'jti': uuid.uuid4().hex,
+        'user_id': user_id,
+        'iat': now if iat is None else iat,
+        'exp': now + 300,
+    }
+
+
+def test_logout(client, user):
+    tokens = get_tokens_for_user(user)
+    other = get_tokens_for_user(user)
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+    response = client.post(
+        reverse('auth:logout'), {'refresh': tokens['refresh']},
+        format='json')
+    assert response.status_code == 204
+
+    assert get_status(client, tokens['access']) == 401
+    assert refresh(client, tokens['refresh']) == 401
+    # Other sessions stay logged in
+    assert get_status(client, other['access']) == 200
+    assert refresh(client, other['refresh']) == 200
+
+
+def test_logout_all(client, user, mocker):
+    old = get_tokens_for_user(user)
+    # Tokens issued in an earlier second than the logout
+    now = time.time() + 1
+    mocker.patch.object(revocation, 'time', mocker.Mock(
+        time=lambda: now, monotonic=time.monotonic))
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {old["access"]}')
+    assert client.post(reverse('auth:logout-all')).status_code == 204
+    mocker.stopall()
+
+    assert get_status(client, old['access']) == 401
+    assert refresh(client, old['refresh']) == 401
+
+
+def test_login_after_logout_all(client, user):
+    tokens = get_tokens_for_user(user)
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+    assert client.post(reverse('auth:logout-all')).status_code == 204
+    assert get_status(client, tokens['access']) == 401
+
+    # In the same second, the new session must work
+    client.credentials()
+    response = client.post(
+        reverse('auth:login'),
+        {'email': user.email, 'password': 'pw'}, format='json')
+    assert response.status_code == 200
+    assert get_status(client, response.json()['tokens']['access']) == 200
+
+
+def test_revoke_user_keeps_tokens_of_the_second():
+    revocations = RevocationList()
+    token = make_token()
+    revocations.revoke_user(token['user_id'])
+    assert not revocations.is_revoked(token)
+    assert revocations.is_revoked(make_token(iat=token['iat'] - 1))
+    assert not revocations.is_revoked(make_token(user_id=2, iat=0))
+
+
+def test_revocations_reach_other_processes(settings):
+    settings.REVOCATION_REFRESH_INTERVAL = 0
+    first, second = RevocationList(), RevocationList()
+    token = make_token()
+    assert not second.is_revoked(token)
+
+    first.revoke(token)
+    assert second.is_revoked(token)
+
+
+def test_filter_is_cached_between_refreshes(settings):
+    settings.REVOCATION_REFRESH_INTERVAL = 60
+    first, second = RevocationList(), RevocationList()
+    token = make_token()
+    second.refresh()
+
+    first.revoke(token)
+    # Not seen until the next refresh
+    assert not second.is_revoked(token)
+    second.refresh(force=True)
+    assert second.is_revoked(token)
+
+
+def test_filter_rebuilt_when_the_log_restarts(settings):
+    settings.REVOCATION_REFRESH_INTERVAL = 0
+    revocations = RevocationList()
+    token = make_token()
+    revocations.revoke(token)
+    assert revocations.is_revoked(token)
+
+    revocations.cache.clear()
+    assert not revocations.is_revoked(token)
+    assert revocations.seq == 0
+
+
+def test_filter_rebuilt_over_capacity(settings):
+    settings.REVOCATION_REFRESH_INTERVAL = 60
+    settings.REVOCATION_BLOOM_CAPACITY = 2
+    revocations = RevocationList()
+    revocations.refresh()
+    for _ in range(3):
+        revocations.revoke(make_token())
+    # Forces a refresh, which rebuilds the filter from the log
+    assert revocations.seq is None
+    revocations.refresh()
+    assert revocations.seq == 3
@@ -0,0 +1,127 @@
+import pytest
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+
+from authentication import checks, search
+from authentication.models import Phone, Profile, SearchEntry, User
+from utils.base.general import get_tokens_for_user
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def indexed(django_capture_on_commit_callbacks):
+    """
+    Run the on_commit callbacks of the block, indexing its changes
+    """
+    return lambda: django_capture_on_commit_callbacks(execute=True)
+
+
+def create_user(email: str, fullname: str) -> User:
+    return User.objects.create_user(
+        email, 'pw', profile={'fullname': fullname})
+
+
+def found(query: str, **kwargs) -> list:
+    entries, _ = search.search(query, **kwargs)
+    return [(entry.kind, entry.object_id) for entry in entries]
+
+
+def test_changes_are_indexed(indexed):
+    with indexed():
+        user = create_user('ada@example.com', 'Adaeze Okafor')
+    profile = user.profile
+    assert found('adaeze') == [(search.PROFILE, profile.pk)]
+
+    with indexed():
+        profile.fullname = 'Chioma Okafor'
+        profile.save()
+    assert found('adaeze') == []
+    assert found('chiom okaf') == [(search.PROFILE, profile.pk)]
+
+    with indexed():
+        Phone.objects.create(profile=profile, phoneno='+234 803 123 4567')
+    assert found('803 123') == [(search.PROFILE, profile.pk)]
+
+    with indexed():
+        Profile.objects.filter(pk=profile.pk).delete()
+    assert found('chioma') == []
+    assert not SearchEntry.objects.exists()
+
+
+def test_rolled_back_changes_are_not_indexed(indexed):
+    with indexed():
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                create_user('ada@example.com', 'Adaeze Okafor')
+                raise ValueError
+        user = create_user('bob@example.com', 'Bobby Okafor')
+
+    assert found('okafor') == [(search.PROFILE, user.profile.pk)]
+
+
+def test_failed_indexing_is_logged(indexed, mocker):
+    mocker.patch.object(search, 'index', side_effect=RuntimeError)
+    error = mocker.patch.object(search.err_logger, 'error')
+    with indexed():
+        user = create_user('ada@example.com', 'Adaeze Okafor')
+
+    error.assert_called_once()
+    assert error.call_args.args[1:] == (
+        search.PROFILE, [user.profile.pk], 'search_profiles')
+    assert found('adaeze') == []
+
+
+def test_cursor_paging(indexed):
+    with indexed():
+        users = [
+            create_user(f'user{i}@example.com', f'Ngozi Eze{i}')
+            for i in range(5)
+        ]
+
+    pages, cursor = [], None
+    while True:
+        entries, cursor = search.search('ngozi', cursor=cursor, limit=2)
+        pages.append([entry.object_id for entry in entries])
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(sum(pages, [])) == sorted(u.profile.pk for u in users)
+
+    _, cursor = search.search('ngozi', limit=2)
+    with pytest.raises(NotFound):
+        search.search('eze', cursor=cursor, limit=2)
+    with pytest.raises(NotFound):
+        search.search('ngozi', search.PENDING, cursor=cursor, limit=2)
+
+
+def test_search_view(client, indexed):
+    with indexed():
+        user = create_user('ada@example.com', 'Adaeze Okafor')
+    staff = User.objects.create_staff('staff@example.com', 'pw')
+    url = reverse('auth:search')
+
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    assert client.get(url, {'q': 'adaeze'}).status_code == 403
+
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(staff)["access"]}')
+    response = client.get(url, {'q': 'adaeze', 'kind': search.PROFILE})
+    assert response.status_code == 200
+    assert [
+        (result['kind'], result['object_id'])
+        for result in response.json()['results']
+    ] == [(search.PROFILE, user.profile.pk)]
+    assert response.json()['next'] is None
+
+
+def test_old_sqlite_is_reported(mocker):
+    mocker.patch.object(checks.sqlite3, 'sqlite_version_info', (3, 31, 1))
+    errors = checks.check_sqlite_version(None)
+    assert [error.id for error in errors] == ['authentication.E002']
+
+    mocker.patch.object(checks.sqlite3, 'sqlite_version_info', (3, 34, 0))
+    assert checks.check_sqlite_version(None) == []
@@ -0,0 +1,144 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+
+from authentication import signing
+
+PAYLOAD = {'user_id': 1, 'token_type': 'access'}
+
+
+def write_key(path, key, private: bool = True) -> str:
+    if private:
+        data = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption())
+    else:
+        data = key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def keys(tmp_path):
+    """
+    Paths of a new Ed25519 key, an old RSA key and its public part
+    """
+    old = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return {
+        'new': write_key(
+            tmp_path / 'new.pem', ed25519.Ed25519PrivateKey.generate()),
+        'old': write_key(tmp_path / 'old.pem', old),
+        'old_public': write_key(tmp_path / 'old.pub', old, private=False),
+    }
+
+
+@pytest.fixture
+def key_ring(settings, monkeypatch):
+    """
+    Sets `JWT_KEYS` and drops the backend and key set built from them
+    """
+    def set_keys(*paths):
+        settings.JWT_KEYS = list(paths)
+        monkeypatch.setattr(signing, 'token_backend', None)
+        monkeypatch.setattr(signing, '_jwks_document', None)
+        return signing.get_token_backend()
+    return set_keys
+
+
+def get_backend(*paths, **kwargs):
+    return signing.KeyRingTokenBackend(
+        [signing.SigningKey(signing.load_key(path)) for path in paths],
+        **kwargs)
+
+
+def test_signs_with_first_key(keys):
+    backend = get_backend(keys['new'], keys['old'])
+    token = backend.encode(PAYLOAD)
+
+    header = jwt.get_unverified_header(token)
+    assert header['kid'] == backend.signing_key.kid
+    assert header['alg'] == 'EdDSA'
+    assert backend.decode(token) == PAYLOAD
+
+    # Each key has its own thumbprint
+    assert len(backend.keys) == 2
+
+
+def test_verifies_with_retired_key(keys):
+    token = get_backend(keys['old']).encode(PAYLOAD)
+    assert jwt.get_unverified_header(token)['alg'] == 'RS256'
+
+    # Rotated, the old key only verifies, from its public part
+    assert get_backend(keys['new'], keys['old_public']).decode(
+        token) == PAYLOAD
+    with pytest.raises(TokenBackendError):
+        get_backend(keys['new']).decode(token)
+
+    with pytest.raises(ImproperlyConfigured):
+        get_backend(keys['old_public'], keys['new'])
+
+
+def test_rejects_forged_headers(keys, settings):
+    backend = get_backend(keys['old'])
+    kid = backend.signing_key.kid
+
+    # The algorithm is pinned by the key named in the header
+    forged = jwt.encode(
+        PAYLOAD, 'public key as secret', algorithm='HS256',
+        headers={'kid': kid})
+    with pytest.raises(TokenBackendError):
+        backend.decode(forged)
+
+    with pytest.raises(TokenBackendError):
+        backend.decode('not a token')
+
+    legacy = TokenBackend('HS256', settings.SECRET_KEY).encode(PAYLOAD)
+    with pytest.raises(TokenBackendError):
+        backend.decode(legacy)
+    assert get_backend(keys['old'], accept_hs256=True).decode(
+        legacy) == PAYLOAD
+
+
+def test_tokens_use_configured_keys(keys, key_ring):
+    backend = key_ring(keys['new'], keys['old'])
+    assert isinstance(backend, signing.KeyRingTokenBackend)
+
+    access = str(signing.AccessToken())
+    assert jwt.get_unverified_header(access)['kid'] == (
+        backend.signing_key.kid)
+    assert signing.AccessToken(access)['token_type'] == 'access'
+
+
+def test_jwks(client, keys, key_ring):
+    url = reverse('jwks')
+    backend = key_ring(keys['new'], keys['old'])
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response['Cache-Control'] == 'public, max-age=3600'
+    jwks = response.json()['keys']
+    assert [key['kid'] for key in jwks] == list(backend.keys)
+    assert [key['alg'] for key in jwks] == ['EdDSA', 'RS256']
+    assert all('d' not in key for key in jwks)
+
+    etag = response['ETag']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # The old key is dropped once its tokens expired
+    key_ring(keys['new'])
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert len(response.json()['keys']) == 1
+
+
+def test_jwks_without_keys(client, key_ring):
+    key_ring()
+    assert client.get(reverse('jwks')).json() == {'keys': []}
@@ -0,0 +1,119 @@
+import re
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from utils.base.general import get_tokens_for_user
+from utils.base.sms import (LocalSMSProvider, SMSDispatcher, SMSError,
+                            get_provider)
+
+from authentication import phones
+from authentication.models import Phone, User
+
+
+class FlakyProvider(LocalSMSProvider):
+    """
+    Local provider raising the given errors before sending
+    """
+    name = 'flaky'
+
+    def __init__(self, *errors):
+        super().__init__()
+        self.errors = list(errors)
+
+    def send(self, to, body):
+        if self.errors:
+            raise self.errors.pop(0)
+        super().send(to, body)
+
+
+def test_send_retries():
+    provider = FlakyProvider(SMSError('timeout'), SMSError('timeout'))
+    results = []
+    future = SMSDispatcher().send(
+        '+2348031234567', 'hello', results.append, provider)
+
+    assert future.result() == {
+        'to': '+2348031234567', 'sent': True, 'attempts': 3, 'error': ''}
+    assert results == [future.result()]
+    assert list(provider.outbox) == [
+        {'to': '+2348031234567', 'body': 'hello'}]
+
+
+def test_send_gives_up(settings):
+    settings.SMS_MAX_ATTEMPTS = 2
+    provider = FlakyProvider(*[SMSError('timeout')] * 3)
+    result = SMSDispatcher().send('+2348031234567', 'hello',
+                                  provider=provider).result()
+    assert result['sent'] is False
+    assert result['attempts'] == 2
+    assert not provider.outbox
+
+
+def test_send_non_retryable_error():
+    provider = FlakyProvider(SMSError('invalid number', retryable=False))
+    result = SMSDispatcher().send('+2348031234567', 'hello',
+                                  provider=provider).result()
+    assert result == {'to': '+2348031234567', 'sent': False,
+                      'attempts': 1, 'error': 'invalid number'}
+
+
+def test_callback_error_keeps_result():
+    def callback(result):
+        raise ValueError('callback failed')
+
+    result = SMSDispatcher().send(
+        '+2348031234567', 'hello', callback, LocalSMSProvider()).result()
+    assert result['sent'] is True
+
+
+def test_provider_required(settings):
+    settings.SMS_PROVIDER = ''
+    with pytest.raises(ImproperlyConfigured):
+        get_provider()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_verify_phone(client, mocker):
+    user = User.objects.create_user(
+        'ada@example.com', 'pw', profile={'fullname': 'Ada'})
+    phone = Phone.objects.create(
+        profile=user.profile, phoneno='+2348031234567')
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    url = reverse('auth:verify-phone')
+    send_many = mocker.spy(phones.dispatcher, 'send_many')
+
+    response = client.post(url, {'phone': phone.pk}, format='json')
+    assert response.status_code == 202
+    assert response.json()['sms_status'] == Phone.SMS_QUEUED
+
+    [future] = send_many.spy_return
+    assert future.result()['sent'] is True
+    phone.refresh_from_db()
+    assert (phone.sms_status, phone.sms_attempts) == (Phone.SMS_SENT, 1)
+
+    message = get_provider().outbox[-1]
+    assert message['to'] == '+2348031234567'
+    otp = re.search(r'\d{6}', message['body']).group()
+
+    response = client.post(url, {'phone': phone.pk, 'otp': otp},
+                           format='json')
+    assert response.status_code == 200
+    phone.refresh_from_db()
+    assert phone.verified is True
+
+
+@pytest.mark.django_db
+def test_verify_phone_of_another_user(client):
+    user, other = (
+        User.objects.create_user(
+            f'{name}@example.com', 'pw', profile={'fullname': name})
+        for name in ('ada', 'bob'))
+    phone = Phone.objects.create(
+        profile=other.profile, phoneno='+2348031234567')
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    response = client.post(
+        reverse('auth:verify-phone'), {'phone': phone.pk}, format='json')
+    assert response.status_code == 400
@@ -0,0 +1,40 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+# Loaded on the first authenticated request or SMS, not by a new worker
+LAZY_MODULES = ('jwt', 'rest_framework_simplejwt', 'twilio')
+
+SETUP_SCRIPT = (
+    'import django, json, sys; django.setup(); '
+    f'print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'
+)
+
+
+@pytest.fixture
+def base_dir(monkeypatch):
+    # The fresh interpreters import the project from the working directory
+    monkeypatch.chdir(settings.BASE_DIR)
+
+
+def test_setup_skips_lazy_modules(base_dir):
+    result = subprocess.run(
+        [sys.executable, '-c', SETUP_SCRIPT], capture_output=True,
+        text=True, env=os.environ.copy(), check=True)
+    assert json.loads(result.stdout) == []
+
+
+@pytest.mark.skipif(
+    not os.environ.get('STARTUP_BENCHMARK'),
+    reason='Wall clock budgets, set STARTUP_BENCHMARK to run it')
+def test_startup_within_budget(base_dir):
+    # Fails with a CommandError over STARTUP_IMPORT_BUDGET or
+    # STARTUP_FIRST_RESPONSE_BUDGET
+    call_command('benchmark_startup', runs=3, check=True,
+                 stdout=io.StringIO())
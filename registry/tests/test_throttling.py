@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.urls import reverse
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+from utils.base import throttling
+
+
+@pytest.fixture
+def limiter():
+    return throttling.SlidingWindowLimiter()
+
+
+@pytest.fixture
+def rates(mocker):
+    """
+    Low login rates, the email limit is reached first
+    """
+    return mocker.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {
+        'login_ip': '3/min', 'login_email': '1/min', 'login_global': '100/min',
+    })
+
+
+def test_sliding_window(limiter):
+    assert limiter.hit('a', 2, 60, now=0)
+    assert limiter.hit('a', 2, 60, now=30)
+    assert not limiter.hit('a', 2, 60, now=59)
+
+    # Half of the previous window still counts
+    assert limiter.hit('a', 2, 60, now=90)
+    assert not limiter.hit('a', 2, 60, now=90)
+    assert limiter.hit('a', 2, 60, now=150)
+
+
+def test_rejected_request_counts_nowhere(limiter):
+    limits = [('a', 1, 60), ('b', 5, 60)]
+    assert limiter.hit_many(limits, now=0) == [True, True]
+    assert limiter.hit_many(limits, now=1) == [False, True]
+
+    current, _ = limiter.get_keys('b', 60, 1)
+    assert caches['default'].get(current) == 1
+
+
+def test_email_identity_is_hashed():
+    factory = APIRequestFactory()
+    throttle = throttling.EmailThrottle()
+
+    identities = {
+        throttle.get_identity(
+            mock.Mock(data={'email': email}), None)
+        for email in ('Ada@Example.com', ' ada@example.com ')
+    }
+    identity, = identities
+    assert len(identity) == 128
+    assert 'ada' not in identity
+
+    long_email = f'{"a" * 10000}@example.com'
+    assert len(throttle.get_identity(
+        mock.Mock(data={'email': long_email}), None)) == 128
+    assert throttle.get_identity(
+        factory.post('/', {'email': ['a']}), None) is None
+
+
+@pytest.mark.django_db
+def test_login_throttles(client, rates):
+    url = reverse('auth:login')
+
+    def login(email: str):
+        return client.post(
+            url, {'email': email, 'password': 'pw'}, format='json')
+
+    assert login('ada@example.com').status_code != 429
+    response = login('ada@example.com')
+    assert response.status_code == 429
+    assert 0 < int(response['Retry-After']) <= 60
+
+    # The rejected request was not counted by the ip limit
+    assert login('bob@example.com').status_code != 429
+    assert login('eve@example.com').status_code != 429
+    assert login('joe@example.com').status_code == 429
+
+
+def test_redis_script(limiter, mocker):
+    cache = RedisCache('redis://localhost:6379', {})
+    mocker.patch.object(
+        throttling.SlidingWindowLimiter, 'cache',
+        new_callable=mock.PropertyMock, return_value=cache)
+    client = mock.Mock()
+    client.register_script.return_value.return_value = [1, 0]
+    mocker.patch.object(cache._cache, 'get_client', return_value=client)
+
+    limits = [('a', 1, 60), ('b', 5, 10)]
+    assert limiter.hit_many(limits, now=15) == [True, False]
+    assert limiter.hit_many(limits, now=15) == [True, False]
+
+    client.register_script.assert_called_once_with(
+        throttling.SLIDING_WINDOW_SCRIPT)
+    script = client.register_script.return_value
+    script.assert_called_with(
+        keys=[
+            cache.make_key('throttle:a:0'), cache.make_key('throttle:a:-1'),
+            cache.make_key('throttle:b:1'), cache.make_key('throttle:b:0'),
+        ],
+        args=[0.75, 1, 120, 0.5, 5, 20],
+        client=client,
+    )
@@ -0,0 +1,54 @@
+import pytest
+from django.urls import reverse
+from utils.base.general import get_tokens_for_user
+
+from authentication.models import User
+
+
+@pytest.fixture
+def tokens(db):
+    """
+    Tokens of an active and an inactive user, and an invalid one
+    """
+    active = User.objects.create_user(
+        'ada@example.com', 'pw', profile={'fullname': 'Ada'})
+    inactive = User.objects.create_user(
+        'bob@example.com', 'pw', profile={'fullname': 'Bob'})
+    tokens = [
+        get_tokens_for_user(active)['access'],
+        get_tokens_for_user(inactive)['access'],
+        'invalid',
+    ]
+    User.objects.filter(pk=inactive.pk).update(active=False)
+    return active, tokens
+
+
+@pytest.mark.parametrize('name', [
+    'auth:token_validate', 'auth:token_validate_async'])
+def test_token_validate(client, tokens, name):
+    user, (token, *_) = tokens
+    response = client.post(reverse(name), {'token': token}, format='json')
+    assert response.status_code == 200
+    assert response.json()['email'] == user.email
+
+
+@pytest.mark.parametrize('name', [
+    'auth:token_validate_batch', 'auth:token_validate_batch_async'])
+def test_token_validate_batch(client, tokens, name):
+    user, raw_tokens = tokens
+    response = client.post(
+        reverse(name), {'tokens': raw_tokens}, format='json')
+    assert response.status_code == 200
+    results = response.json()
+    assert [result['valid'] for result in results] == [True, False, False]
+    assert results[0]['user']['email'] == user.email
+    assert results[1]['detail'] == 'User not found or inactive'
+
+
+@pytest.mark.parametrize('name', [
+    'auth:user-detail', 'auth:user-detail_async'])
+def test_user_detail(client, tokens, name):
+    user, (token, *_) = tokens
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    response = client.get(reverse(name))
+    assert response.status_code == 200
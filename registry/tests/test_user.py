@@ -0,0 +1,97 @@
+import pytest
+from django.urls import reverse
+from utils.base.general import get_tokens_for_user
+
+from authentication.cache import (get_cached_user, invalidate_user,
+                                  set_cached_user)
+from authentication.models import Partner, Phone, Relationship, User
+
+
+def make_user(count: int) -> User:
+    """
+    User with `count` phones and relationships
+    """
+    user = User.objects.create_user(
+        f'user{count}@example.com', 'pw', profile={'fullname': 'Ada'})
+    partner = Partner.objects.create(profile=user.profile)
+    for i in range(count):
+        Phone.objects.create(
+            profile=user.profile, phoneno=f'+23480312345{count}{i}')
+        other = Partner.objects.create(
+            profile=User.objects.create_user(
+                f'partner{count}-{i}@example.com', 'pw',
+                profile={'fullname': f'Partner {i}'}).profile)
+        relationship = Relationship.objects.create()
+        relationship.partners.add(partner, other)
+    return user
+
+
+def get_query_count(client, user, django_assert_max_num_queries) -> int:
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    with django_assert_max_num_queries(5) as captured:
+        response = client.get(reverse('auth:user-detail'))
+    assert response.status_code == 200
+    return len(captured.captured_queries)
+
+
+@pytest.mark.django_db
+def test_user_detail_queries_dont_grow(
+        client, django_assert_max_num_queries):
+    # 4 queries for the details and 1 for the user, the cache is empty
+    counts = [
+        get_query_count(client, make_user(count),
+                        django_assert_max_num_queries)
+        for count in (1, 5)
+    ]
+    assert counts == [5, 5]
+
+
+@pytest.mark.django_db
+def test_authentication_cached(client, django_assert_num_queries):
+    user = make_user(1)
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {get_tokens_for_user(user)["access"]}')
+    url = reverse('auth:change_password')
+
+    # A request only authenticating the user, whose password check fails
+    data = {'old_password': 'wrong', 'new_password': 'N3w-passw0rd!'}
+    with django_assert_num_queries(1):
+        assert client.patch(url, data, format='json').status_code == 400
+    with django_assert_num_queries(0):
+        assert client.patch(url, data, format='json').status_code == 400
+
+    invalidate_user(user.pk)
+    with django_assert_num_queries(1):
+        assert client.patch(url, data, format='json').status_code == 400
+
+
+@pytest.mark.django_db
+def test_cached_user_values(django_assert_num_queries):
+    user = make_user(1)
+    User.objects.get_active(user.pk)
+    data = get_cached_user(user.pk)
+    assert data['user']['email'] == user.email
+    assert data['profile']['fullname'] == 'Ada'
+
+    with django_assert_num_queries(0):
+        cached = User.objects.get_active(user.pk)
+        assert cached.email == user.email
+        assert cached.profile.fullname == 'Ada'
+        assert cached.check_password('pw')
+
+
+@pytest.mark.django_db
+def test_cached_user_of_another_deploy(django_assert_num_queries):
+    user = make_user(1)
+    data = User.objects.to_cache(user)
+    # A field since removed, and one added since
+    data['user']['nickname'] = 'ada'
+    del data['user']['verified_email']
+    set_cached_user(user.pk, data)
+
+    with django_assert_num_queries(0):
+        cached = User.objects.get_active(user.pk)
+        assert cached.email == user.email
+    with django_assert_num_queries(1):
+        assert cached.verified_email is False
@@ -0,0 +1,70 @@
+"""
+Backfills fill new columns on large tables in small batches, walking
+the primary key so every batch is a short indexed range scan.
+Register them with `register` and run them with `manage.py backfill`.
+"""
+from django.db import transaction
+
+registry = {}
+
+
+def register(cls):
+    registry[cls.name] = cls
+    return cls
+
+
+class Backfill:
+    """Base backfill.
+
+    Subclasses set the `model`, the updated `fields` and
+    implement `process`. Backfills writing other tables override
+    `run_batch` and say what they fill in `description`.
+    """
+    name: str = None
+    model = None
+    fields: list = None
+    description: str = None
+    batch_size: int = 1000
+
+    def describe(self) -> str:
+        return self.description or ', '.join(self.fields)
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def process(self, obj) -> bool:
+        """Update `obj` in place
+
+        :return: True if `obj` changed and must be saved
+        :rtype: bool
+        """
+        raise NotImplementedError('.process() must be overridden')
+
+    def after_update(self, changed: list):
+        """
+        Called in the transaction of a batch with the updated rows,
+        bulk updates send no signals
+        """
+
+    def run_batch(self, after_pk, batch_size: int = None):
+        """Process the rows following `after_pk`
+
+        :return: last primary key seen (None when done), rows scanned
+            and rows updated
+        :rtype: tuple
+        """
+        rows = list(
+            self.get_queryset()
+            .filter(pk__gt=after_pk)
+            .order_by('pk')[:batch_size or self.batch_size]
+        )
+        if not rows:
+            return None, 0, 0
+
+        changed = [obj for obj in rows if self.process(obj)]
+        if changed:
+            with transaction.atomic():
+                self.model._default_manager.bulk_update(changed, self.fields)
+                self.after_update(changed)
+
+        return rows[-1].pk, len(rows), len(changed)
@@ -0,0 +1,45 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives.
+
+    Lookups don't take the lock, only additions do.
+
+    :param capacity: number of items the filter is sized for
+    :type capacity: int
+    :param error_rate: false positive rate at capacity
+    :type error_rate: float
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def get_positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        # Double hashing, k positions from two 64 bit hashes
+        return [
+            (first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        positions = self.get_positions(item)
+        with self._lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self.get_positions(item))
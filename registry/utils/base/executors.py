@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when a bounded executor has no room left in its queue
+    """
+
+
+class BoundedExecutor:
+    """Thread pool with a limited number of queued tasks.
+
+    Submitting to a full executor raises `ExecutorBusy` right away
+    instead of queueing without limit, so callers can shed load.
+
+    :param max_workers: number of threads running tasks
+    :type max_workers: int
+    :param queue_size: number of tasks allowed to wait for a thread
+    :type queue_size: int
+    :param name: prefix of the thread names
+    :type name: str
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, name: str = ''):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.name = name
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_size
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=self.name)
+        return self._executor
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self.pending >= self.capacity:
+                raise ExecutorBusy(f'{self.name} executor is full')
+            self.pending += 1
+
+        try:
+            future = self.get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run `fn` in the executor and wait for it without blocking
+        the event loop
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
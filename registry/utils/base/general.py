@@ -2,37 +2,23 @@
 Utilities for projects
 """
 import logging
-import random
+import secrets
 
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from rest_framework_simplejwt.tokens import RefreshToken
-from twilio.rest import Client
+from utils.base.metrics import timed
+from utils.base.sms import get_provider
 
 # Create the logger and set the logging level
 logger = logging.getLogger('basic')
 err_logger = logging.getLogger('basic.error')
 
 
-twilioClient: Client = None
-
-
 def send_sms(message, phone):
-
-    global twilioClient
-
-    if twilioClient is None:
-        twilioClient = Client(settings.TWILIO_ACCOUNT_SID,
-                              settings.TWILIO_AUTH_TOKEN)
-
+    """
+    Send an sms with the configured provider, blocking until it is sent
+    """
     try:
-        message = twilioClient.messages \
-            .create(
-                body=message,
-                from_='+1 864 732 4819',
-                to=phone
-            )
+        get_provider().send(phone, message)
         logger.debug(f'Sent sms to {phone}')
         return True
     except Exception as e:
@@ -60,6 +46,10 @@ def get_tokens_for_user(user):
     """
     Get the tokens for user
     """
+    # simplejwt and the signing keys load on first use, the validators
+    # import this module in every process
+    from authentication.signing import RefreshToken
+
     refresh = RefreshToken.for_user(user)
     return {
         'refresh': str(refresh),
@@ -73,10 +63,13 @@ def generate_email_message(
     """
     Generate email message
     """
+    from django.template.loader import render_to_string
+
     if context is None:
         context = {}
 
-    return render_to_string(template, context, request)
+    with timed('email'):
+        return render_to_string(template, context, request)
 
 
 def send_email(email, subject, message, fail=True):
@@ -89,9 +82,11 @@ def send_email(email, subject, message, fail=True):
     if settings.OFF_EMAIL:
         return True
 
+    from django.core.mail import send_mail
+
     val = send_mail(
         subject=subject, message=message,
-        html_message=message, rom_email=settings.DEFAULT_FROM_EMAIL,
+        html_message=message, from_email=settings.DEFAULT_FROM_EMAIL,
         recipient_list=[email], fail_silently=fail)
 
     return True if val else False
@@ -101,4 +96,4 @@ def generate_otp():
     """
     Generate a new otp
     """
-    return random.randint(100000, 999999)
+    return 100000 + secrets.randbelow(900000)
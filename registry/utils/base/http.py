@@ -0,0 +1,31 @@
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified
+
+
+def get_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_response(request, body: bytes, cache_control: str,
+                  content_type: str = 'application/json') -> HttpResponse:
+    """Response with an ETag of its body, a 304 without the body when
+    the client sent the same ETag in If-None-Match
+
+    :param cache_control: Cache-Control header, e.g. `max-age=60`
+    :type cache_control: str
+    """
+    etag = get_etag(body)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def json_etag_response(request, data, cache_control: str) -> HttpResponse:
+    body = json.dumps(data, separators=(',', ':')).encode()
+    return etag_response(request, body, cache_control)
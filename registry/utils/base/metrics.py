@@ -0,0 +1,324 @@
+"""
+Per request instrumentation, exported in the Prometheus text format.
+
+`MetricsMiddleware` keeps the stats of the current request in a
+context variable, which `sync_to_async` threads share. Database time
+comes from an execute wrapper added to every connection, hashing and
+email rendering time from `timed`.
+
+Metrics are sharded per thread, so recording never takes a lock,
+the shards are only merged when `/metrics` is scraped.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+DURATION_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestMetrics:
+    __slots__ = (
+        'queries', 'db_time', 'cache_hits', 'cache_misses', 'timings')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {}
+
+
+current: contextvars.ContextVar = contextvars.ContextVar(
+    'request_metrics', default=None)
+
+
+@contextmanager
+def timed(name: str):
+    """Add the time spent in the block to the current request
+
+    :param name: timing name, e.g. `hash` or `email`
+    :type name: str
+    """
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] = (
+            metrics.timings.get(name, 0.0) + time.perf_counter() - start)
+
+
+def record_cache(hits: int = 0, misses: int = 0):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def time_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+def escape(value) -> str:
+    return (
+        str(value).replace('\\', '\\\\')
+        .replace('"', '\\"').replace('\n', '\\n'))
+
+
+class Metric:
+    """
+    Base of the per thread sharded metrics
+    """
+    type: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def get_shard(self) -> dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # Only taken once per thread
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def format_labels(self, labels, **extra) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra.items())
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join(
+            f'{name}="{escape(value)}"' for name, value in pairs)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        yield from self.render_samples()
+
+    def render_samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels: tuple, amount: float = 1):
+        shard = self.get_shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self) -> dict:
+        totals = {}
+        for shard in list(self._shards):
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render_samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f'{self.name}{self.format_labels(labels)} {value}'
+
+
+class Histogram(Metric):
+    """
+    Each series is a list of bucket counts, the +Inf count and the sum
+    """
+    type = 'histogram'
+
+    def __init__(self, *args, buckets=DURATION_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: tuple, value: float):
+        shard = self.get_shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self) -> dict:
+        totals = {}
+        for shard in list(self._shards):
+            for labels, series in list(shard.items()):
+                total = totals.setdefault(labels, [0] * len(series))
+                for i, value in enumerate(list(series)):
+                    total[i] += value
+        return totals
+
+    def render_samples(self):
+        for labels, series in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket'
+                    f'{self.format_labels(labels, le=bound)} {cumulative}')
+            yield f'{self.name}_sum{self.format_labels(labels)} {series[-1]}'
+            yield (
+                f'{self.name}_count{self.format_labels(labels)} '
+                f'{cumulative}')
+
+
+REQUESTS = Counter(
+    'http_requests_total', 'Requests by view, method and status.',
+    ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Wall time of requests by view.',
+    ('view', 'method'))
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Database queries per request by view.',
+    ('view',), buckets=COUNT_BUCKETS)
+DB_DURATION = Histogram(
+    'db_query_duration_seconds', 'Database time per request by view.',
+    ('view',))
+CACHE_REQUESTS = Counter(
+    'user_cache_requests_total', 'User cache lookups by view and result.',
+    ('view', 'result'))
+TIMINGS = {
+    'hash': Histogram(
+        'password_hash_duration_seconds',
+        'Password hashing time per request by view.', ('view',)),
+    'email': Histogram(
+        'email_render_duration_seconds',
+        'Email rendering time per request by view.', ('view',)),
+}
+
+METRICS = (
+    REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, CACHE_REQUESTS,
+    *TIMINGS.values())
+
+
+def render_metrics() -> str:
+    return '\n'.join(
+        line for metric in METRICS for line in metric.render()) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Record per view metrics and send them in a Server-Timing header.
+    Put it first in `MIDDLEWARE` so the wall time covers the others.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, start)
+
+    def get_view_name(self, request) -> str:
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name
+
+    def record(self, request, response, metrics: RequestMetrics, start):
+        duration = time.perf_counter() - start
+        view = self.get_view_name(request)
+
+        REQUESTS.inc((view, request.method, str(response.status_code)))
+        REQUEST_DURATION.observe((view, request.method), duration)
+        DB_QUERIES.observe((view,), metrics.queries)
+        DB_DURATION.observe((view,), metrics.db_time)
+        if metrics.cache_hits:
+            CACHE_REQUESTS.inc((view, 'hit'), metrics.cache_hits)
+        if metrics.cache_misses:
+            CACHE_REQUESTS.inc((view, 'miss'), metrics.cache_misses)
+        for name, seconds in metrics.timings.items():
+            if name in TIMINGS:
+                TIMINGS[name].observe((view,), seconds)
+
+        response['Server-Timing'] = self.get_server_timing(metrics, duration)
+        return response
+
+    def get_server_timing(self, metrics: RequestMetrics, duration) -> str:
+        entries = [
+            f'total;dur={duration * 1000:.2f}',
+            f'db;dur={metrics.db_time * 1000:.2f};'
+            f'desc="{metrics.queries} queries"',
+        ]
+        if metrics.cache_hits or metrics.cache_misses:
+            entries.append(
+                f'cache;desc="{metrics.cache_hits} hits '
+                f'{metrics.cache_misses} misses"')
+        entries.extend(
+            f'{name};dur={seconds * 1000:.2f}'
+            for name, seconds in metrics.timings.items())
+        return ', '.join(entries)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, protected by `METRICS_TOKEN`. Without a
+    token it is only served in DEBUG
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        raise Http404
+    if token and not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
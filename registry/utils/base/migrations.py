@@ -0,0 +1,129 @@
+"""
+Migration operations that do not lock large tables on PostgreSQL and
+fall back to the regular operations on other databases (SQLite in dev).
+"""
+from django.db import migrations
+
+
+class NotInTransactionMixin:
+    def ensure_not_in_transaction(self, schema_editor):
+        if schema_editor.connection.in_atomic_block:
+            raise RuntimeError(
+                'Concurrent index operations can not run in a transaction, '
+                'set `atomic = False` on the migration.')
+
+
+class AddIndexConcurrently(NotInTransactionMixin, migrations.AddIndex):
+    """
+    Create the index with CREATE INDEX CONCURRENTLY on PostgreSQL,
+    writes to the table are not blocked while it is built.
+    """
+    atomic = False
+
+    def describe(self):
+        return 'Concurrently create index %s on model %s' % (
+            self.index.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class RemoveIndexConcurrently(NotInTransactionMixin, migrations.RemoveIndex):
+    """
+    Drop the index with DROP INDEX CONCURRENTLY on PostgreSQL
+    """
+    atomic = False
+
+    def describe(self):
+        return 'Concurrently remove index %s from %s' % (
+            self.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            from_model_state = from_state.models[
+                app_label, self.model_name_lower]
+            index = from_model_state.get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            to_model_state = to_state.models[
+                app_label, self.model_name_lower]
+            index = to_model_state.get_index_by_name(self.name)
+            schema_editor.add_index(model, index, concurrently=True)
+
+
+class AddConstraintConcurrently(
+    NotInTransactionMixin, migrations.AddConstraint
+):
+    """
+    Create a unique constraint on expressions, which PostgreSQL keeps as
+    a unique index, with CREATE UNIQUE INDEX CONCURRENTLY. A build that
+    fails on duplicate rows leaves an invalid index to drop by hand.
+    """
+    atomic = False
+
+    def describe(self):
+        return 'Concurrently create constraint %s on model %s' % (
+            self.constraint.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        if not getattr(self.constraint, 'contains_expressions', False):
+            raise ValueError(
+                'Only constraints on expressions are created as an index')
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            sql = str(self.constraint.create_sql(model, schema_editor))
+            schema_editor.execute(sql.replace(
+                'CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+        self.ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % (
+                schema_editor.quote_name(self.constraint.name)))
@@ -1,4 +1,17 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from collections import OrderedDict
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_SALT = 'utils.base.pagination.cursor'
 
 
 class CustomPagination(PageNumberPagination):
@@ -11,3 +24,236 @@ class CustomPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the PostgreSQL planner estimate as the count of
+    large unfiltered tables, instead of a full `COUNT(*)` scan.
+    Filtered querysets and small tables are counted exactly.
+
+    :param Paginator: django base Paginator
+    :type Paginator: django.core.paginator.Paginator
+    """
+    estimate_threshold = 100000
+
+    def get_estimate(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or queryset.query.where:
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is not None and estimate >= self.estimate_threshold:
+            return estimate
+        return super().count
+
+
+def estimate_count(queryset):
+    """
+    Number of rows of a queryset estimated by the PostgreSQL planner,
+    None on other databases
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def encode_cursor(position, salt: str = CURSOR_SALT) -> str:
+    """Signed cursor of a keyset position, clients can't forge one
+
+    :param position: json serializable values of the last row
+    :param salt: namespace of the cursor, e.g. the endpoint
+    :type salt: str
+    """
+    return signing.dumps(position, salt=salt, compress=True)
+
+
+def decode_cursor(cursor: str, salt: str = CURSOR_SALT):
+    """
+    Position of a cursor made by `encode_cursor`, raises NotFound when
+    it is invalid
+    """
+    try:
+        return signing.loads(cursor, salt=salt)
+    except signing.BadSignature:
+        raise NotFound('Invalid cursor')
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Pages of `ordering`, newest `(created, id)` first by default, read
+    from the index without `COUNT(*)` or `OFFSET`, so deep pages cost
+    the same as the first one.
+
+    Cursors are the signed values of the first or last row of a page.
+    Views change the order with `keyset_ordering`, its last field must
+    be unique. Models without `created` are paged by primary key.
+    `?count=estimate` adds `estimated_total`, the planner estimate on
+    PostgreSQL and null elsewhere.
+
+    :param CursorPagination: resframework base CursorPagination
+    :type CursorPagination: rest_framework.pagination.CursorPagination
+    """
+    ordering = ('-created', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+
+    def get_ordering(self, request, queryset, view) -> tuple:
+        ordering = getattr(view, 'keyset_ordering', None) or self.ordering
+        names = {field.name for field in queryset.model._meta.get_fields()}
+        if all(name.lstrip('-') in names | {'pk'} for name in ordering):
+            return tuple(ordering)
+        return ('-pk',)
+
+    def get_field(self, model, name: str):
+        name = name.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def get_salt(self, request) -> str:
+        return f'{CURSOR_SALT}:{request.path}:{",".join(self.ordering)}'
+
+    def get_position(self, request, model):
+        """
+        Values of the cursor row and whether the page is before it,
+        raises NotFound for invalid cursors
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        position = decode_cursor(cursor, self.get_salt(request))
+        try:
+            values = [
+                self.get_field(model, name).to_python(value)
+                for name, value in zip(self.ordering, position['v'])
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(position.get('r'))
+
+    def get_keyset_filter(self, ordering, values) -> Q:
+        """
+        Rows after `values` in `ordering`, e.g. `created < c OR
+        (created = c AND id < i)` for `('-created', '-id')`
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.estimated_total = None
+        self.show_estimate = (
+            request.query_params.get(self.count_query_param) == 'estimate')
+        if self.show_estimate:
+            self.estimated_total = estimate_count(queryset)
+
+        values, reverse = self.get_position(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = values is not None if not reverse else has_more
+        return self.page
+
+    def get_cursor_link(self, row, reverse: bool = False):
+        values = [
+            self.get_field(row, name).value_to_string(row)
+            for name in self.ordering
+        ]
+        position = {'v': values}
+        if reverse:
+            position['r'] = 1
+        cursor = encode_cursor(position, self.get_salt(self.request))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Went back past the first row
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.get_cursor_link(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_cursor_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        content = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ]
+        if self.show_estimate:
+            content.append(('estimated_total', self.estimated_total))
+        content.append(('results', data))
+        return Response(OrderedDict(content))
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['estimated_total'] = {
+            'type': 'integer',
+            'nullable': True,
+        }
+        return response
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': '`estimate` adds the approximate total',
+            'schema': {'type': 'string', 'enum': ['estimate']},
+        })
+        return parameters
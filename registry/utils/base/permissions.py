@@ -7,8 +7,8 @@ def set_user(request):
     # Check if the user is a Token user and set user to request
     if isinstance(request.user, TokenUser):
         try:
-            # Get the user object from the database and must be active
-            user = User.objects.get(id=request.user.id, active=True)
+            # Get the active user from the user cache or the database
+            user = User.objects.get_active(request.user.id)
             request.user = user
         except User.DoesNotExist:
             raise Exception('Not a authenticated')
@@ -18,3 +18,9 @@ class IsAuthenticated(IsAuthenticatedBase):
     def has_permission(self, request, view):
         set_user(request)
         return super().has_permission(request, view)
+
+
+class IsStaff(IsAuthenticated):
+    def has_permission(self, request, view):
+        return (
+            super().has_permission(request, view) and request.user.is_staff)
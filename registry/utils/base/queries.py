@@ -0,0 +1,46 @@
+import threading
+
+from django.conf import settings
+from django.db import connection
+from utils.base.logger import err_logger
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries it sees, it can be
+    installed on the connections of several threads
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    Report query count regressions of a view.
+
+    When `QUERY_BUDGETS` is enabled, a request running more than
+    `query_budget` queries is logged. The response is left alone, its
+    work is already done; the exact counts are asserted in `tests`.
+    """
+    query_budget: int = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.query_budget is None or not settings.QUERY_BUDGETS:
+            return super().dispatch(request, *args, **kwargs)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+
+        if counter.count > self.query_budget:
+            err_logger.warning(
+                f'{self.__class__.__name__} ran {counter.count} queries, '
+                f'the budget is {self.query_budget}')
+        return response
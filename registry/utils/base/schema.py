@@ -0,0 +1,175 @@
+"""
+OpenAPI schema generated once with `manage.py generate_openapi`, at
+deploy time, and served from the files it writes. drf_yasg then never
+introspects the views on a request, outside of DEBUG.
+
+Every format is written with gzip and, when the `brotli` package is
+installed, brotli compressed variants. Each variant has a strong ETag
+of its bytes and is cached by clients for `OPENAPI_SCHEMA_MAX_AGE`.
+"""
+import functools
+import gzip
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from drf_yasg import openapi
+from drf_yasg.app_settings import swagger_settings
+
+from .http import etag_response
+from .logger import err_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+# File extensions of the compressed variants, preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def get_path(fmt: str, encoding: str = None) -> str:
+    name = f'schema.{fmt}{ENCODINGS[encoding] if encoding else ""}'
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, name)
+
+
+def generate(public: bool = True):
+    """
+    Schema of every endpoint, like the drf_yasg views build it
+    """
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(
+        info=swagger_settings.DEFAULT_INFO,
+        url=swagger_settings.DEFAULT_API_URL)
+    return generator.get_schema(request=None, public=public)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # No mtime in the header, the same schema gives the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write(schema) -> list:
+    """Write the schema in every format with its compressed variants
+
+    :return: paths of the written files
+    :rtype: list
+    """
+    # Loads ruamel.yaml, only the command needs it
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    encodings = [e for e in ENCODINGS if e != 'br' or brotli is not None]
+
+    paths = []
+    codecs = {'json': OpenAPICodecJson, 'yaml': OpenAPICodecYaml}
+    for fmt, codec_class in codecs.items():
+        data = codec_class(validators=[]).encode(schema)
+        variants = {None: data}
+        variants.update(
+            {encoding: compress(data, encoding) for encoding in encodings})
+        for encoding, body in variants.items():
+            path = get_path(fmt, encoding)
+            # Replaced atomically, workers may be serving the old file
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(body)
+            os.replace(f'{path}.tmp', path)
+            paths.append(path)
+    return paths
+
+
+def get_accepted_encodings(request) -> set:
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            if params.startswith('q=') and float(params[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+_files = {}
+
+
+def read(path: str):
+    """
+    Content of a schema file, None when missing. Files are only read
+    once per process, they change with a deploy
+    """
+    if path not in _files:
+        try:
+            with open(path, 'rb') as file:
+                _files[path] = file.read()
+        except FileNotFoundError:
+            return None
+    return _files[path]
+
+
+def schema_view(request, fmt: str):
+    """
+    Pre-generated schema, in the best encoding the client accepts
+    """
+    if fmt not in MEDIA_TYPES:
+        raise Http404('Unknown schema format')
+
+    accepted = get_accepted_encodings(request)
+    for encoding in (*ENCODINGS, None):
+        if encoding is not None and encoding not in accepted:
+            continue
+        body = read(get_path(fmt, encoding))
+        if body is not None:
+            break
+    else:
+        err_logger.error(
+            'The OpenAPI schema is missing, run manage.py generate_openapi')
+        raise Http404('Schema not generated')
+
+    response = etag_response(
+        request, body,
+        f'public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}',
+        MEDIA_TYPES[fmt])
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@functools.lru_cache(maxsize=None)
+def get_ui_renderer_class():
+    """
+    Swagger UI renderer loading the pre-generated schema, imported on
+    the first docs request
+    """
+    from drf_yasg.renderers import SwaggerUIRenderer
+
+    class StaticSchemaUIRenderer(SwaggerUIRenderer):
+
+        def get_swagger_ui_settings(self):
+            data = super().get_swagger_ui_settings()
+            data['url'] = reverse('schema', kwargs={'fmt': 'json'})
+            return data
+
+    return StaticSchemaUIRenderer
+
+
+def docs_view(request):
+    """
+    Swagger UI page, the schema is fetched from `schema_view`
+    """
+    # Only the title and version of the schema are rendered
+    swagger = openapi.Swagger(
+        info=swagger_settings.DEFAULT_INFO, _prefix='/',
+        paths=openapi.Paths({}))
+    content = get_ui_renderer_class()().render(
+        swagger, renderer_context={'request': request})
+    return HttpResponse(content, content_type='text/html; charset=utf-8')
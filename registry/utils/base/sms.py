@@ -0,0 +1,201 @@
+"""
+SMS channel with pluggable providers.
+
+Messages are sent from a thread pool per provider, whose size is the
+provider's concurrency limit. Failed sends are retried with a doubling
+backoff, and the outcome is passed to a callback.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from utils.base.logger import err_logger, logger
+
+
+class SMSError(Exception):
+    """
+    Raised by providers when a message could not be sent,
+    `retryable` is False for errors a retry cannot fix
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class BaseSMSProvider:
+    name: str = None
+
+    @property
+    def max_concurrency(self) -> int:
+        return settings.SMS_MAX_CONCURRENCY
+
+    def send(self, to: str, body: str):
+        """Send one message, raises `SMSError` on failure
+
+        :param to: phone number in its E.164 form
+        :type to: str
+        :param body: text of the message
+        :type body: str
+        """
+        raise NotImplementedError('.send() must be overridden')
+
+
+class LocalSMSProvider(BaseSMSProvider):
+    """
+    Stand in provider for development and tests, messages are logged
+    and the last `SMS_LOCAL_OUTBOX_SIZE` are kept in `outbox`.
+    `SMS_LOCAL_DELAY` simulates network latency.
+    """
+    name = 'local'
+
+    def __init__(self):
+        self.outbox = deque(maxlen=settings.SMS_LOCAL_OUTBOX_SIZE)
+
+    def send(self, to: str, body: str):
+        if settings.SMS_LOCAL_DELAY:
+            time.sleep(settings.SMS_LOCAL_DELAY)
+        self.outbox.append({'to': to, 'body': body})
+        logger.debug(f'Local sms to {to}: {body}')
+
+
+class TwilioSMSProvider(BaseSMSProvider):
+    name = 'twilio'
+
+    def __init__(self):
+        # twilio is only needed when this provider is configured
+        from twilio.base.exceptions import TwilioRestException
+        from twilio.rest import Client
+
+        self.client = Client(
+            settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.error_class = TwilioRestException
+
+    def send(self, to: str, body: str):
+        try:
+            self.client.messages.create(
+                body=body, from_=settings.TWILIO_FROM_NUMBER, to=to)
+        except self.error_class as e:
+            # 4xx errors, e.g. an invalid number, will fail again
+            raise SMSError(str(e), retryable=(e.status or 500) >= 500)
+
+
+providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(path: str = None) -> BaseSMSProvider:
+    """Provider instance for a dotted path, `SMS_PROVIDER` by default
+
+    :param path: dotted path of the provider class
+    :type path: str, optional
+    :raises ImproperlyConfigured: when no provider is configured
+    :rtype: BaseSMSProvider
+    """
+    path = path or settings.SMS_PROVIDER
+    if not path:
+        raise ImproperlyConfigured(
+            'Set SMS_PROVIDER, the local provider is only the default '
+            'with DEBUG')
+    provider = providers.get(path)
+    if provider is None:
+        with _providers_lock:
+            provider = providers.get(path)
+            if provider is None:
+                provider = providers[path] = import_string(path)()
+    return provider
+
+
+def get_backoff(attempts: int) -> float:
+    return settings.SMS_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+
+
+class SMSDispatcher:
+    """
+    Sends messages concurrently, at most `max_concurrency` at a time
+    for each provider
+    """
+
+    def __init__(self):
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def get_executor(self, provider: BaseSMSProvider) -> ThreadPoolExecutor:
+        executor = self._executors.get(provider.name)
+        if executor is None:
+            with self._lock:
+                executor = self._executors.get(provider.name)
+                if executor is None:
+                    executor = self._executors[provider.name] = (
+                        ThreadPoolExecutor(
+                            max_workers=provider.max_concurrency,
+                            thread_name_prefix=f'sms-{provider.name}'))
+        return executor
+
+    def deliver(self, provider: BaseSMSProvider, to: str, body: str) -> dict:
+        """Send a message, retrying up to `SMS_MAX_ATTEMPTS` times
+
+        :return: the recipient, whether it was sent, the number of
+            attempts and the last error
+        :rtype: dict
+        """
+        result = {'to': to, 'sent': False, 'attempts': 0, 'error': ''}
+
+        while result['attempts'] < settings.SMS_MAX_ATTEMPTS:
+            result['attempts'] += 1
+            try:
+                provider.send(to, body)
+            except Exception as e:
+                err_logger.exception(e)
+                result['error'] = str(e)
+                if isinstance(e, SMSError) and not e.retryable:
+                    break
+                if result['attempts'] < settings.SMS_MAX_ATTEMPTS:
+                    time.sleep(get_backoff(result['attempts']))
+            else:
+                result['sent'] = True
+                result['error'] = ''
+                break
+        return result
+
+    def send(
+        self, to: str, body: str, callback=None,
+        provider: BaseSMSProvider = None
+    ) -> Future:
+        """Queue a message and return right away
+
+        :param callback: called with the result of `deliver`
+            from the sending thread
+        :return: future of the result of `deliver`
+        """
+        if provider is None:
+            provider = get_provider()
+
+        def run():
+            result = self.deliver(provider, to, body)
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    err_logger.exception(e)
+            return result
+
+        return self.get_executor(provider).submit(run)
+
+    def send_many(self, messages, provider: BaseSMSProvider = None) -> list:
+        """Queue a batch of (to, body, callback) messages
+
+        :return: futures of the results, in the same order
+        :rtype: list
+        """
+        return [
+            self.send(to, body, callback, provider)
+            for to, body, callback in messages
+        ]
+
+
+dispatcher = SMSDispatcher()
@@ -0,0 +1,271 @@
+"""
+Sliding window rate limiting on the configured cache.
+
+Each limit keeps two counters, the current and the previous fixed
+window. The previous window is weighted by how much of it still
+overlaps the sliding window, so a check is O(1) in time and memory.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# KEYS: current and previous window of each limit
+# ARGV: weight of the previous window, limit and expiry of each limit
+# Counts the request in every window only when all limits allow it
+SLIDING_WINDOW_SCRIPT = """
+local allowed = {}
+local all = true
+for i = 1, #KEYS / 2 do
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    local count = previous * tonumber(ARGV[i * 3 - 2]) + current
+    allowed[i] = count < tonumber(ARGV[i * 3 - 1]) and 1 or 0
+    all = all and allowed[i] == 1
+end
+if all then
+    for i = 1, #KEYS / 2 do
+        redis.call('INCR', KEYS[i * 2 - 1])
+        redis.call('EXPIRE', KEYS[i * 2 - 1], ARGV[i * 3])
+    end
+end
+return allowed
+"""
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate: str):
+    """Parse a rate like `10/min` into (requests, seconds)
+
+    :param rate: number of requests per period (s, m, h or d)
+    :type rate: str
+    :rtype: tuple
+    """
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class SlidingWindowLimiter:
+    """Atomic sliding window counter.
+
+    Uses a Lua script on Redis, and a lock on other backends, which
+    is only atomic within the process (enough for locmem).
+
+    :param alias: cache alias holding the counters,
+        defaults to `THROTTLE_CACHE`
+    :type alias: str, optional
+    """
+    prefix = 'throttle'
+
+    def __init__(self, alias: str = None):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def cache(self):
+        return caches[self.alias or settings.THROTTLE_CACHE]
+
+    def get_keys(self, key: str, window: int, now: float):
+        current = int(now // window)
+        return (
+            f'{self.prefix}:{key}:{current}',
+            f'{self.prefix}:{key}:{current - 1}',
+        )
+
+    def get_weight(self, window: int, now: float) -> float:
+        return 1 - (now % window) / window
+
+    def hit(self, key: str, limit: int, window: int, now: float = None):
+        """Count a request if it is within the limit
+
+        :param key: identifies what is limited, e.g. the scope and ip
+        :type key: str
+        :param limit: requests allowed per window
+        :type limit: int
+        :param window: window length in seconds
+        :type window: int
+        :return: True if the request is allowed
+        :rtype: bool
+        """
+        return self.hit_many([(key, limit, window)], now)[0]
+
+    def hit_many(self, limits, now: float = None) -> list:
+        """Count a request against several limits, in all of them or,
+        when one is reached, in none
+
+        :param limits: key, limit and window of each limit
+        :return: whether each limit allows the request
+        :rtype: list
+        """
+        if now is None:
+            now = time.time()
+
+        checks = [
+            (*self.get_keys(key, window, now), self.get_weight(window, now),
+             limit, window * 2)
+            for key, limit, window in limits
+        ]
+
+        cache = self.cache
+        if isinstance(cache, RedisCache):
+            return self._hit_redis(cache, checks)
+
+        with self._lock:
+            counts = cache.get_many(
+                [key for check in checks for key in check[:2]])
+            allowed = [
+                counts.get(previous, 0) * weight
+                + counts.get(current, 0) < limit
+                for current, previous, weight, limit, _ in checks
+            ]
+            if all(allowed):
+                for current, _, _, _, timeout in checks:
+                    cache.set(current, counts.get(current, 0) + 1, timeout)
+        return allowed
+
+    def _hit_redis(self, cache, checks) -> list:
+        keys = [
+            cache.make_key(key) for check in checks for key in check[:2]]
+        client = cache._cache.get_client(keys[0], write=True)
+
+        if self._script is None:
+            self._script = client.register_script(SLIDING_WINDOW_SCRIPT)
+
+        args = [arg for check in checks for arg in check[2:]]
+        return [
+            bool(allowed)
+            for allowed in self._script(keys=keys, args=args, client=client)
+        ]
+
+
+limiter = SlidingWindowLimiter()
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Base throttle for the views `throttle_scope`.
+
+    The rate is read from `DEFAULT_THROTTLE_RATES` under
+    `<view throttle_scope>_<throttle scope>`, e.g. `login_ip`.
+    Missing rates or identities disable the throttle.
+    """
+    scope: str = None
+    limiter = limiter
+
+    def __init__(self):
+        self.window = None
+
+    def get_rate(self, view):
+        view_scope = getattr(view, 'throttle_scope', None)
+        if view_scope is None:
+            return None
+        return api_settings.DEFAULT_THROTTLE_RATES.get(
+            f'{view_scope}_{self.scope}')
+
+    def get_identity(self, request, view):
+        raise NotImplementedError('.get_identity() must be overridden')
+
+    def get_limit(self, request, view):
+        """Key, limit and window of the request, None when unlimited
+
+        :rtype: tuple
+        """
+        rate = self.get_rate(view)
+        if rate is None:
+            return None
+
+        identity = self.get_identity(request, view)
+        if identity is None:
+            return None
+
+        limit, window = parse_rate(rate)
+        return f'{view.throttle_scope}:{self.scope}:{identity}', limit, window
+
+    def allow_request(self, request, view):
+        limit = self.get_limit(request, view)
+        if limit is None:
+            return True
+
+        self.window = limit[2]
+        return self.limiter.hit(*limit)
+
+    def wait(self):
+        if self.window is None:
+            return None
+        # Worst case, the end of the current window
+        return math.ceil(self.window - time.time() % self.window)
+
+
+class IPThrottle(SlidingWindowThrottle):
+    scope = 'ip'
+
+    def get_identity(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailThrottle(SlidingWindowThrottle):
+    """
+    Limits requests per email address found in the request body
+    """
+    scope = 'email'
+
+    def get_identity(self, request, view):
+        data = getattr(request, 'data', None)
+        if not hasattr(data, 'get'):
+            return None
+
+        email = data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        # Bounded key whatever the client sends
+        return hashlib.blake2b(email.strip().lower().encode()).hexdigest()
+
+
+class GlobalThrottle(SlidingWindowThrottle):
+    scope = 'global'
+
+    def get_identity(self, request, view):
+        return 'all'
+
+
+class CombinedThrottle(SlidingWindowThrottle):
+    """Sliding window throttles counted together.
+
+    DRF runs every throttle class of a view, so separate throttles
+    would count a request rejected by another one. Here a request is
+    counted by all the `throttles` or, when one rejects it, by none.
+    """
+    throttles: tuple = ()
+
+    def allow_request(self, request, view):
+        limits = [
+            limit for limit in (
+                throttle().get_limit(request, view)
+                for throttle in self.throttles)
+            if limit is not None
+        ]
+        if not limits:
+            return True
+
+        allowed = self.limiter.hit_many(limits)
+        if all(allowed):
+            return True
+
+        # Retry after the longest window of the limits reached
+        self.window = max(
+            window for (_, _, window), ok in zip(limits, allowed) if not ok)
+        return False
+
+
+class AuthThrottle(CombinedThrottle):
+    throttles = (IPThrottle, EmailThrottle, GlobalThrottle)
+
+
+AUTH_THROTTLES = (AuthThrottle,)
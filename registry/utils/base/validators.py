@@ -3,6 +3,10 @@ import re
 from rest_framework.serializers import ValidationError
 from utils.base.general import invalid_str
 
+PHONE_PATTERN = re.compile(r'\+[\d]?(\d{2,3}[-\.\s]??\d{2,3}[-\.\s]??\d{4}|\(\d{3}\)\s*\d{3}[-\.\s]??\d{4}|\d{3}[-\.\s]??\d{4})')  # noqa
+E164_INPUT_PATTERN = re.compile(r'\+[\d\s\-\.\(\)]+')
+NON_DIGITS = re.compile(r'\D+')
+
 
 def validate_special_char(value):
     if invalid_str(value):
@@ -10,7 +14,26 @@ def validate_special_char(value):
 
 
 def validate_phone(phone=''):
-    pattern = r'\+[\d]?(\d{2,3}[-\.\s]??\d{2,3}[-\.\s]??\d{4}|\(\d{3}\)\s*\d{3}[-\.\s]??\d{4}|\d{3}[-\.\s]??\d{4})'  # noqa
-    s = re.match(pattern, phone)
+    s = PHONE_PATTERN.match(phone)
     if s is None:
         raise ValidationError('Must provide a valid phone number')
+
+
+def normalize_phone(phone: str) -> str:
+    """Normalize a phone number to E.164, e.g. `+1 555-123-4567`
+    becomes `+15551234567`
+
+    :param phone: phone number starting with `+` and the country code,
+        digits may be separated by spaces, dashes, dots or parentheses
+    :type phone: str
+    :raises ValidationError: if the number is not valid
+    :return: the E.164 number
+    :rtype: str
+    """
+    phone = phone.strip()
+    if E164_INPUT_PATTERN.fullmatch(phone) is None:
+        raise ValidationError('Must provide a valid phone number')
+    digits = NON_DIGITS.sub('', phone)
+    if not 7 <= len(digits) <= 15:
+        raise ValidationError('Must provide a valid phone number')
+    return f'+{digits}'